@@ -4,12 +4,46 @@
 
 from .exceptions import *
 from .rows import *
-from .types import *
-from .stats import Stats
+
+# Names that are loaded from their modules on first use, to keep 'import tableintuit' fast for programs that only
+# intuit rows. The type and stats modules import numpy, dateutil and livestats when they are used, and the profiler
+# imports both of them. The names from types are the ones it defines, as with the former 'from .types import *'
+_lazy_names = {
+    'types': ['Column', 'NoMatchError', 'TypeIntuiter', 'geotype', 'unknown', 'ndarray', 'nans', 'tests',
+              'test_ascii', 'test_bool', 'test_datetime', 'test_float', 'test_geo', 'test_int', 'test_latin1',
+              'test_nan', 'test_ndarray', 'test_none', 'test_object', 'test_string',
+              'type_covers', 'type_join', 'type_precedence', 'type_rank'],
+    'stats': ['Stats'],
+    'profiler': ['TableProfiler', 'profile_many'],
+}
+
+_lazy_modules = {name: module for module, names in _lazy_names.items() for name in names}
+
+__all__ = (['RowIntuitError', 'StatsError', 'PipelineError', 'CheckpointError', 'ServiceError',
+            'RowIntuiter', 'slugify', 'binary_type', 'text_type', 'intuit_df'] +
+           [name for names in _lazy_names.values() for name in names])
+
+
+def __getattr__(name):
+    import importlib
+
+    if name in _lazy_names:
+        return importlib.import_module('.' + name, __name__)
+
+    if name in _lazy_modules:
+        return getattr(importlib.import_module('.' + _lazy_modules[name], __name__), name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
 
 
 def intuit_df(df, **kwargs):
-    """Intuit a DataFrame"""
+    """Intuit a DataFrame, or a ColumnarTable"""
+
+    from .columnar import ColumnarTable
+    from .types import TypeIntuiter
+
+    if isinstance(df, ColumnarTable):
+        return TypeIntuiter().run(df)
 
     from pandas import DataFrame
 
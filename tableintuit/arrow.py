@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Types and stats for Arrow data, computed a record batch at a time from the Arrow arrays, rather than
+from Python rows.
+
+Typed columns are counted for the TypeIntuiter in bulk: a value of an integer, boolean or temporal
+column always gets the same type test result, so the column is tested once, with the count of its values,
+and float columns are split into the classes that the tests distinguish. String, binary and decimal columns
+are tested once for each distinct value in a batch, from the Arrow value counts.
+
+For Stats, numeric columns are summarized with vectorized, mergeable moments and a uniform sample for
+quartiles, and categorical columns are counted from the Arrow value counts. Columns with options that need
+each value, such as native dates or streaming histograms, are added a value at a time.
+
+pyarrow is optional, and is imported only when Arrow data is used.
+
+"""
+
+import math
+
+SAMPLE_SIZE = 100000  # Values kept per column for quartiles
+
+
+def is_arrow(source):
+    """Return True if the source is a pyarrow Table, RecordBatch or RecordBatchReader"""
+    return type(source).__module__.split('.')[0] == 'pyarrow'
+
+
+def record_batches(source):
+    """Yield the record batches of a Table, RecordBatch, RecordBatchReader, or iterable of batches"""
+    import pyarrow as pa
+
+    if isinstance(source, pa.RecordBatch):
+        yield source
+    elif isinstance(source, pa.Table):
+        for batch in source.to_batches():
+            yield batch
+    else:
+        for batch in source:
+            yield batch
+
+
+def arrow_schema(schema):
+    """Return a Stats schema, of (name, type) pairs, for an Arrow schema"""
+    import datetime
+    import pyarrow.types as t
+
+    def python_type(typ):
+        if t.is_integer(typ):
+            return int
+        elif t.is_floating(typ) or t.is_decimal(typ):
+            return float
+        elif t.is_timestamp(typ) or t.is_date64(typ):
+            return datetime.datetime if t.is_timestamp(typ) else datetime.date
+        elif t.is_date32(typ):
+            return datetime.date
+        elif t.is_time(typ):
+            return datetime.time
+        elif t.is_binary(typ) or t.is_large_binary(typ):
+            return bytes
+        else:
+            return str
+
+    return [(field.name, python_type(field.type)) for field in schema]
+
+
+def _value_counts(arr, nulls=False):
+    """Yield (value, count) for the distinct values of an array, in order of first appearance. With nulls, the
+    nulls are counted, as None, in order, and otherwise they are dropped"""
+    import pyarrow.compute as pc
+
+    vc = pc.value_counts(arr if nulls else arr.drop_null())
+
+    for value, count in zip(vc.field('values').to_pylist(), vc.field('counts').to_pylist()):
+        yield value, count
+
+
+def _float_classes(x):
+    """Split float values into the classes the type tests distinguish, returning (representative, count)"""
+    import numpy as np
+
+    is_nan = np.isnan(x)
+    is_inf = np.isinf(x)
+    finite = x[~is_nan & ~is_inf]
+    n_integral = int((finite == np.floor(finite)).sum())
+
+    return [(0, n_integral), (math.nan, int(is_nan.sum())), (math.inf, int(is_inf.sum())),
+            (.5, len(finite) - n_integral)]
+
+
+def intuit_arrow(source, intuiter=None):
+    """Intuit the types of the columns of Arrow data, where the column names are the header
+
+    :param source: Table, RecordBatch, RecordBatchReader or iterable of RecordBatches
+    :param intuiter: TypeIntuiter to add to. Defaults to a new one
+    :return: The TypeIntuiter
+    """
+    import pyarrow.types as t
+    from .types import TypeIntuiter
+
+    intuiter = intuiter if intuiter is not None else TypeIntuiter()
+
+    for batch in record_batches(source):
+
+        if not intuiter.columns:
+            intuiter.process_header(batch.schema.names)
+
+        for i, arr in enumerate(batch.columns):
+            col = intuiter.columns[i]
+            typ = arr.type
+
+            if arr.null_count:
+                col.test(None, arr.null_count)
+
+            n_valid = len(arr) - arr.null_count
+
+            if not n_valid:
+                continue
+
+            if t.is_floating(typ):
+                classes = _float_classes(arr.drop_null().to_numpy(zero_copy_only=False))
+            elif t.is_string(typ) or t.is_large_string(typ) or t.is_binary(typ) or t.is_large_binary(typ) \
+                    or t.is_decimal(typ) or t.is_dictionary(typ):
+                classes = _value_counts(arr)
+            else:
+                # Every value of the type gets the same type test result
+                classes = [(arr.drop_null()[0].as_py(), n_valid)]
+
+            for value, n in classes:
+                if n:
+                    col.test(value, n)
+
+    return intuiter
+
+
+class BatchMoments(object):
+    """Count, mean, min, max and the second to fourth central moments of numbers added in arrays, merged
+    with the pairwise update of Pebay, "Formulas for Robust, One-Pass Parallel Computation of Covariances and
+    Arbitrary-Order Statistical Moments", 2008. Quartiles are from a uniform sample of up to sample_size
+    values, which are exact when there are fewer values than that.
+
+    Has the parts of the LiveStats interface that StatSet uses."""
+
+    def __init__(self, sample_size=SAMPLE_SIZE, seed=None):
+        import numpy as np
+
+        self.count = 0
+        self.average = 0.0
+        self.var_m2 = 0.0
+        self.skew_m3 = 0.0
+        self.kurt_m4 = 0.0
+        self.min_val = float('inf')
+        self.max_val = float('-inf')
+
+        self.sample_size = sample_size
+        self._sample = np.zeros(0)
+        self._keys = np.zeros(0)
+        self._rand = np.random.default_rng(seed)
+
+    def add(self, item):
+        import numpy as np
+        self.add_array(np.array([item], dtype=float))
+
+    def add_array(self, x):
+        import numpy as np
+
+        nb = len(x)
+        if not nb:
+            return
+
+        mb = float(x.mean())
+        d = x - mb
+        m2b, m3b, m4b = float((d ** 2).sum()), float((d ** 3).sum()), float((d ** 4).sum())
+
+        na = self.count
+        n = na + nb
+        delta = mb - self.average
+
+        m2 = self.var_m2 + m2b + delta ** 2 * na * nb / n
+        m3 = self.skew_m3 + m3b + delta ** 3 * na * nb * (na - nb) / n ** 2 + \
+            3 * delta * (na * m2b - nb * self.var_m2) / n
+        m4 = self.kurt_m4 + m4b + delta ** 4 * na * nb * (na ** 2 - na * nb + nb ** 2) / n ** 3 + \
+            6 * delta ** 2 * (na ** 2 * m2b + nb ** 2 * self.var_m2) / n ** 2 + \
+            4 * delta * (na * m3b - nb * self.skew_m3) / n
+
+        self.average = self.average + delta * nb / n
+        self.var_m2, self.skew_m3, self.kurt_m4 = m2, m3, m4
+        self.count = n
+        self.min_val = min(self.min_val, float(x.min()))
+        self.max_val = max(self.max_val, float(x.max()))
+
+        # Keep the values with the smallest random keys, which is a uniform sample of all of the values
+        keys = np.concatenate([self._keys, self._rand.random(nb)])
+        sample = np.concatenate([self._sample, x])
+
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, sample = keys[keep], sample[keep]
+
+        self._keys, self._sample = keys, sample
+
+    def quantiles(self):
+        import numpy as np
+
+        if not len(self._sample):
+            return []
+
+        ps = [0.25, 0.5, 0.75]
+        return list(zip(ps, np.quantile(self._sample, ps).tolist()))
+
+    def maximum(self):
+        return self.max_val
+
+    def minimum(self):
+        return self.min_val
+
+    def mean(self):
+        return self.average
+
+    def num(self):
+        return self.count
+
+    def variance(self):
+        return self.var_m2 / (self.count - 1) if self.count > 1 else float('NaN')
+
+    def kurtosis(self):
+        return self.kurt_m4 / (self.count * self.variance() ** 2.0) - 3.0 if self.count > 1 else float('NaN')
+
+    def skewness(self):
+        return self.skew_m3 / (self.count * self.variance() ** 1.5) if self.count > 1 else float('NaN')
+
+
+def _add_numeric(stat, arr):
+    """Add an array to a numeric StatSet, with the same histogram priming as StatSet.add"""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    valid = ~np.asarray(arr.is_null().to_numpy(zero_copy_only=False))
+    x = np.asarray(pc.cast(arr, pa.float64()).fill_null(0).to_numpy(zero_copy_only=False))
+    # NaN cells are missing values, as nulls are, and counted as NULL. Infinities are kept, as in LiveStats
+    valid &= ~np.isnan(x)
+
+    start = stat.n  # Values added before this array
+    stat.n += len(arr)
+    stat.n_nulls += arr.null_count
+
+    def format_width(values):
+        return max(len('{}'.format(v).encode('utf-8')) for v in values) if len(values) else 0
+
+    # Cells up to the primer count are counted as strings, then the bins are built from them
+    n_primer = max(0, min(len(arr), stat.bin_primer_count - 1 - start))
+
+    # In order, with the missing values, as StatSet.add counts them, so that ties in the counts are in the same order
+    primer = arr.slice(0, n_primer).to_pylist()
+    for v in primer:
+        stat.counts['NULL' if v is None or v != v else '{}'.format(v)] += 1
+
+    stat.size = max(stat.size or 0, format_width([v for v in primer if v is not None]))
+
+    stat.stats.add_array(x[:n_primer][valid[:n_primer]])
+
+    skip = 0
+
+    if start + n_primer == stat.bin_primer_count - 1 and n_primer < len(arr):
+        # The next cell builds the bins, and is only added to the stats. The row path builds them when the count
+        # is the primer count, which the test for an ordinal column uses, rather than the count after this array
+        stat.n = stat.bin_primer_count
+        stat._build_hist_bins()
+        stat.n = start + len(arr)
+        skip = 1
+
+        if not valid[n_primer]:
+            stat.counts['NULL'] += 1
+
+    if stat.lom != stat.LOM.INTERVAL:
+        # The bins found that the column is ordinal, so the rest are counted, as in StatSet.add
+        for v, n in _value_counts(arr.slice(n_primer + skip), nulls=True):
+            stat.counts['NULL' if v is None or v != v else '{}'.format(v)[:100]] += n
+
+    elif not valid[n_primer + skip:].all():
+        stat.counts['NULL'] += int((~valid[n_primer + skip:]).sum())
+
+    rest = x[n_primer:][valid[n_primer:]]
+
+    if not len(rest):
+        return
+
+    distinct = np.unique(arr.slice(n_primer).drop_null().to_numpy(zero_copy_only=False))
+    if len(distinct) > 1000:
+        distinct = np.concatenate([distinct[:500], distinct[-500:]])
+    stat.size = max(stat.size or 0, format_width(distinct.tolist()))
+
+    if stat.lom != stat.LOM.INTERVAL:
+        return
+
+    if stat.bin_width:
+        binned = x[n_primer + skip:][valid[n_primer + skip:]]
+        binned = binned[(binned >= stat.bin_min) & (binned <= stat.bin_max)]
+        idx = ((binned - stat.bin_min) / stat.bin_width).astype(int)
+        counts = np.bincount(np.minimum(idx, stat.num_bins - 1), minlength=stat.num_bins)
+        stat.bins = (np.asarray(stat.bins) + counts).tolist()
+
+    stat.stats.add_array(rest)
+
+
+def _add_categorical(stat, arr):
+    """Add an array to a nominal or ordinal StatSet from its value counts, with the keys of StatSet.add, in the
+    order that it would add them"""
+
+    stat.n += len(arr)
+    stat.n_nulls += arr.null_count
+
+    for v, n in _value_counts(arr, nulls=True):
+        unival = '' if v is None else '{}'.format(v)
+        stat.size = max(stat.size or 0, len(unival.encode('utf-8')))
+
+        if stat.is_time or stat.is_date:
+            stat.counts[unival] += n
+        elif v is None or v != v:
+            stat.counts['NULL'] += n
+        else:
+            stat.counts[unival[:100]] += n
+
+
+def arrow_stats(stats, source):
+    """Add Arrow data to a Stats, with columns matched to the schema by name, and finish it
+
+    :param stats: Stats, with a schema of names in the Arrow data. See arrow_schema()
+    :param source: Table, RecordBatch, RecordBatchReader or iterable of RecordBatches
+    :return: The Stats
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    from .exceptions import StatsError
+
+    if stats._sampling is not None or stats._converge:
+        raise StatsError("Sampling and convergence are not supported for Arrow data")
+
+    n = 0
+    for batch in record_batches(source):
+        names = batch.schema.names
+
+        for name, stat in stats._stats.items():
+            try:
+                arr = batch.column(names.index(name))
+            except ValueError:
+                raise StatsError("Schema column '{}' is not in the Arrow data".format(name))
+
+            if isinstance(arr, pa.ChunkedArray):
+                arr = arr.combine_chunks()
+
+            per_value = stat.stream_hist is not None or stat.date_stats is not None or stat.spill is not None \
+                or not (stat.lom == stat.LOM.INTERVAL or stat.lom == stat.LOM.NOMINAL or stat.lom == stat.LOM.ORDINAL)
+
+            if per_value:
+                for v in arr.to_pylist():
+                    stat.add(v)
+            elif stat.lom == stat.LOM.INTERVAL and stat.descriptive:
+                if not isinstance(stat.stats, BatchMoments):
+                    stat.stats = BatchMoments()
+                _add_numeric(stat, arr)
+            elif stat.lom == stat.LOM.INTERVAL:
+                stat.n += len(arr)
+                stat.n_nulls += arr.null_count
+                for v, _ in _value_counts(arr):
+                    stat.size = max(stat.size or 0, len('{}'.format(v).encode('utf-8')))
+            else:
+                _add_categorical(stat, arr)
+
+        if stats.cov is not None:
+            stats.cov.flush()
+            x = np.column_stack([
+                np.asarray(pc.cast(batch.column(names.index(name)), pa.float64())
+                           .to_numpy(zero_copy_only=False), dtype=float)
+                for name in stats.cov.names]) if stats.cov.names else np.zeros((batch.num_rows, 0))
+            stats.cov.update(x)
+
+        n += batch.num_rows
+
+    stats._finish(n)
+
+    return stats
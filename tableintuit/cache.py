@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+On disk cache of intuition results, keyed by a fingerprint of the file and the options used to
+compute them.
+
+Each entry is a JSON file, written to a temporary file and renamed into place, so readers in other processes
+never see a partial entry. The modification times of the entries are updated on each hit, and when the
+cache is larger than its size limit, the least recently used entries are removed, holding a lock file so only
+one process evicts at a time.
+
+"""
+
+import os
+
+SAMPLE_SIZE = 64 * 1024  # Bytes read from each of the start, middle and end of a file for the fingerprint
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+CACHE_VERSION = 1
+
+
+def fingerprint(path, sample_size=SAMPLE_SIZE):
+    """Return a hex digest of a file's absolute path, size, modification time, and samples of its content"""
+    from hashlib import blake2b
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+
+    h = blake2b(digest_size=20)
+    h.update('{}\0{}\0{}'.format(path, st.st_size, st.st_mtime_ns).encode('utf8'))
+
+    with open(path, 'rb') as f:
+        for offset in sorted(set([0, max(0, st.st_size // 2 - sample_size // 2), max(0, st.st_size - sample_size)])):
+            f.seek(offset)
+            h.update(f.read(sample_size))
+
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """A directory of cached results, with LRU eviction by total size"""
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: Cache directory, created if it does not exist
+        :param max_size: Limit, in bytes, on the total size of the entries
+        """
+
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(path, options=None):
+        """Return the key for the results for a file computed with a dict of options"""
+        import json
+        from hashlib import blake2b
+
+        opts = json.dumps({'version': CACHE_VERSION, 'options': options or {}}, sort_keys=True, default=str)
+
+        return blake2b((fingerprint(path) + opts).encode('utf8'), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key, default=None):
+        """Return the cached value for a key, or the default"""
+        import json
+
+        path = self._path(key)
+
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (IOError, OSError, ValueError):
+            # Missing, removed by another process, or unreadable
+            return default
+
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+
+        return value
+
+    def put(self, key, value):
+        """Store a JSON serializable value, then evict entries if the cache is over its size limit"""
+        import json
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f, default=str)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        self.evict()
+
+    def get_or_compute(self, path, options, compute):
+        """Return the cached results for a file and options, or call compute() and cache what it returns"""
+
+        key = self.key(path, options)
+
+        value = self.get(key)
+
+        if value is None:
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+    def _entries(self):
+        """List of (mtime, size, path) of the entries"""
+        entries = []
+
+        for e in os.scandir(self.directory):
+            if e.name.endswith('.json'):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+
+        return entries
+
+    @property
+    def size(self):
+        return sum(e[1] for e in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is within its size limit"""
+        import fcntl
+
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = sorted(self._entries())
+                total = sum(e[1] for e in entries)
+
+                for _, size, path in entries:
+                    if total <= self.max_size:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    total -= size
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Save and restore the state of a TypeIntuiter or Stats, so that a run over an append-only source can be resumed
+from the row where the last one stopped.
+
+The state of each object is its attributes, including the quantile estimators and histograms, encoded as
+plain values with tags for types that msgpack and JSON don't have. Only the classes in this package, and
+the livestats classes, can be restored. The encoded state is written with msgpack if it is installed, or as
+zlib compressed JSON.
+
+"""
+
+import math
+
+from .exceptions import CheckpointError
+
+CHECKPOINT_VERSION = 1
+DEFAULT_INTERVAL = 100000  # Rows between periodic checkpoints
+
+MAGIC = b'TICK'
+MSGPACK = b'm'
+JSON = b'j'
+
+# Attributes that are not saved, because they are rebuilt, or hold the source
+_EXCLUDE = {
+    'Stats': ('_source', '_func', '_func_code', '_spill_cleanup'),
+    'StatSet': ('parent',),
+}
+
+_TAG = '__t__'
+
+
+def _classes():
+    """Map of names to the classes that can be restored"""
+    from livestats import livestats
+    from . import types, stats
+
+    return {c.__name__: c for c in (
+        types.Column, types.TypeIntuiter,
+        stats.Stats, stats.StatSet, stats.StreamingHistogram, stats.DateStats, stats.DateParser,
+        stats.CovarianceMatrix, stats.EncodedCounter,
+        livestats.LiveStats, livestats.Quantile)}
+
+
+def _types():
+    """Map of names to the types that are values in the state, such as column types and type count keys"""
+    import datetime
+    from .types import unknown, geotype, ndarray
+
+    return {'int': int, 'float': float, 'str': str, 'bytes': bytes, 'bool': bool, 'object': object,
+            'datetime': datetime.datetime, 'date': datetime.date, 'time': datetime.time,
+            'ndarray': ndarray, 'unknown': unknown, 'geo': geotype}
+
+
+def encode(o, classes=None, type_names=None):
+    """Encode an object as nested dicts, lists and scalars"""
+    import base64
+    from collections import Counter, OrderedDict, defaultdict, deque
+
+    import numpy as np
+
+    if classes is None:
+        classes = _classes()
+        type_names = {v: k for k, v in _types().items()}
+
+    def enc(o):
+        return encode(o, classes, type_names)
+
+    if o is None or type(o) in (bool, int, float, str):
+        return o
+
+    if isinstance(o, type):
+        try:
+            return {_TAG: 'type', 'v': type_names[o]}
+        except KeyError:
+            raise CheckpointError("Can't save the type {}".format(o))
+
+    if isinstance(o, np.generic):
+        return o.item()
+
+    if isinstance(o, np.ndarray):
+        return {_TAG: 'ndarray', 'dtype': o.dtype.str, 'shape': list(o.shape),
+                'v': base64.b64encode(np.ascontiguousarray(o).tobytes()).decode('ascii')}
+
+    if isinstance(o, bytes):
+        return {_TAG: 'bytes', 'v': base64.b64encode(o).decode('ascii')}
+
+    if isinstance(o, list):
+        return [enc(e) for e in o]
+
+    if isinstance(o, tuple):
+        return {_TAG: 'tuple', 'v': [enc(e) for e in o]}
+
+    if isinstance(o, deque):
+        return {_TAG: 'deque', 'maxlen': o.maxlen, 'v': [enc(e) for e in o]}
+
+    if isinstance(o, (set, frozenset)):
+        return {_TAG: 'set', 'v': [enc(e) for e in o]}
+
+    if isinstance(o, dict):
+        if type(o) is defaultdict:
+            if o.default_factory is not int:
+                raise CheckpointError("Can't save a defaultdict with a factory other than int")
+            kind = 'defaultdict'
+        else:
+            kind = {Counter: 'Counter', OrderedDict: 'OrderedDict', dict: 'dict'}.get(type(o))
+
+        if kind is None:
+            raise CheckpointError("Can't save a {}".format(type(o).__name__))
+
+        return {_TAG: kind, 'v': [[enc(k), enc(v)] for k, v in o.items()]}
+
+    name = type(o).__name__
+
+    if classes.get(name) is type(o):
+        exclude = _EXCLUDE.get(name, ())
+        return {_TAG: 'obj', 'cls': name,
+                'v': {k: enc(v) for k, v in o.__dict__.items() if k not in exclude}}
+
+    raise CheckpointError("Can't save a {}".format(type(o).__name__))
+
+
+def decode(o, classes=None, types=None):
+    """Decode the output of encode()"""
+    import base64
+    from collections import Counter, OrderedDict, defaultdict, deque
+
+    import numpy as np
+
+    if classes is None:
+        classes = _classes()
+        types = _types()
+
+    def dec(o):
+        return decode(o, classes, types)
+
+    if isinstance(o, float) and math.isnan(o):
+        return math.nan  # The NaN type test result is math.nan, which is a key in Column.type_counts
+
+    if isinstance(o, list):
+        return [dec(e) for e in o]
+
+    if not isinstance(o, dict):
+        return o
+
+    tag = o[_TAG]
+    v = o.get('v')
+
+    if tag == 'type':
+        return types[v]
+    elif tag == 'ndarray':
+        return np.frombuffer(base64.b64decode(v), dtype=np.dtype(o['dtype'])).reshape(o['shape']).copy()
+    elif tag == 'bytes':
+        return base64.b64decode(v)
+    elif tag == 'tuple':
+        return tuple(dec(e) for e in v)
+    elif tag == 'deque':
+        return deque((dec(e) for e in v), o['maxlen'])
+    elif tag == 'set':
+        return set(dec(e) for e in v)
+    elif tag in ('dict', 'Counter', 'OrderedDict', 'defaultdict'):
+        items = OrderedDict((dec(k), dec(e)) for k, e in v)
+
+        if tag == 'defaultdict':
+            return defaultdict(int, items)
+
+        return {'dict': dict, 'Counter': Counter, 'OrderedDict': OrderedDict}[tag](items)
+
+    elif tag == 'obj':
+        try:
+            cls = classes[o['cls']]
+        except KeyError:
+            raise CheckpointError("Can't restore a {}".format(o['cls']))
+
+        obj = cls.__new__(cls)
+        obj.__dict__.update({k: dec(e) for k, e in v.items()})
+        return obj
+
+    raise CheckpointError("Unknown tag '{}' in checkpoint".format(tag))
+
+
+def dumps(obj, offset):
+    """Return the bytes of a checkpoint of a TypeIntuiter or Stats, which has read offset rows of its source"""
+    from .stats import Stats
+
+    if isinstance(obj, Stats):
+        obj._check_checkpoint()
+
+    state = {'version': CHECKPOINT_VERSION, 'offset': offset, 'object': encode(obj)}
+
+    try:
+        import msgpack
+        return MAGIC + MSGPACK + msgpack.packb(state, use_bin_type=True)
+    except ImportError:
+        import json
+        import zlib
+        return MAGIC + JSON + zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf8'))
+
+
+def loads(data):
+    """Restore an object from checkpoint bytes. The object's resume_offset is set to the number of rows of the
+    source that had been read, which the object's next run skips"""
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise CheckpointError("Not a checkpoint")
+
+    fmt, body = data[len(MAGIC):len(MAGIC) + 1], data[len(MAGIC) + 1:]
+
+    if fmt == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise CheckpointError("Checkpoint was written with msgpack, which is not installed")
+        state = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    elif fmt == JSON:
+        import json
+        import zlib
+        state = json.loads(zlib.decompress(body).decode('utf8'))
+    else:
+        raise CheckpointError("Unknown checkpoint format {}".format(fmt))
+
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise CheckpointError("Checkpoint version {} is not {}".format(state.get('version'), CHECKPOINT_VERSION))
+
+    obj = decode(state['object'])
+    obj.resume_offset = state['offset']
+
+    if hasattr(obj, '_restored'):
+        obj._restored()
+
+    return obj
+
+
+def save(obj, path, offset):
+    """Write a checkpoint file, replacing any existing one atomically"""
+    import os
+    import tempfile
+
+    data = dumps(obj, offset)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.checkpoint-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def load(path):
+    """Restore a TypeIntuiter or Stats from a checkpoint file"""
+
+    with open(path, 'rb') as f:
+        return loads(f.read())
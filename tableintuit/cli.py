@@ -9,18 +9,64 @@ CLI program
 """
 
 from __future__ import print_function
+import os
 import sys
 
+
+def print_profile(profile, section):
+    """Print the types or stats table from a TableProfiler dict"""
+    from tabulate import tabulate
+
+    if section == 'types':
+        rows = [{k: v for k, v in row.items() if k != 'strvals'} for row in profile['types']]
+        title = 'TypeIntuiter'
+    else:
+        rows = profile['stats']
+        title = 'Statistics'
+
+    if rows:
+        print(title, '\n' + tabulate([list(r.values()) for r in rows], list(rows[0].keys()), tablefmt='pipe'))
+    else:
+        print(title + ': None')
+
+
+def print_many(results, section, as_json=False):
+    """Print the results of profile_many() as they arrive. Returns the number of files that failed"""
+    import json
+
+    n_errors = 0
+
+    for result in results:
+        if 'error' in result:
+            n_errors += 1
+
+        if as_json:
+            print(json.dumps({k: v for k, v in result.items() if k != 'traceback'}, default=str))
+        elif 'error' in result:
+            print('{}: ERROR {}'.format(result['source'], result['error']), file=sys.stderr)
+        else:
+            print('==', result['source'])
+            print_profile(result['profile'], section)
+            print()
+
+        sys.stdout.flush()
+
+    return n_errors
+
+
 def main():
     import argparse
+    import glob
     import sys
-    from tableintuit import __meta__, RowIntuiter
-    from rowgenerators import RowGenerator
+    from tableintuit import __meta__, RowIntuiter, profile_many
     from itertools import islice
     from collections import deque
 
 
 
+    RI_HEAD_LENGTH=1000
+    RI_TAIL_LENGTH=150
+
     parser = argparse.ArgumentParser(
         prog='tintuit',
         description='Print a table, row or stats intuition report'.format(__meta__.__version__))
@@ -34,15 +80,67 @@ def main():
                    help='Print a stats report')
     g.add_argument('-H', '--head', default=False, action='store_true',
                    help='Print the head of the rows, up to three lines past the start of data. ')
-
-    parser.add_argument('url', help='Path to file or a URL')
+    g.add_argument('--serve', metavar='SOCKET',
+                   help='Run a service that profiles files for clients on a Unix socket')
+
+    parser.add_argument('-C', '--cache', help='Cache directory for types and stats results for local files')
+    parser.add_argument('-S', '--sample', type=int,
+                        help='For types and stats of a local delimited file, sample this many rows from random '
+                             'offsets in the file, rather than reading all of it')
+
+    parser.add_argument('--socket', help='For types and stats, get the profile from the service on this socket')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='Number of worker processes, for --serve, or for types and stats of many files')
+    parser.add_argument('--timeout', type=float,
+                        help='For types and stats of many files, seconds allowed per file, or per request for --serve')
+    parser.add_argument('--json', default=False, action='store_true',
+                        help='For types and stats of many files, print each result as a line of JSON')
+    parser.add_argument('--queue', type=int, default=256,
+                        help='With --serve, number of requests that can be queued or running')
+
+    parser.add_argument('url', nargs='?', help='Path to file or a URL. For types and stats, may be a directory or '
+                                               'a glob pattern, to profile many files')
 
     args = parser.parse_args(sys.argv[1:])
 
-    print(args)
+    if args.serve:
+        from tableintuit.service import IntuitServer
+        IntuitServer(args.serve, workers=args.workers, queue_size=args.queue, cache=args.cache,
+                     timeout=args.timeout).serve_forever()
+        return
 
-    RI_HEAD_LENGTH=1000
-    RI_TAIL_LENGTH=150
+    if not args.url:
+        parser.error('the url argument is required')
+
+    if args.socket and (args.types or args.stats):
+        from tableintuit.service import IntuitClient
+
+        with IntuitClient(args.socket) as client:
+            profile = client.profile(args.url, sample=args.sample,
+                                     head_size=RI_HEAD_LENGTH, tail_size=RI_TAIL_LENGTH)
+
+        print_profile(profile, 'types' if args.types else 'stats')
+        return
+
+    if (args.types or args.stats) and (args.workers is not None or os.path.isdir(args.url)
+                                       or (glob.has_magic(args.url) and not os.path.exists(args.url))):
+        results = profile_many(args.url, workers=args.workers, timeout=args.timeout, sample=args.sample,
+                               cache=args.cache, head_size=RI_HEAD_LENGTH, tail_size=RI_TAIL_LENGTH)
+
+        if print_many(results, 'types' if args.types else 'stats', args.json):
+            sys.exit(1)
+        return
+
+    if args.types or args.stats:
+        from tableintuit.profiler import profile_file
+
+        profile = profile_file(args.url, sample=args.sample, cache=args.cache,
+                               head_size=RI_HEAD_LENGTH, tail_size=RI_TAIL_LENGTH)
+
+        print_profile(profile, 'types' if args.types else 'stats')
+        return
+
+    from rowgenerators import RowGenerator
 
     rg = RowGenerator(url=args.url)
 
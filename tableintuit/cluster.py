@@ -10,11 +10,17 @@ Old code for matching headers across files where the headers may have changed.
 class ClusterHeaders(object):
     """Using Source table headers, cluster the source tables into destination tables"""
 
-    def __init__(self, bundle=None):
+    def __init__(self, bundle=None, index=None):
+        """
+        :param bundle: Unused
+        :param index: A HeaderIndex. If set, add_header() assigns each header to a cluster in the index
+        """
         self._bundle = bundle
         self._headers = {}
+        self._index = index
 
-    def match_headers(self, a, b):
+    @staticmethod
+    def match_headers(a, b):
         from difflib import ndiff
         from collections import Counter
 
@@ -26,33 +32,205 @@ class ClusterHeaders(object):
 
         return float(remove+add) / float(same)
 
-    def match_headers_a(self, a, b):
-        from difflib import SequenceMatcher
+    @staticmethod
+    def match_headers_a(a, b, threshold=.5, metric='jaccard', ngram=3, chunk_size=1024):
+        """Map the columns of an old header to the columns of a new one. Returns a dict of old column names to
+        (new column name, score), for the old columns that have a match scoring at least the threshold.
 
-        for i, ca in enumerate(a):
-            for j, cb in enumerate(b):
-                r = SequenceMatcher(None, ca, cb).ratio()
+        Columns with the same name are matched first, with a score of 1. The rest are scored by the similarity
+        of the sets of character n-grams of their names, computed for all pairs at once as a product of
+        n-gram incidence matrices, and then matched one to one, with scipy's linear_sum_assignment if scipy is
+        installed, or otherwise greedily, best score first.
 
-                if r > .9:
-                    print(ca, cb)
-                    break
+        :param a: Old header
+        :param b: New header
+        :param threshold: Lowest score for a match
+        :param metric: 'jaccard' or 'cosine'
+        :param ngram: Length of the n-grams
+        :param chunk_size: Rows of old columns scored at a time, to bound the memory of the score matrix
+        """
+        import numpy as np
+
+        if metric not in ('jaccard', 'cosine'):
+            raise ValueError("Unknown metric '{}'".format(metric))
+
+        a = [str(e) for e in a]
+        b = [str(e) for e in b]
+
+        b_names = set(b)
+        mapping = {e: (e, 1.0) for e in a if e in b_names}
+
+        ra = [e for e in dict.fromkeys(a) if e not in mapping]
+        rb = [e for e in dict.fromkeys(b) if e not in mapping]
+
+        if not ra or not rb:
+            return mapping
+
+        grams_a = [_ngrams(e, ngram) for e in ra]
+        grams_b = [_ngrams(e, ngram) for e in rb]
+
+        vocab = {}
+        for grams in grams_b:
+            for g in grams:
+                vocab.setdefault(g, len(vocab))
+
+        def incidence(gram_sets):
+            m = np.zeros((len(gram_sets), len(vocab)), dtype=np.float32)
+            for i, grams in enumerate(gram_sets):
+                m[i, [vocab[g] for g in grams if g in vocab]] = 1
+            return m
+
+        mb = incidence(grams_b)
+        size_b = np.array([len(g) for g in grams_b], dtype=np.float32)
+
+        scores = np.empty((len(ra), len(rb)), dtype=np.float32)
+
+        for start in range(0, len(ra), chunk_size):
+            chunk = grams_a[start:start + chunk_size]
+            inter = incidence(chunk) @ mb.T
+            size_a = np.array([len(g) for g in chunk], dtype=np.float32)[:, None]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if metric == 'jaccard':
+                    s = inter / (size_a + size_b - inter)
+                else:
+                    s = inter / np.sqrt(size_a * size_b)
+
+            scores[start:start + len(chunk)] = np.nan_to_num(s)
+
+        try:
+            from scipy.optimize import linear_sum_assignment
+            rows, cols = linear_sum_assignment(scores, maximize=True)
+            pairs = [(i, j) for i, j in zip(rows, cols) if scores[i, j] >= threshold]
+        except ImportError:
+            pairs = []
+            cand = np.argwhere(scores >= threshold)
+            order = np.argsort(-scores[cand[:, 0], cand[:, 1]], kind='stable')
+            used_a, used_b = set(), set()
+            for i, j in cand[order]:
+                if i not in used_a and j not in used_b:
+                    used_a.add(i)
+                    used_b.add(j)
+                    pairs.append((i, j))
+
+        for i, j in pairs:
+            mapping[ra[i]] = (rb[j], round(float(scores[i, j]), 3))
+
+        return mapping
 
     def add_header(self, name, headers):
+        """Add a header. If there is an index, return the id of the cluster in the index that the header
+        is assigned to"""
         self._headers[name] = headers
 
+        if self._index is not None:
+            return self._index.assign(name, headers)
+
     def pairs(self):
         return set([(name1, name2) for name1 in list(self._headers) for name2 in list(self._headers) if name2 > name1])
 
+    def minhashes(self, num_perm=128, seed=1):
+        """Return a dict of names to MinHash signatures of the set of column names in each header. Each
+        permutation is the splitmix64 finalizer applied to the column name's hash xor a random seed."""
+        import numpy as np
+        from hashlib import blake2b
+
+        seeds = np.random.RandomState(seed).randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+        def token_hash(e):
+            return int.from_bytes(blake2b(str(e).encode('utf8'), digest_size=8).digest(), 'little')
+
+        sigs = {}
+        with np.errstate(over='ignore'):
+            for name, header in self._headers.items():
+                z = np.array(sorted(set(token_hash(e) for e in header)), dtype=np.uint64)[None, :] ^ seeds[:, None]
+
+                if z.size:
+                    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+                    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+                    sigs[name] = (z ^ (z >> np.uint64(31))).min(axis=1)
+                else:
+                    sigs[name] = np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+
+        return sigs
+
+    def lsh_pairs(self, num_perm=128, bands=32, seed=1):
+        """Return the pairs of names whose headers share at least one band of their MinHash signatures. With
+        32 bands of 4 rows, pairs of headers with a Jaccard similarity of the column names above about .42 are
+        likely to be candidates, well below the .77 similarity that a match_headers score of .3 requires."""
+        from collections import defaultdict
+
+        rows = num_perm // bands
+        sigs = self.minhashes(num_perm, seed)
+
+        pairs = set()
+        for band in range(bands):
+            buckets = defaultdict(list)
+            for name, sig in sigs.items():
+                buckets[sig[band * rows:(band + 1) * rows].tobytes()].append(name)
+
+            for names in buckets.values():
+                if len(names) > 1:
+                    names = sorted(names)
+                    pairs.update((a, b) for i, a in enumerate(names) for b in names[i + 1:])
+
+        return pairs
+
     @classmethod
     def long_substr(cls, data):
+        """Return the longest substring common to all of the strings in data, or '' if there are fewer than two.
+        Of equal length substrings, returns the one that starts first in data[0].
+
+        Uses a suffix automaton of data[0]: each other string is run through it to find the longest match
+        ending in each state, and the minimum of these over the strings is the longest common substring in the
+        state, so the time is linear in the total length of the strings. """
         data = list(data)
-        substr = ''
-        if len(data) > 1 and len(data[0]) > 0:
-            for i in range(len(data[0])):
-                for j in range(len(data[0]) - i + 1):
-                    if j > len(substr) and cls.is_substr(data[0][i:i + j], data):
-                        substr = data[0][i:i + j]
-        return substr
+
+        if len(data) < 2 or len(data[0]) == 0:
+            return ''
+
+        first = data[0]
+        length, link, trans, firstpos = _suffix_automaton(first)
+
+        # States in order of decreasing length, for propagating matches to suffix links
+        order = sorted(range(len(length)), key=lambda v: length[v], reverse=True)
+
+        best = list(length)
+
+        for t in data[1:]:
+            match = [0] * len(length)
+            v = l = 0
+
+            for c in t:
+                while v and c not in trans[v]:
+                    v = link[v]
+                    l = length[v]
+
+                if c in trans[v]:
+                    v = trans[v][c]
+                    l += 1
+                else:
+                    v = l = 0
+
+                if l > match[v]:
+                    match[v] = l
+
+            for v in order:
+                p = link[v]
+                if match[v] and p >= 0:
+                    match[p] = max(match[p], min(match[v], length[p]))
+
+            best = [min(b, m) for b, m in zip(best, match)]
+
+        n = max(best)
+
+        if n == 0:
+            return ''
+
+        # Leftmost start of a common substring of length n
+        start = min(firstpos[v] - n + 1 for v in range(1, len(length)) if best[v] >= n and length[link[v]] < n)
+
+        return first[start:start + n]
 
     @classmethod
     def is_substr(cls, find, data):
@@ -63,7 +241,80 @@ class ClusterHeaders(object):
                 return False
         return True
 
-    def cluster(self):
+    def distance_matrix(self, memory_limit=256 * 1024 * 1024):
+        """Yield (names, start, block) for blocks of rows of the matrix of distances between all of the headers,
+        where block[i, j] is the distance between names[start + i] and names[j].
+
+        The distance is the match_headers score computed on the sets of column names: the number of columns in
+        only one of the headers over the number in both, or inf if there are none in both. Headers are encoded
+        as token incidence vectors, and the numbers of shared columns for a block of rows are a sparse product,
+        with scipy.sparse if it is installed, and otherwise by counting over the postings of each column name.
+
+        :param memory_limit: Limit, in bytes, on the memory for each block
+        """
+        import numpy as np
+
+        names = sorted(self._headers)
+        n = len(names)
+
+        vocab = {}
+        token_ids = []
+        for name in names:
+            token_ids.append(np.array(sorted(set(vocab.setdefault(str(e), len(vocab))
+                                                 for e in self._headers[name])), dtype=np.intp))
+
+        sizes = np.array([len(t) for t in token_ids], dtype=np.float64)
+
+        # The intersection counts, sizes and distances for a block are each n values per row
+        chunk_rows = max(1, int(memory_limit // (3 * 8 * max(n, 1))))
+
+        try:
+            from scipy import sparse
+
+            indptr = np.cumsum([0] + [len(t) for t in token_ids])
+            indices = np.concatenate(token_ids) if n else np.zeros(0, dtype=np.intp)
+            x = sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, len(vocab)))
+            xt = x.T.tocsc()
+
+            def intersections(start, stop):
+                return (x[start:stop] @ xt).toarray()
+
+        except ImportError:
+            postings = [[] for _ in range(len(vocab))]
+            for i, tokens in enumerate(token_ids):
+                for t in tokens:
+                    postings[t].append(i)
+            postings = [np.array(p, dtype=np.intp) for p in postings]
+
+            def intersections(start, stop):
+                block = np.zeros((stop - start, n))
+                for r, tokens in enumerate(token_ids[start:stop]):
+                    if len(tokens):
+                        block[r] = np.bincount(np.concatenate([postings[t] for t in tokens]), minlength=n)
+                return block
+
+        for start in range(0, n, chunk_rows):
+            stop = min(start + chunk_rows, n)
+            inter = intersections(start, stop)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dist = (sizes[start:stop, None] + sizes[None, :] - 2 * inter) / inter
+
+            dist[inter == 0] = np.inf
+
+            yield names, start, dist
+
+    def cluster(self, lsh=False, matrix=False, memory_limit=256 * 1024 * 1024, **lsh_args):
+        """Cluster the headers, returning a dict of cluster names to the sorted names of the headers in each
+        cluster. With lsh, only the candidate pairs from lsh_pairs() are scored, and clusters are the connected
+        components of the matching pairs. lsh_args are passed to lsh_pairs(). With matrix, all of the pairs
+        are scored in blocks from distance_matrix(), which is limited to memory_limit bytes per block.  """
+
+        if matrix:
+            return self._cluster_matrix(memory_limit)
+
+        if lsh:
+            return self._cluster_lsh(**lsh_args)
 
         pairs = self.pairs()
 
@@ -94,4 +345,245 @@ class ClusterHeaders(object):
 
         return d
 
+    def _cluster_lsh(self, **lsh_args):
+
+        def matching():
+            for a, b in self.lsh_pairs(**lsh_args):
+                try:
+                    score = round(self.match_headers(self._headers[a], self._headers[b]), 3)
+                except ZeroDivisionError:
+                    continue
+
+                if score < .3:
+                    yield a, b
+
+        return self._connected_clusters(matching())
+
+    def _cluster_matrix(self, memory_limit):
+        import numpy as np
+
+        def matching():
+            for names, start, block in self.distance_matrix(memory_limit):
+                for i, j in zip(*np.nonzero(np.round(block, 3) < .3)):
+                    if start + i < j:
+                        yield names[start + i], names[j]
+
+        return self._connected_clusters(matching())
+
+    def _connected_clusters(self, pairs):
+        """Return the connected components of the graph of matching pairs, as a dict like cluster()"""
+
+        parent = {}
+
+        def find(x):
+            root = x
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while x != root:  # Path compression
+                parent[x], x = root, parent[x]
+            return root
+
+        for a, b in pairs:
+            parent.setdefault(a, a)
+            parent.setdefault(b, b)
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        clusters = {}
+        for name in parent:
+            clusters.setdefault(find(name), set()).add(name)
+
+        return {self.long_substr(c).strip('_'): sorted(c) for c in clusters.values()}
+
+class HeaderIndex(object):
+    """An inverted index from column names to headers, for assigning headers to clusters as they arrive,
+    rather than re-clustering all of the headers. A new header is scored with match_headers only against the
+    indexed headers that share the most column names with it. It joins the cluster of every header it matches,
+    merging them, as cluster() does with a chain of matching pairs, or starts a new cluster.
+
+    The index can be saved to a JSON file, and update() assigns a header with the file locked, so several
+    processes can share one index file."""
+
+    def __init__(self, threshold=.3, max_candidates=20):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+
+        self.headers = {}  # Member name to header
+        self.assignments = {}  # Member name to cluster id
+        self.members = {}  # Cluster id to member names
+        self.postings = {}  # Column name to the names of headers that have it
+        self._next_id = 0
+
+    def candidates(self, header):
+        """Return the names of the indexed headers that share the most column names with a header,
+        most shared first"""
+        from collections import Counter
+
+        shared = Counter()
+        for token in set(str(e) for e in header):
+            shared.update(self.postings.get(token, ()))
+
+        return [name for name, _ in shared.most_common(self.max_candidates)]
+
+    def match(self, header):
+        """Return the set of ids of the clusters with a header that matches"""
+
+        matched = set()
+
+        for name in self.candidates(header):
+            try:
+                score = round(ClusterHeaders.match_headers(self.headers[name], header), 3)
+            except ZeroDivisionError:
+                continue
+
+            if score < self.threshold:
+                matched.add(self.assignments[name])
+
+        return matched
+
+    def assign(self, name, header):
+        """Assign a header to a cluster, returning the cluster id"""
+
+        if name in self.assignments:
+            return self.assignments[name]
+
+        header = [str(e) for e in header]
+        matched = self.match(header)
+
+        if matched:
+            cid = min(matched)
+            for other in matched - {cid}:
+                for m in self.members.pop(other):
+                    self.assignments[m] = cid
+                    self.members[cid].append(m)
+        else:
+            cid = self._next_id
+            self._next_id += 1
+            self.members[cid] = []
+
+        self._add(name, header, cid)
+
+        return cid
+
+    def _add(self, name, header, cid):
+        self.headers[name] = header
+        self.assignments[name] = cid
+        self.members.setdefault(cid, []).append(name)
+
+        for token in set(header):
+            self.postings.setdefault(token, set()).add(name)
+
+    @property
+    def clusters(self):
+        """Dict of cluster names to sorted member names, like ClusterHeaders.cluster(). Clusters with one
+        member are named for it."""
+
+        return {(ClusterHeaders.long_substr(m).strip('_') if len(m) > 1 else m[0]): sorted(m)
+                for m in self.members.values()}
+
+    def to_dict(self):
+        return {
+            'threshold': self.threshold,
+            'max_candidates': self.max_candidates,
+            'next_id': self._next_id,
+            'headers': [{'name': name, 'cluster': self.assignments[name], 'header': header}
+                        for name, header in self.headers.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        index = cls(d['threshold'], d['max_candidates'])
+        index._next_id = d['next_id']
+
+        for e in d['headers']:
+            index._add(e['name'], e['header'], e['cluster'])
+
+        return index
+
+    def save(self, path):
+        """Write the index to a JSON file, replacing it atomically"""
+        import json
+        import os
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.headerindex-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        import json
+
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def update(cls, path, name, header, **kwargs):
+        """Assign a header to a cluster in the index file at path, creating the file if it doesn't exist. The
+        read, assignment and write are done holding an exclusive lock, so workers in several processes can
+        share the file. Returns the cluster id. kwargs are for the constructor of a new index """
+        import os
+        import fcntl
+
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = cls.load(path) if os.path.exists(path) else cls(**kwargs)
+                cid = index.assign(name, header)
+                index.save(path)
+                return cid
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _ngrams(s, n):
+    """The set of character n-grams of a lower cased column name, padded so short names have n-grams"""
+    s = ' ' + s.lower() + ' '
+    return set(s[i:i + n] for i in range(max(len(s) - n + 1, 1)))
+
+
+def _suffix_automaton(s):
+    """Build a suffix automaton for a string. Returns lists, indexed by state, of the length of the longest
+    substring in the state, the suffix link, the transitions and the end position of the first occurrence. """
+
+    length, link, trans, firstpos = [0], [-1], [{}], [-1]
+    last = 0
+
+    for i, c in enumerate(s):
+        cur = len(length)
+        length.append(length[last] + 1)
+        link.append(0)
+        trans.append({})
+        firstpos.append(i)
+
+        p = last
+        while p != -1 and c not in trans[p]:
+            trans[p][c] = cur
+            p = link[p]
+
+        if p != -1:
+            q = trans[p][c]
+            if length[p] + 1 == length[q]:
+                link[cur] = q
+            else:
+                clone = len(length)
+                length.append(length[p] + 1)
+                link.append(link[q])
+                trans.append(dict(trans[q]))
+                firstpos.append(firstpos[q])
+
+                while p != -1 and trans[p].get(c) == q:
+                    trans[p][c] = clone
+                    p = link[p]
+
+                link[q] = link[cur] = clone
+
+        last = cur
 
+    return length, link, trans, firstpos
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+A columnar, memory mapped cache of a parsed table, so repeated intuition of the same file reads arrays
+rather than running the parser again.
+
+Every row of the source, including headers and comments, is stored. Each column is a directory of raw
+NumPy arrays: a type tag for each cell, int64 and float64 arrays for numeric cells, and for text cells,
+offsets into a heap of UTF-8 bytes. The arrays are memory mapped when the table is read, and numeric
+columns can be used as arrays without converting the cells to Python objects. Files are only open while
+they are written, and only the most recently used maps are kept, so wide tables don't run out of file
+descriptors.
+
+"""
+
+import datetime
+import os
+from array import array
+from collections import OrderedDict
+
+COLUMNAR_VERSION = 1
+CHUNK_ROWS = 65536
+MAX_MAPS = 64  # Arrays kept memory mapped at once. Each map holds a file descriptor
+
+# Cell type tags
+NONE, INT, FLOAT, STR, BOOL, BYTES, DATE, DATETIME, TIME, BIGINT = range(10)
+
+
+class _ColumnWriter(object):
+    """Buffers the cells of one column. The column's files are only open while a buffer is appended to them,
+    so a wide table doesn't hold files open for every column"""
+
+    def __init__(self, directory, position, n_rows):
+        self.path = os.path.join(directory, 'c{}'.format(position))
+        os.makedirs(self.path)
+
+        self.tags = array('B')
+        self.ints = array('q')
+        self.floats = array('d')
+        self.offsets = array('q', [0])
+        self.heap = bytearray()
+        self.heap_size = 0
+
+        for _ in range(n_rows):  # Columns that first appear after the first row are empty for the earlier rows
+            self.add(None)
+
+    def add(self, v):
+        tag = NONE
+        i = 0
+        f = 0.0
+        b = None
+
+        t = type(v)
+
+        if v is None:
+            pass
+        elif t is bool:
+            tag, i = BOOL, int(v)
+        elif t is int:
+            if -(1 << 63) <= v < (1 << 63):
+                tag, i = INT, v
+            else:
+                tag, b = BIGINT, str(v).encode('ascii')
+        elif t is float:
+            tag, f = FLOAT, v
+        elif t is str:
+            tag, b = STR, v.encode('utf-8', 'surrogatepass')
+        elif t is bytes:
+            tag, b = BYTES, v
+        elif t is datetime.datetime:
+            tag, b = DATETIME, v.isoformat().encode('ascii')
+        elif t is datetime.date:
+            tag, b = DATE, v.isoformat().encode('ascii')
+        elif t is datetime.time:
+            tag, b = TIME, v.isoformat().encode('ascii')
+        else:
+            try:
+                tag, f = FLOAT, float(v)  # Such as numpy and Decimal numbers
+            except (TypeError, ValueError):
+                tag, b = STR, str(v).encode('utf-8', 'surrogatepass')
+
+        self.tags.append(tag)
+        self.ints.append(i)
+        self.floats.append(f)
+
+        if b is not None:
+            self.heap += b
+            self.heap_size += len(b)
+
+        self.offsets.append(self.heap_size)
+
+        if len(self.tags) >= CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        for name, data in (('tags', self.tags), ('ints', self.ints), ('floats', self.floats),
+                           ('offsets', self.offsets), ('heap', self.heap)):
+            with open(os.path.join(self.path, name), 'ab') as f:
+                f.write(data)
+
+        self.tags, self.ints, self.floats, self.offsets = array('B'), array('q'), array('d'), array('q')
+        self.heap = bytearray()
+
+    def close(self):
+        self.flush()
+
+
+def write_columnar(source, directory):
+    """Write the rows of a source to a columnar table in a new directory, and return the ColumnarTable
+
+    :param source: Iterable of lists or tuples
+    :param directory: Path of the table directory, which must not exist
+    """
+    import json
+    import shutil
+
+    tmp = directory.rstrip(os.sep) + '.tmp-{}'.format(os.getpid())
+    os.makedirs(tmp)
+
+    columns = []
+    n = 0
+
+    try:
+        for row in source:
+            for i in range(len(columns), len(row)):
+                columns.append(_ColumnWriter(tmp, i, n))
+
+            for i, col in enumerate(columns):
+                col.add(row[i] if i < len(row) else None)
+
+            n += 1
+
+        for col in columns:
+            col.close()
+
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'version': COLUMNAR_VERSION, 'n_rows': n, 'n_cols': len(columns)}, f)
+
+        # Readers never see a partly written table
+        os.rename(tmp, directory)
+
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    return ColumnarTable(directory)
+
+
+class ColumnarTable(object):
+    """A table written by write_columnar(), read from memory mapped arrays. Iterates over rows, like the
+    source it was written from."""
+
+    def __init__(self, directory):
+        import json
+
+        self.directory = directory
+
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+
+        if meta['version'] != COLUMNAR_VERSION:
+            raise ValueError("Columnar table version {} is not {}".format(meta['version'], COLUMNAR_VERSION))
+
+        self.n_rows = meta['n_rows']
+        self.n_cols = meta['n_cols']
+
+        self._arrays = OrderedDict()  # Most recently used maps, last
+
+    def _array(self, i, name):
+        import numpy as np
+
+        key = (i, name)
+
+        if key in self._arrays:
+            self._arrays.move_to_end(key)
+        else:
+            if len(self._arrays) >= MAX_MAPS:
+                self._arrays.popitem(last=False)  # Unmapped when no views of it are left
+
+            dtype = {'tags': np.uint8, 'ints': np.int64, 'floats': np.float64,
+                     'offsets': np.int64, 'heap': np.uint8}[name]
+
+            path = os.path.join(self.directory, 'c{}'.format(i), name)
+
+            if os.path.getsize(path):
+                self._arrays[key] = np.memmap(path, dtype=dtype, mode='r')
+            else:
+                self._arrays[key] = np.zeros(0, dtype=dtype)
+
+        return self._arrays[key]
+
+    def tags(self, i):
+        return self._array(i, 'tags')
+
+    def numeric(self, i, start=0, stop=None):
+        """Float64 array of the values of column i, with NaN for cells that are not numbers"""
+        import numpy as np
+
+        tags = self.tags(i)[start:stop]
+        floats = self._array(i, 'floats')[start:stop]
+
+        if not ((tags == INT) | (tags == BOOL)).any():
+            return np.where(tags == FLOAT, floats, np.nan)
+
+        ints = self._array(i, 'ints')[start:stop]
+
+        return np.where(tags == FLOAT, floats, np.where((tags == INT) | (tags == BOOL), ints, np.nan))
+
+    def column(self, i, start=0, stop=None):
+        """List of the Python values of column i"""
+
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+
+        tags = self.tags(i)[start:stop]
+        values = [None] * len(tags)
+
+        ints = self._array(i, 'ints')[start:stop].tolist()
+        floats = self._array(i, 'floats')[start:stop].tolist()
+        offsets = self._array(i, 'offsets')[start:stop + 1].tolist()
+        heap = self._array(i, 'heap')
+
+        lo = offsets[0] if offsets else 0
+        text = bytes(heap[lo:offsets[-1]]) if offsets and offsets[-1] > lo else b''
+
+        for j, tag in enumerate(tags.tolist()):
+            if tag == NONE:
+                continue
+            elif tag == INT:
+                values[j] = ints[j]
+            elif tag == FLOAT:
+                values[j] = floats[j]
+            elif tag == BOOL:
+                values[j] = bool(ints[j])
+            else:
+                b = text[offsets[j] - lo:offsets[j + 1] - lo]
+
+                if tag == STR:
+                    values[j] = b.decode('utf-8', 'surrogatepass')
+                elif tag == BYTES:
+                    values[j] = b
+                elif tag == BIGINT:
+                    values[j] = int(b)
+                elif tag == DATE:
+                    values[j] = datetime.date.fromisoformat(b.decode('ascii'))
+                elif tag == DATETIME:
+                    values[j] = datetime.datetime.fromisoformat(b.decode('ascii'))
+                elif tag == TIME:
+                    values[j] = datetime.time.fromisoformat(b.decode('ascii'))
+
+        return values
+
+    def rows(self, start=0, stop=None):
+        """Yield the rows from start to stop, as lists"""
+
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+
+        for chunk in range(start, stop, CHUNK_ROWS):
+            chunk_stop = min(chunk + CHUNK_ROWS, stop)
+            columns = [self.column(i, chunk, chunk_stop) for i in range(self.n_cols)]
+
+            for row in zip(*columns):
+                yield list(row)
+
+    def __iter__(self):
+        return self.rows()
+
+    def __len__(self):
+        return self.n_rows
+
+    def head(self, n):
+        return list(self.rows(0, n))
+
+    def tail(self, n):
+        return list(self.rows(max(0, self.n_rows - n)))
+
+    def to_dataframe(self, header_row=0):
+        """Return a pandas DataFrame of the rows after header_row, with header_row as the column names"""
+        from pandas import DataFrame
+
+        header = self.head(header_row + 1)[header_row]
+        data = {h: self.column(i, header_row + 1) for i, h in enumerate(header)}
+
+        return DataFrame(data, columns=header)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Compare profiles of two versions of a table, to find columns that have drifted.
+
+A profile is a JSON serializable dict, made from Stats and TypeIntuiter results with make_profile(), so
+profiles can be stored when a table is processed and compared later without the data.
+
+"""
+
+from collections import OrderedDict, namedtuple
+from math import log, isnan
+
+PROFILE_VERSION = 1
+
+# Score, for each kind of drift, at which the drift is reported. Drifts are ranked by score / threshold.
+DRIFT_THRESHOLDS = {
+    'added': 1.0,  # Column is new
+    'removed': 1.0,  # Column is gone
+    'type': 1.0,  # Type changed
+    'null_rate': .05,  # Absolute change in the fraction of nulls
+    'mean': .2,  # Change in the mean, in standard deviations
+    'std': .2,  # Absolute log of the ratio of standard deviations
+    'quantile': .25,  # Largest change in a quartile, in standard deviations
+    'psi': .1,  # Population stability index of the histograms
+    'ks': .1,  # Kolmogorov-Smirnov distance of the histograms
+    'top_values': .2,  # Fraction of the old top values' count whose values are no longer top values
+}
+
+Drift = namedtuple('Drift', 'column kind old new score severity')
+
+
+def _number(v):
+    """Return a float, or None for values that aren't finite numbers"""
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+
+    return None if isnan(v) or v in (float('inf'), float('-inf')) else v
+
+
+def make_profile(stats=None, types=None):
+    """Return a profile dict for a table from a Stats, a TypeIntuiter, or both."""
+
+    columns = OrderedDict()
+
+    if types is not None:
+        for c in types.columns.values():
+            columns[c.header] = OrderedDict([
+                ('type', c.resolved_type_name),
+                ('count', c.count),
+                ('nulls', c.type_counts.get(None, 0)),
+                ('length', c.length),
+            ])
+
+    if stats is not None:
+        for name, ss in stats.dict.items():
+            d = columns.setdefault(name, OrderedDict())
+            sd = ss.dict
+
+            d.setdefault('type', sd['type'])
+            d['count'] = ss.n
+            d['nulls'] = ss.n_nulls
+            d['lom'] = ss.lom
+            d['nuniques'] = ss.nuniques
+
+            for k in ('mean', 'std', 'min', 'p25', 'p50', 'p75', 'max'):
+                if k in sd:
+                    d[k] = _number(sd[k]) if ss.is_numeric else (str(sd[k]) if sd[k] is not None else None)
+
+            if ss.is_numeric and ss.bin_min is not None and any(ss.bins):
+                d['hist'] = list(ss.bins)
+                d['hist_min'] = ss.bin_min
+                d['hist_max'] = ss.bin_max
+
+            if ss.sample_values:
+                d['uvalues'] = OrderedDict((str(k), v) for k, v in ss.uvalues.items())
+
+    return OrderedDict([('version', PROFILE_VERSION), ('columns', columns)])
+
+
+def _hist_cdf(bins, lo, hi):
+    """Return a function for the cumulative distribution of a histogram, assuming values are uniform
+    in each bin"""
+    from bisect import bisect_right
+
+    total = float(sum(bins))
+    width = (hi - lo) / len(bins)
+    edges = [lo + width * i for i in range(len(bins) + 1)]
+    cum = [0.0]
+    for b in bins:
+        cum.append(cum[-1] + b / total)
+
+    def cdf(x):
+        if x <= lo:
+            return 0.0
+        if x >= hi:
+            return 1.0
+        i = min(bisect_right(edges, x) - 1, len(bins) - 1)
+        return cum[i] + (cum[i + 1] - cum[i]) * (x - edges[i]) / width
+
+    return cdf, edges
+
+
+def hist_distances(old, new):
+    """Return the population stability index and Kolmogorov-Smirnov distance between two profile column
+    histograms, with the new histogram re-binned onto the bins of the old one"""
+
+    old_cdf, old_edges = _hist_cdf(old['hist'], old['hist_min'], old['hist_max'])
+    new_cdf, new_edges = _hist_cdf(new['hist'], new['hist_min'], new['hist_max'])
+
+    eps = 1e-4
+    psi = 0.0
+    for a, b in zip(old_edges, old_edges[1:]):
+        p = max(old_cdf(b) - old_cdf(a), eps)
+        q = max(new_cdf(b) - new_cdf(a), eps)
+        psi += (q - p) * log(q / p)
+
+    # Both CDFs are piecewise linear, so the largest difference is at one of the edges
+    ks = max(abs(old_cdf(x) - new_cdf(x)) for x in old_edges + new_edges)
+
+    return psi, ks
+
+
+class ProfileDiff(object):
+    """Compare two profiles, and rank the columns that have drifted. """
+
+    def __init__(self, old, new, thresholds=None):
+        """
+        :param old: Profile dict for the earlier version of the table, from make_profile()
+        :param new: Profile dict for the later version
+        :param thresholds: Dict to override entries in DRIFT_THRESHOLDS
+        """
+
+        self.old = old
+        self.new = new
+        self.thresholds = dict(DRIFT_THRESHOLDS, **(thresholds or {}))
+        self.drifts = []
+
+    def _add(self, column, kind, old, new, score):
+        if score is None:
+            return
+
+        severity = score / self.thresholds[kind]
+
+        if severity >= 1:
+            self.drifts.append(Drift(column, kind, old, new, score, severity))
+
+    def run(self):
+        from .types import TypeIntuiter
+
+        old_cols = self.old['columns']
+        new_cols = self.new['columns']
+
+        for name in new_cols:
+            if name not in old_cols:
+                self._add(name, 'added', None, new_cols[name].get('type'), 1.0)
+
+        for name, o in old_cols.items():
+            n = new_cols.get(name)
+
+            if n is None:
+                self._add(name, 'removed', o.get('type'), None, 1.0)
+                continue
+
+            ot, nt = o.get('type'), n.get('type')
+            if ot != nt:
+                try:
+                    promoted = TypeIntuiter.promote_type(ot, nt)
+                except ValueError:
+                    promoted = None
+                # A widening, like int to float, is less severe than a narrowing or unrelated change.
+                self._add(name, 'type', ot, nt, 1.0 if promoted == nt else 2.0)
+
+            if o.get('count') and n.get('count'):
+                onr, nnr = o.get('nulls', 0) / float(o['count']), n.get('nulls', 0) / float(n['count'])
+                self._add(name, 'null_rate', onr, nnr, abs(nnr - onr))
+
+            self._numeric(name, o, n)
+            self._top_values(name, o, n)
+
+        self.drifts.sort(key=lambda d: d.severity, reverse=True)
+
+        return self
+
+    def _numeric(self, name, o, n):
+
+        std = _number(o.get('std'))
+        nstd = _number(n.get('std'))
+
+        if std:
+            om, nm = _number(o.get('mean')), _number(n.get('mean'))
+            if om is not None and nm is not None:
+                self._add(name, 'mean', om, nm, abs(nm - om) / std)
+
+            if nstd:
+                self._add(name, 'std', std, nstd, abs(log(nstd / std)))
+
+            shifts = [(k, _number(o.get(k)), _number(n.get(k))) for k in ('p25', 'p50', 'p75')]
+            shifts = [(k, a, b) for k, a, b in shifts if a is not None and b is not None]
+            if shifts:
+                k, a, b = max(shifts, key=lambda e: abs(e[2] - e[1]))
+                self._add(name, 'quantile', (k, a), (k, b), abs(b - a) / std)
+
+        if o.get('hist') and n.get('hist') and sum(o['hist']) and sum(n['hist']) \
+                and o['hist_max'] > o['hist_min'] and n['hist_max'] > n['hist_min']:
+            psi, ks = hist_distances(o, n)
+            self._add(name, 'psi', None, None, psi)
+            self._add(name, 'ks', None, None, ks)
+
+    def _top_values(self, name, o, n):
+
+        ou, nu = o.get('uvalues'), n.get('uvalues')
+
+        # The top values of a continuous numeric column are mostly the first values seen
+        if not ou or not nu or o.get('lom') in ('i', 'r'):
+            return
+
+        total = float(sum(ou.values()))
+        vanished = [k for k in ou if k not in nu]
+        added = [k for k in nu if k not in ou]
+
+        if total:
+            self._add(name, 'top_values', vanished, added, sum(ou[k] for k in vanished) / total)
+
+    def __iter__(self):
+        return iter(self.drifts)
+
+    def __len__(self):
+        return len(self.drifts)
+
+    def __str__(self):
+        from tabulate import tabulate
+
+        def fmt(v):
+            if isinstance(v, list):
+                v = ','.join(str(e) for e in v[:5]) + (',..' if len(v) > 5 else '')
+            return v
+
+        rows = [[d.column, d.kind, fmt(d.old), fmt(d.new), d.score, d.severity] for d in self.drifts]
+
+        if rows:
+            return 'Drift \n' + tabulate(rows, ['column', 'kind', 'old', 'new', 'score', 'severity'], tablefmt='pipe')
+        else:
+            return 'Drift: None \n'
+
+
+def diff_profiles(old, new, thresholds=None):
+    """Return a list of Drift records for the columns that have drifted between two profiles,
+    most severe first"""
+    return ProfileDiff(old, new, thresholds).run().drifts
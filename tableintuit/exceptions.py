@@ -13,3 +13,11 @@ class RowIntuitError(Exception):
 class StatsError(Exception):
     pass
 
+class PipelineError(Exception):
+    pass
+
+class CheckpointError(Exception):
+    pass
+
+class ServiceError(Exception):
+    pass
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Intuit one schema for a table that is split across many partition files, such as monthly CSV files.
+
+The types of each shard are intuited in a pool of processes. The shard results are aligned by column header,
+so columns may be in a different order in different shards, and merged. Each column of the schema gets the
+narrowest type that covers its type in every shard, from the precomputed join table of the type lattice, so
+numbers and dates in different shards are str, and the shards that differ from the schema, in their columns,
+column order or types, are reported.
+
+"""
+
+from collections import OrderedDict
+
+
+def _intuit_shard(source, sample):
+    """Worker: intuit the types of a shard, where the first row is the header"""
+    import os
+    from .types import TypeIntuiter
+
+    if sample and os.path.exists(source):
+        from .seek import SeekSampler
+        rows = SeekSampler(source, sample_rows=sample)
+    else:
+        from rowgenerators import RowGenerator
+        rows = RowGenerator(url=source)
+
+    return summarize(TypeIntuiter().run(rows))
+
+
+def _type_name(column):
+    """Name of a column's resolved type in the type precedence, or None for columns with no values"""
+    import datetime
+    from functools import reduce
+    from .types import type_rank, type_join
+
+    name = column.resolved_type_name
+
+    if name is None or not isinstance(name, str):
+        # Date and time strings are counted by their parsed types, which the resolution doesn't consider, so a
+        # shard of only dates or times resolves to None, like one with no values
+        temporal = [t.__name__ for t in (datetime.date, datetime.time, datetime.datetime)
+                     if column.type_counts.get(t)]
+
+        if not temporal:
+            return None  # No values, or only NaNs
+
+        return reduce(lambda a, b: type_join[a, b], temporal)
+
+    return name if name in type_rank else 'object'
+
+
+def summarize(intuiter):
+    """Shard summary of a TypeIntuiter, a list of (position, header, type name, Column). The types are resolved
+    when the shard is intuited, in the workers, so merging doesn't resolve each column of each shard"""
+
+    return [(pos, col.header, _type_name(col), col) for pos, col in intuiter.columns.items()]
+
+
+class Divergence(object):
+    """A way that a shard differs from the merged schema"""
+
+    def __init__(self, shard, kind, column=None, expected=None, found=None):
+        self.shard = shard
+        self.kind = kind  # 'missing', 'order', 'type' or 'error'
+        self.column = column
+        self.expected = expected
+        self.found = found
+
+    @property
+    def dict(self):
+        return OrderedDict([('shard', self.shard), ('kind', self.kind), ('column', self.column),
+                            ('expected', self.expected), ('found', self.found)])
+
+    def __repr__(self):
+        return '<Divergence {} {} {} {}->{}>'.format(self.shard, self.kind, self.column, self.expected, self.found)
+
+
+class PartitionIntuiter(object):
+    """Intuit the types of a table that is split across files, and reconcile them into one schema"""
+
+    def __init__(self, workers=None, timeout=None, sample=None):
+        """
+        :param workers: Number of worker processes. Defaults to the number of CPUs. If 0, intuit in this process
+        :param timeout: Seconds allowed for each shard
+        :param sample: If set, the number of rows to sample from each local shard with a SeekSampler
+        """
+
+        self.workers = workers
+        self.timeout = timeout
+        self.sample = sample
+
+        self.shards = []  # Sources of the shards that were merged, in order
+        self.headers = OrderedDict()  # Shard source to its header
+        self.shard_types = OrderedDict()  # Shard source to a dict of column name to type name
+        self.columns = OrderedDict()  # Merged Column for each column name
+        self.types = OrderedDict()  # Column name to type name, promoted over the shards
+        self.errors = OrderedDict()  # Shard source to error message
+        self.divergences = []
+
+    def run(self, sources):
+        """Intuit the shards in parallel, then merge them
+
+        :param sources: Paths and URLs of the shards. Directories and glob patterns are expanded
+        """
+        from .profiler import map_sources
+
+        results = {}
+
+        for record in map_sources(_intuit_shard, sources, (self.sample,), self.workers, self.timeout):
+            if 'error' in record:
+                self.errors[record['source']] = record['error']
+            else:
+                results[record['source']] = record['result']
+
+        return self.merge(results)
+
+    @staticmethod
+    def column_key(header, position):
+        """The key that aligns a column across shards: the header, ignoring case and extra whitespace"""
+
+        if header is None or not str(header).strip():
+            return 'col{}'.format(position)
+
+        return ' '.join(str(header).lower().split())
+
+    def merge(self, intuiters):
+        """Merge the TypeIntuiters of shards, aligned by column header
+
+        :param intuiters: Dict of shard source to TypeIntuiter or summarize() list, or a sequence of
+            (source, TypeIntuiter or list), merged in order of source
+        """
+        from functools import reduce
+        from .types import Column, type_join
+
+        items = sorted(intuiters.items() if isinstance(intuiters, dict) else intuiters, key=lambda e: str(e[0]))
+
+        names = OrderedDict()  # Key to the name used in the schema, the first header seen for the column
+        orders = {}  # Shard source to its column keys, in order
+
+        for source, summary in items:
+            self.shards.append(source)
+
+            if not isinstance(summary, list):
+                summary = summarize(summary)
+
+            keys = []
+            header = []
+            shard_types = OrderedDict()
+
+            for pos, col_header, type_name, col in summary:
+                key = self.column_key(col_header, pos)
+
+                if key in keys:
+                    key = '{}_{}'.format(key, pos)  # Duplicate header in the shard
+
+                if key not in names:
+                    header_name = col_header if col_header is not None else key
+                    names[key] = header_name if header_name not in self.columns else key
+
+                name = names[key]
+
+                keys.append(key)
+                header.append(col_header)
+
+                if name not in self.columns:
+                    merged = self.columns[name] = Column()
+                    merged.position = len(self.columns) - 1
+                    merged.header = name
+
+                self.columns[name].merge(col)
+                shard_types[name] = type_name
+
+            orders[source] = keys
+            self.headers[source] = header
+            self.shard_types[source] = shard_types
+
+        # Promote over the shards, with the precomputed join table
+        for name in self.columns:
+            types = set(t for t in (st.get(name) for st in self.shard_types.values()) if t is not None)
+            self.types[name] = reduce(lambda a, b: type_join[a, b], sorted(types)) if types else None
+
+        self._divergences(list(names), orders)
+
+        return self
+
+    def _divergences(self, keys, orders):
+
+        names = list(self.columns)
+        key_names = dict(zip(keys, names))
+
+        self.divergences = [Divergence(source, 'error', found=error) for source, error in self.errors.items()]
+
+        for source in self.shards:
+            shard_keys = orders[source]
+            shard_types = self.shard_types[source]
+            present = set(shard_keys)
+
+            for key, name in zip(keys, names):
+                if key not in present:
+                    self.divergences.append(Divergence(source, 'missing', name))
+
+            # The columns the shard has, in the order of the schema
+            expected = [k for k in keys if k in present]
+
+            if shard_keys != expected:
+                self.divergences.append(Divergence(source, 'order', expected=[key_names[k] for k in expected],
+                                                   found=[key_names[k] for k in shard_keys]))
+
+            for name, found in shard_types.items():
+                if found is not None and found != self.types[name]:
+                    self.divergences.append(Divergence(source, 'type', name, self.types[name], found))
+
+    @property
+    def schema(self):
+        """List of (name, type) for the merged columns. Columns with no values in any shard are str"""
+        from .types import TypeIntuiter
+
+        def python_type(t):
+            try:
+                return TypeIntuiter.normalize_type(t) if t else str
+            except KeyError:
+                return str  # 'unicode'
+
+        return [(name, python_type(t)) for name, t in self.types.items()]
+
+    @property
+    def dict(self):
+        return OrderedDict([
+            ('shards', len(self.shards)),
+            ('errors', len(self.errors)),
+            ('schema', [OrderedDict([('name', name), ('type', t),
+                                     ('shards', sum(1 for st in self.shard_types.values() if name in st))])
+                        for name, t in self.types.items()]),
+            ('divergences', [d.dict for d in self.divergences])
+        ])
+
+    def __str__(self):
+        from tabulate import tabulate
+        from collections import Counter
+
+        rows = []
+        for name, t in self.types.items():
+            seen = Counter(st[name] for st in self.shard_types.values() if name in st)
+            rows.append([name, t, sum(seen.values()), ', '.join('{}:{}'.format(k, v) for k, v in seen.most_common())])
+
+        o = 'PartitionIntuiter {} shards, {} errors, {} divergences'.format(len(self.shards), len(self.errors),
+                                                                            len(self.divergences))
+
+        if rows:
+            o += '\n' + tabulate(rows, ['column', 'type', 'shards', 'shard types'], tablefmt='pipe')
+
+        return o
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Read rows on a background thread or process, so that parsing the source overlaps with
+computing types or stats on the rows.
+
+"""
+
+import queue
+import threading
+
+from .exceptions import PipelineError
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_BATCHES = 16
+
+
+class _ReaderError(object):
+    """Carries an exception from the reader to the consumer"""
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def read_ahead(source, batch_size=DEFAULT_BATCH_SIZE, max_batches=DEFAULT_MAX_BATCHES, use_process=False):
+    """Yield the rows of a source, which are read in batches by a background reader into a bounded queue.
+    The reader blocks when the queue is full, and an exception in the reader is re-raised in the consumer.
+
+    The source must yield a new object for each row, since rows are held in batches before they are consumed.
+
+    :param source: An iterable of rows. With use_process, a picklable callable that returns the iterable, which
+        is called in the reader process.
+    :param batch_size: Number of rows in each batch passed through the queue
+    :param max_batches: Number of batches the queue can hold before the reader blocks
+    :param use_process: If True, read in a separate process, for parsers that hold the GIL
+    :return: Row generator
+    """
+
+    if use_process:
+        return _process_read_ahead(source, batch_size, max_batches)
+    else:
+        return _thread_read_ahead(source, batch_size, max_batches)
+
+
+def _thread_read_ahead(source, batch_size, max_batches):
+
+    q = queue.Queue(max_batches)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for space in the queue, but give up if the consumer has gone away
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            batch = []
+            for row in source:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+
+            if batch and not put(batch):
+                return
+
+            put(None)
+
+        except BaseException as e:
+            put(_ReaderError(e))
+
+    t = threading.Thread(target=reader, name='tableintuit-reader', daemon=True)
+    t.start()
+
+    try:
+        while True:
+            batch = q.get()
+
+            if batch is None:
+                break
+
+            if isinstance(batch, _ReaderError):
+                raise batch.exc
+
+            for row in batch:
+                yield row
+    finally:
+        stop.set()
+
+
+def _process_reader(factory, q, batch_size):
+    import pickle
+
+    try:
+        batch = []
+        for row in factory():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                q.put(batch)
+                batch = []
+
+        if batch:
+            q.put(batch)
+
+        q.put(None)
+
+    except BaseException as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = PipelineError('Reader failed: {}: {}'.format(type(e).__name__, e))
+
+        q.put(_ReaderError(e))
+
+
+def _process_read_ahead(factory, batch_size, max_batches):
+    import multiprocessing
+
+    if not callable(factory):
+        raise PipelineError("Reading in a process requires a callable that returns the source rows")
+
+    q = multiprocessing.Queue(max_batches)
+    p = multiprocessing.Process(target=_process_reader, args=(factory, q, batch_size),
+                                name='tableintuit-reader', daemon=True)
+    p.start()
+
+    try:
+        while True:
+            try:
+                batch = q.get(timeout=1)
+            except queue.Empty:
+                if not p.is_alive():
+                    raise PipelineError("Reader process exited with code {}".format(p.exitcode))
+                continue
+
+            if batch is None:
+                break
+
+            if isinstance(batch, _ReaderError):
+                raise batch.exc
+
+            for row in batch:
+                yield row
+    finally:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+        q.close()
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Row structure, types and stats for a table in one pass over the rows.
+
+"""
+
+import os
+from collections import deque
+
+
+class TableProfiler(object):
+    """Run the RowIntuiter, TypeIntuiter and Stats on a source in one pass.
+
+    The head of the source is buffered, and the RowIntuiter finds the header and the start of data in it. The
+    types of the data rows in the head are the schema for the Stats. The buffered rows are then replayed into the
+    TypeIntuiter and Stats, and the rest of the source is streamed into both. Rows reach them
+    tail_size rows late, so the footer rows found by the RowIntuiter at the end of the source are left out.
+
+    The TypeIntuiter sees all of the data rows, so its types may differ from the schema the stats were
+    computed with, if the head is not representative of the rest of the table.
+    """
+
+    def __init__(self, head_size=1000, tail_size=150, **stats_kwargs):
+        """
+        :param head_size: Number of rows buffered for intuiting the row structure and the stats schema
+        :param tail_size: Number of rows at the end of the source that are checked for footers
+        :param stats_kwargs: Arguments for Stats, such as descriptive and distribution. With pipelined, the data
+            rows are read ahead on a background thread, since the TypeIntuiter is fed as they are read
+        """
+
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.stats_kwargs = stats_kwargs
+
+        self.rows = None  # RowIntuiter
+        self.types = None  # TypeIntuiter
+        self.stats = None  # Stats
+        self.header = None
+        self.schema = None
+        self.n_rows = 0  # Rows in the source, including headers, comments and footers
+        self.n_data_rows = 0
+
+    def run(self, source):
+        """Profile the source, which yields lists or tuples, with the header rows, if any, in the data"""
+        from itertools import islice
+        from .rows import RowIntuiter
+        from .types import TypeIntuiter
+        from .stats import Stats
+
+        source = iter(source)
+
+        head = list(islice(source, self.head_size))
+
+        self.rows = RowIntuiter().run(head)
+
+        self.header = self._make_header(head)
+        self.types = TypeIntuiter().process_header(self.header)
+
+        data_head = head[self.rows.start_line:]
+
+        head_types = TypeIntuiter().process_header(self.header)
+        for i, row in enumerate(data_head):
+            head_types.process_row(i, self._pad(row))
+
+        # Columns with no resolved type, such as all empty columns, get stats as strings
+        self.schema = [(c.header, c.resolved_type if isinstance(c.resolved_type, type) else str)
+                       for c in head_types.columns.values()]
+
+        rows = self._data_rows(head, source)
+        stats_kwargs = dict(self.stats_kwargs)
+
+        if stats_kwargs.pop('pipelined', False):
+            # Read ahead here, rather than in Stats, so that the drain below reads from the same queue as Stats,
+            # and the reader thread is the only one that iterates the rows
+            from .pipeline import read_ahead
+            rows = read_ahead(rows)
+
+        self.stats = Stats(rows, self.schema, **stats_kwargs).run()
+
+        # Stats may stop early when it converges, but the types and the row counts cover the whole source
+        for _ in rows:
+            pass
+
+        return self
+
+    def _make_header(self, head):
+        """The header from the RowIntuiter, with names for unnamed or duplicate columns"""
+
+        header = list(getattr(self.rows, 'headers', None) or [])
+        width = max([len(header)] + [len(row) for row in head[self.rows.start_line:]])
+
+        header = header + [None] * (width - len(header))
+
+        names = []
+        for i, h in enumerate(header):
+            name = str(h).strip() if h is not None and str(h).strip() else 'col{}'.format(i)
+            if name in names:
+                name = '{}_{}'.format(name, i)
+            names.append(name)
+
+        return names
+
+    def _pad(self, row):
+        row = list(row)
+        if len(row) < len(self.header):
+            row += [None] * (len(self.header) - len(row))
+        return row
+
+    def _data_rows(self, head, source):
+        """Yield the header, then the data rows, feeding the TypeIntuiter as they go by"""
+        from itertools import chain, islice
+        from .rows import RowIntuiter
+
+        yield self.header
+
+        start = self.rows.start_line
+        pending = deque()  # Data rows held back until they are known not to be footers
+
+        n = 0
+        for n, row in enumerate(chain(head, source), 1):
+            if n - 1 < start:
+                continue
+
+            pending.append(row)
+
+            if len(pending) > self.tail_size:
+                yield self._add_type_row(pending.popleft())
+
+        self.n_rows = n
+
+        # Find the footers in the rows at the end, with the patterns from the head
+        tail = list(pending)
+        end_line = RowIntuiter().run(head, tail, n).end_line if tail else None
+
+        if end_line is not None:
+            self.rows.end_line = end_line
+            keep = max(0, end_line + 1 - (n - len(pending)))
+        else:
+            keep = len(pending)
+
+        for row in islice(pending, keep):
+            yield self._add_type_row(row)
+
+    def _add_type_row(self, row):
+        row = self._pad(row)
+        self.n_data_rows += 1
+        self.types.process_row(self.n_data_rows, row)
+        return row
+
+    @property
+    def dict(self):
+        """The results as a dict, with type names in place of types, so it can be serialized as JSON"""
+
+        type_order = self.types.type_order
+
+        return {
+            'rows': self.rows.spec,
+            'header': self.header,
+            'n_rows': self.n_rows,
+            'n_data_rows': self.n_data_rows,
+            'types': [{(k if isinstance(k, str) else type_order.get(k, str(k))): v for k, v in row.items()}
+                      for row in self.types.to_rows()],
+            'stats': [self.stats[name].dict for name, _ in self.schema]
+        }
+
+    def __str__(self):
+        return '\n\n'.join(str(e) for e in ('Rows {}'.format(self.rows.spec), self.types, self.stats))
+
+
+def profile_file(url, sample=None, cache=None, head_size=1000, tail_size=150, **stats_kwargs):
+    """Profile a file or URL with a TableProfiler, and return its dict
+
+    :param url: Path to a file, or a URL, read with rowgenerators
+    :param sample: If set, for a local delimited file, the number of rows to sample with a SeekSampler
+    :param cache: A ResultCache, or the directory of one, for the results for local files
+    :param head_size: TableProfiler head size
+    :param tail_size: TableProfiler tail size
+    :param stats_kwargs: Arguments for Stats. Defaults to descriptive and distribution stats
+    """
+
+    options = dict(head_size=head_size, tail_size=tail_size, **(stats_kwargs or dict(descriptive=True,
+                                                                                     distribution=True)))
+
+    def compute():
+        if sample and os.path.exists(url):
+            from .seek import SeekSampler
+            source = SeekSampler(url, sample_rows=sample)
+        else:
+            from rowgenerators import RowGenerator
+            source = RowGenerator(url=url)
+
+        return TableProfiler(**options).run(source).dict
+
+    if cache and os.path.exists(url):
+        from .cache import ResultCache
+
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+
+        return cache.get_or_compute(url, dict(options, sample=sample), compute)
+
+    return compute()
+
+
+def expand_sources(sources):
+    """Expand directories, to the files in them, and glob patterns, to the files that match, in a list of
+    paths and URLs. Other entries are left as they are"""
+    import glob
+
+    if isinstance(sources, str):
+        sources = [sources]
+
+    expanded = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                expanded.extend(os.path.join(root, f) for f in sorted(files) if not f.startswith('.'))
+        elif glob.has_magic(source) and '://' not in source:
+            expanded.extend(p for p in sorted(glob.glob(source, recursive=True)) if os.path.isfile(p))
+        else:
+            expanded.append(source)
+
+    return expanded
+
+
+class _Timeout(BaseException):
+    """Raised by the alarm for a timeout in this process. A BaseException, so the broad except blocks in the
+    type tests and row generators don't catch it"""
+
+
+def _run_one(func, source, args, timeout=None):
+    """Call func(source, *args), returning a result record rather than raising. A timeout is enforced with an
+    alarm, for calls in this process; workers are timed out by the parent, which terminates them"""
+    import signal
+    import time
+    import traceback
+
+    def on_alarm(signum, frame):
+        raise _Timeout()
+
+    start = time.time()
+
+    use_alarm = timeout and hasattr(signal, 'setitimer')
+
+    if use_alarm:
+        old = signal.signal(signal.SIGALRM, on_alarm)
+
+    try:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+
+        return {'source': source, 'result': func(source, *args), 'elapsed': time.time() - start}
+    except _Timeout:
+        return _timed_out(source, timeout, time.time() - start)
+    except Exception as e:
+        return {'source': source, 'error': '{}: {}'.format(type(e).__name__, e),
+                'traceback': traceback.format_exc(), 'elapsed': time.time() - start}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old)
+
+
+def _timed_out(source, timeout, elapsed):
+    return {'source': source, 'error': 'TimeoutError: Timed out after {} seconds'.format(timeout),
+            'timed_out': True, 'elapsed': elapsed}
+
+
+def _worker(conn):
+    """Worker process loop: run (func, source, args) tasks from the connection, and send back the records"""
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        if task is None:
+            return
+
+        func, source, args = task
+        record = _run_one(func, source, args)
+
+        try:
+            conn.send(record)
+        except Exception as e:
+            # Such as a result that can't be pickled
+            conn.send({'source': source, 'error': '{}: {}'.format(type(e).__name__, e),
+                       'elapsed': record.get('elapsed')})
+
+
+class _Worker(object):
+    """A worker process, with a pipe for tasks and results, and the task it is running"""
+
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+        self.source = None
+        self.started = None
+
+    def submit(self, func, source, args):
+        import time
+
+        self.conn.send((func, source, args))
+        self.source = source
+        self.started = time.time()
+
+    def done(self):
+        self.source = None
+        self.started = None
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.conn.send(None)
+            except (IOError, OSError):
+                self.process.terminate()
+
+        self.process.join(1)
+
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+        self.conn.close()
+
+
+def map_sources(func, sources, args=(), workers=None, timeout=None):
+    """Call func(source, *args) for many sources in a pool of processes, yielding a result record for each
+    source as it finishes.
+
+    Local files are started largest first, so a large file doesn't start last and hold up the end of the batch.
+    Each record is a dict with the source, and either the result, or the error and its traceback. Each worker runs
+    one source at a time, so a failure is isolated to its source: a worker that exits is replaced, and a worker
+    that runs longer than the timeout is terminated and replaced, and its record has 'timed_out' set.
+
+    :param func: Picklable function, such as a module level function
+    :param sources: Paths and URLs. Directories and glob patterns are expanded. See expand_sources()
+    :param args: Additional arguments for func
+    :param workers: Number of worker processes. Defaults to the number of CPUs. If 0, call in this process
+    :param timeout: Seconds allowed for each source
+    """
+    import multiprocessing
+    import time
+    from multiprocessing.connection import wait
+
+    def size(source):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return -1  # URLs and missing files go last
+
+    pending = sorted(expand_sources(sources), key=size, reverse=True)
+
+    if workers == 0:
+        for source in pending:
+            yield _run_one(func, source, args, timeout)
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+
+    if not workers:
+        return
+
+    ctx = multiprocessing.get_context()
+    pending.reverse()  # Pop from the end, largest first
+    pool = [_Worker(ctx) for _ in range(workers)]
+
+    def replace(worker, kill):
+        worker.stop(kill=kill)
+        pool[pool.index(worker)] = _Worker(ctx)
+
+    try:
+        while True:
+            for worker in pool:
+                if worker.source is None and pending:
+                    worker.submit(func, pending.pop(), args)
+
+            busy = [w for w in pool if w.source is not None]
+
+            if not busy:
+                break
+
+            if timeout:
+                now = time.time()
+                wait_time = max(0, min(w.started + timeout for w in busy) - now)
+            else:
+                wait_time = None
+
+            ready = wait([w.conn for w in busy], wait_time)
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        record = worker.conn.recv()
+                    except (EOFError, OSError):
+                        record = {'source': worker.source, 'error': 'The worker process exited',
+                                  'elapsed': time.time() - worker.started}
+                        worker.done()
+                        replace(worker, kill=True)
+                        yield record
+                        continue
+
+                    worker.done()
+                    yield record
+
+                elif timeout and time.time() - worker.started >= timeout:
+                    record = _timed_out(worker.source, timeout, time.time() - worker.started)
+                    worker.done()
+                    replace(worker, kill=True)
+                    yield record
+    finally:
+        for worker in pool:
+            worker.stop(kill=worker.source is not None)
+
+
+def profile_many(sources, workers=None, timeout=None, **options):
+    """Profile many files in a pool of processes, yielding a result for each one as it finishes. See
+    map_sources() for the scheduling, failures and timeouts.
+
+    Each result is a dict with the source, and either the profile, from profile_file(), or the error and its
+    traceback.
+
+    :param sources: Paths and URLs. Directories and glob patterns are expanded. See expand_sources()
+    :param workers: Number of worker processes. Defaults to the number of CPUs. If 0, profile in this process
+    :param timeout: Seconds allowed for each file
+    :param options: Arguments for profile_file(), such as sample and cache
+    """
+
+    for record in map_sources(_profile_source, sources, (options,), workers, timeout):
+        if 'result' in record:
+            record['profile'] = record.pop('result')
+        yield record
+
+
+def _profile_source(source, options):
+    return profile_file(source, **options)
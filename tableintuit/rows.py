@@ -9,13 +9,15 @@ Guess the whether rows in a collection are header, comments, footers, etc
 
 """
 
-from six import binary_type, text_type
 import re
 
 
 import logging
 logger = logging.getLogger(__name__)
 
+text_type = str
+binary_type = bytes
+
 
 class RowIntuiter(object):
 
@@ -97,7 +99,7 @@ class RowIntuiter(object):
             for t in (float, int, binary_type, text_type):
                 try:
                     return type(t(v))
-                except:
+                except Exception:
                     pass
 
         def p(e):
@@ -325,7 +327,6 @@ def slugify(value):
     """
     import re
     import unicodedata
-    from six import text_type
     value = text_type(value)
     value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('utf8')
     value = re.sub(r'[^\w\s-]', '', value).strip().lower()
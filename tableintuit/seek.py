@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Sample the rows of a large local delimited file by seeking to random byte offsets, so the I/O is proportional to
+the size of the sample rather than the size of the file.
+
+At each offset, a chunk is read and the sampler resynchronizes to the next record boundary. Since the offset may
+be inside a quoted field, where a newline does not end a record, the chunk is scanned for record ends both as if the
+offset were outside quotes and as if it were inside. Each hypothesis is checked by parsing a short run of rows from
+its first record end. A hypothesis checks out if the parser finds the same records as the scan, and most of the rows
+have the width of the header, within a tolerance, so ragged and short rows don't reject a run. Offsets where neither
+hypothesis checks out, or both do equally well, are skipped. If the runs fall short of the sample size, a warning is
+logged, and the shortfall is in SeekSampler.short.
+
+Runs of rows start after a random byte, so rows that follow long rows are somewhat more likely to be sampled.
+
+"""
+
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16 * 1024  # Bytes read at each offset, until the size of the records is known
+MAX_CHUNK_SIZE = 16 * 1024 * 1024  # Largest read at one offset, for runs of very long records
+
+
+def record_ends(buf, quotechar=b'"', in_quotes=False, limit=None):
+    """Return the positions of the newlines that end records in a buffer, scanning from the start of the
+    buffer in the given quote state. Doubled quotes, for escaping, toggle the state twice.
+
+    :param buf: Bytes
+    :param quotechar: Quote character, as bytes
+    :param in_quotes: If True, the start of the buffer is inside a quoted field
+    :param limit: Stop after this many record ends
+    """
+
+    pattern = re.compile(b'[' + re.escape(quotechar) + b'\n]')
+
+    ends = []
+
+    for m in pattern.finditer(buf):
+        if m.group() == quotechar:
+            in_quotes = not in_quotes
+        elif not in_quotes:
+            ends.append(m.start())
+            if limit is not None and len(ends) >= limit:
+                break
+
+    return ends
+
+
+class SeekSampler(object):
+    """Iterate over the header and a random sample of rows of a local delimited file, read from short runs of rows
+    at random byte offsets. A source for TypeIntuiter.run() and Stats, which take the header as the first row.
+
+    With a seed, each iteration yields the same sample; without one, each iteration draws a new sample.
+    """
+
+    def __init__(self, path, sample_rows=10000, run_length=25, delimiter=',', quotechar='"', encoding='utf-8',
+                 header=True, seed=None, chunk_size=CHUNK_SIZE, width_tolerance=0, min_fit=.5):
+        """
+        :param path: Path to the file
+        :param sample_rows: Number of data rows to sample
+        :param run_length: Number of consecutive rows parsed at each offset
+        :param delimiter: Field delimiter
+        :param quotechar: Quote character
+        :param encoding: Encoding of the file. Must encode newlines and quotes as single ASCII bytes, as UTF-8 does
+        :param header: If True, the first record is the header. If False, the columns are named col0, col1 ...
+        :param seed: Random seed
+        :param chunk_size: Bytes read at each offset, until the mean size of the records is known. Files no
+            larger than this are read whole
+        :param width_tolerance: Number of fields a row may have more or fewer than the header, and still fit it
+        :param min_fit: Fraction of the rows of a run that must fit the header width for the run to be used
+        """
+
+        self.path = path
+        self.sample_rows = sample_rows
+        self.run_length = run_length
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.encoding = encoding
+        self.has_header = header
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.width_tolerance = width_tolerance
+        self.min_fit = min_fit
+
+        self._quote = quotechar.encode('ascii')
+
+        self.size = os.path.getsize(path)
+        self.header = None
+        self.data_start = 0  # Byte offset of the first data record
+
+        self.bytes_read = 0
+        self.n_runs = 0  # Offsets where rows were sampled
+        self.n_rejected = 0  # Offsets skipped because the record boundary could not be found
+        self.n_sampled = 0
+        self.short = 0  # Rows short of sample_rows in the last iteration, if the file was sampled, not read whole
+        self._run_rows = 0
+        self._run_bytes = 0
+
+        with open(path, 'rb') as f:
+            self._read_header(f)
+
+    def _read(self, f, offset, size):
+        f.seek(offset)
+        buf = f.read(size)
+        self.bytes_read += len(buf)
+        return buf
+
+    def _parse(self, buf):
+        import csv
+        import io
+
+        text = buf.decode(self.encoding, 'replace')
+        return list(csv.reader(io.StringIO(text, newline=''), delimiter=self.delimiter, quotechar=self.quotechar))
+
+    def _read_header(self, f):
+
+        size = self.chunk_size
+
+        while True:
+            buf = self._read(f, 0, size)
+            ends = record_ends(buf, self._quote, limit=1)
+
+            if ends or len(buf) >= self.size or size >= MAX_CHUNK_SIZE:
+                break
+
+            size *= 4
+
+        end = ends[0] + 1 if ends else len(buf)
+        first = self._parse(buf[:end])
+        first = first[0] if first else []
+
+        if self.has_header:
+            self.header = first
+            self.data_start = end
+        else:
+            self.header = ['col{}'.format(i) for i in range(len(first))]
+            self.data_start = 0
+
+    def _run_at(self, f, offset, aligned=False):
+        """Return the rows of a run at a byte offset, and the offset of the end of the run, or None if the record
+        boundary could not be found. If aligned, the offset is known to be the start of a record"""
+
+        n_ends = self.run_length + 1
+
+        if self._run_rows:
+            # Twice the expected size of a run, so most runs take one read
+            size = max(1024, int(2 * n_ends * self._run_bytes / float(self._run_rows)))
+        else:
+            size = self.chunk_size
+
+        while True:
+            buf = self._read(f, offset, size)
+            eof = offset + len(buf) >= self.size
+
+            if aligned:
+                hypotheses = [[-1] + record_ends(buf, self._quote, False, self.run_length)]
+            else:
+                hypotheses = [record_ends(buf, self._quote, q, n_ends) for q in (False, True)]
+
+            if eof or size >= MAX_CHUNK_SIZE or any(len(ends) >= n_ends for ends in hypotheses):
+                break
+
+            size *= 4
+
+        width = len(self.header)
+        runs = []  # ((fraction of rows that fit, fraction with the header width), rows, start, end)
+
+        for ends in hypotheses:
+            if not ends:
+                continue
+
+            start = ends[0] + 1
+            end = ends[-1] + 1 if len(ends) > 1 else start
+            n_records = len(ends) - 1
+
+            if eof and len(ends) < n_ends and buf[end:].strip():
+                end = len(buf)  # The last record of the file, without a newline
+                n_records += 1
+
+            records = self._parse(buf[start:end])
+
+            # From the wrong quote state, the parser disagrees with the scan about where the records end. Ragged
+            # rows are tolerated below, so this, rather than the widths, is what rejects the wrong hypothesis
+            if len(records) != n_records:
+                continue
+
+            rows = [row for row in records if row]  # Without blank lines
+
+            if rows:
+                fit = sum(1 for row in rows if abs(len(row) - width) <= self.width_tolerance) / float(len(rows))
+                exact = sum(1 for row in rows if len(row) == width) / float(len(rows))
+
+                if fit >= self.min_fit:
+                    runs.append(((fit, exact), rows, offset + start, offset + end))
+
+        # If both hypotheses check out, use the one that fits better, then has more rows of the header width, or
+        # neither if they are equally good
+        runs.sort(key=lambda run: run[0], reverse=True)
+
+        if not runs or (len(runs) > 1 and runs[0][0] == runs[1][0]):
+            return None
+
+        return runs[0][1:]
+
+    def __iter__(self):
+        import random
+        from math import ceil
+
+        rand = random.Random(self.seed)
+
+        self.short = 0
+
+        yield list(self.header)
+
+        span = self.size - self.data_start
+
+        if span <= 0 or self.sample_rows <= 0:
+            return
+
+        if span <= self.chunk_size:
+            with open(self.path, 'rb') as f:
+                rows = [row for row in self._parse(self._read(f, self.data_start, span)) if row]
+
+            self._run_rows, self._run_bytes = len(rows), span
+
+            for row in rows[:self.sample_rows]:
+                self.n_sampled += 1
+                yield row
+
+            return
+
+        n_runs = int(ceil(self.sample_rows / float(self.run_length)))
+        offsets = sorted(self.data_start + int(rand.random() * span) for _ in range(n_runs))
+
+        n = 0
+        rejected = self.n_rejected
+        last_end = self.data_start  # Records before this were sampled by an earlier run, or are the header
+
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                aligned = offset <= last_end  # Overlaps the last run, so continue from its end
+                offset = last_end if aligned else offset
+
+                if offset >= self.size:
+                    continue
+
+                run = self._run_at(f, offset, aligned)
+
+                if run is None:
+                    self.n_rejected += 1
+                    continue
+
+                rows, start, last_end = run
+
+                self.n_runs += 1
+                self._run_rows += len(rows)
+                self._run_bytes += last_end - start
+
+                for row in rows[:self.sample_rows - n]:
+                    n += 1
+                    self.n_sampled += 1
+                    yield row
+
+                if n >= self.sample_rows:
+                    break
+
+        if n < self.sample_rows:
+            self.short = self.sample_rows - n
+            logger.warning('Sampled {} of {} rows from {}, with {} of {} offsets rejected; about {} rows in the file'
+                           .format(n, self.sample_rows, self.path, self.n_rejected - rejected, n_runs,
+                                   self.est_rows))
+
+    @property
+    def est_rows(self):
+        """Estimate of the number of data rows in the file, from the mean size of the sampled records"""
+
+        if not self._run_rows:
+            return None
+
+        return int(round((self.size - self.data_start) / (self._run_bytes / float(self._run_rows))))
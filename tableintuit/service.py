@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+A long running local service that profiles files, so that batches of small files don't each pay for starting
+Python and importing the type and stats modules.
+
+The server listens on a Unix socket, and runs the profiles in a pool of worker processes, which import
+tableintuit and its dependencies once, when they start. Requests and responses are lines of JSON. A request is
+an object with a path, and optionally an id and the options of profiler.profile_file() that are in
+REQUEST_OPTIONS. A response has the id of its request and either the profile, as 'result', or an 'error' message.
+Requests on one connection are run concurrently, and responses are written as they finish, so a client can have
+many requests outstanding on one connection.
+
+Options that write files or choose paths, such as checkpoint, spill_dir and cache, are rejected, since the
+server runs with its own permissions. A worker that dies breaks the pool, which is replaced.
+
+"""
+
+import json
+import os
+import threading
+
+from .exceptions import ServiceError
+
+DEFAULT_QUEUE_SIZE = 256  # Requests queued or running, over all connections, before readers block
+
+# The profile_file() and Stats options that clients may set
+REQUEST_OPTIONS = frozenset(['sample', 'head_size', 'tail_size', 'distribution', 'descriptive', 'sample_values',
+                             'sample_size', 'num_bins', 'streaming_hist', 'sampling', 'sample_rate', 'seed',
+                             'converge', 'converge_interval', 'native_dates', 'correlation', 'encoded_counts'])
+
+
+def _warm():
+    """Worker initializer: import the modules that profiles use, so the first request doesn't pay for them"""
+    import importlib
+
+    for name in ('tableintuit.types', 'tableintuit.stats', 'tableintuit.profiler', 'tableintuit.seek',
+                 'tableintuit.cache', 'rowgenerators'):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _profile_path(path, options, cache):
+    from .profiler import profile_file
+
+    return profile_file(path, cache=cache, **options)
+
+
+def _profile(path, options, cache, timeout):
+    """Profile a file in a worker, returning a result record, as from profiler.map_sources()"""
+    from .profiler import _run_one
+
+    return _run_one(_profile_path, path, (options, cache), timeout)
+
+
+class IntuitServer(object):
+    """Profile files for clients on a Unix socket, with a pool of warm worker processes"""
+
+    def __init__(self, socket_path, workers=None, queue_size=DEFAULT_QUEUE_SIZE, cache=None, timeout=None):
+        """
+        :param socket_path: Path of the Unix socket. An existing socket file is replaced
+        :param workers: Number of worker processes. Defaults to the number of CPUs
+        :param queue_size: Number of requests, over all connections, that can be queued or running. Connections
+            stop reading requests while the queue is full
+        :param cache: Directory of a ResultCache for the profiles of local files
+        :param timeout: Seconds allowed for each request
+        """
+
+        self.socket_path = socket_path
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.cache = cache
+        self.timeout = timeout
+
+        self._pool = None
+        self._server = None
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()  # For the pool and the counts
+
+        self.n_requests = 0
+        self.n_errors = 0
+
+    def start(self):
+        """Start the worker pool and bind the socket. Returns self"""
+        import socketserver
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_warm)
+
+        # Start the workers now, rather than on the first request
+        for f in [self._pool.submit(_warm) for _ in range(self.workers)]:
+            f.result()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                service._handle(self.rfile, self.wfile)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+
+        return self
+
+    def serve_forever(self):
+        if self._server is None:
+            self.start()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def serve_in_thread(self):
+        """Serve on a daemon thread, and return the thread. Stop with close()"""
+
+        if self._server is None:
+            self.start()
+
+        t = threading.Thread(target=self._server.serve_forever, daemon=True)
+        t.start()
+        return t
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _count(self, errors=0, requests=0):
+        with self._lock:
+            self.n_errors += errors
+            self.n_requests += requests
+
+    def _replace_pool(self, broken):
+        """Replace a pool that is broken, because one of its workers died. Other requests that were running
+        in it fail"""
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._pool is broken:
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_warm)
+                broken.shutdown(wait=False)
+
+    def _submit(self, path, options):
+        """Submit a request to the pool, replacing the pool if it is broken. Returns the future and its pool"""
+        from concurrent.futures.process import BrokenProcessPool
+
+        pool = self._pool
+
+        try:
+            return pool.submit(_profile, path, options, self.cache, self.timeout), pool
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            pool = self._pool
+            return pool.submit(_profile, path, options, self.cache, self.timeout), pool
+
+    def _handle(self, rfile, wfile):
+        """Read requests from a connection, run them in the pool, and write the responses as they finish"""
+
+        write_lock = threading.Lock()
+        pending = set()
+        done = threading.Condition()
+
+        def respond(response):
+            data = (json.dumps(response, default=str) + '\n').encode('utf8')
+            with write_lock:
+                try:
+                    wfile.write(data)
+                    wfile.flush()
+                except (IOError, OSError):
+                    pass  # The client went away
+
+        def finished(rid, future, pool):
+            from concurrent.futures.process import BrokenProcessPool
+
+            try:
+                record = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_pool(pool)
+
+                record = {'error': '{}: {}'.format(type(e).__name__, e)}
+
+            try:
+                if 'error' in record:
+                    self._count(errors=1)
+                    respond({'id': rid, 'error': record['error']})
+                else:
+                    respond({'id': rid, 'result': record['result']})
+            finally:
+                self._slots.release()
+                with done:
+                    pending.discard(future)
+                    done.notify_all()
+
+        for line in rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line.decode('utf8'))
+                rid = request.get('id')
+                path = request['path']
+                options = dict(request.get('options') or {})
+            except (ValueError, KeyError, AttributeError, TypeError) as e:
+                self._count(errors=1)
+                respond({'id': None, 'error': 'Bad request: {}'.format(e)})
+                continue
+
+            self._count(requests=1)
+
+            unknown = sorted(set(options) - REQUEST_OPTIONS)
+
+            if unknown:
+                self._count(errors=1)
+                respond({'id': rid, 'error': 'Bad request: options not allowed: {}'.format(', '.join(unknown))})
+                continue
+
+            self._slots.acquire()  # Stop reading from this connection while the queue is full
+
+            try:
+                future, pool = self._submit(path, options)
+            except Exception as e:
+                self._slots.release()
+                self._count(errors=1)
+                respond({'id': rid, 'error': '{}: {}'.format(type(e).__name__, e)})
+                continue
+
+            with done:
+                pending.add(future)
+
+            future.add_done_callback(lambda f, rid=rid, pool=pool: finished(rid, f, pool))
+
+        # Finish the responses before the connection is closed
+        with done:
+            while pending:
+                done.wait()
+
+
+class IntuitClient(object):
+    """Client for an IntuitServer"""
+
+    def __init__(self, socket_path, timeout=None):
+        """
+        :param socket_path: Path of the server's Unix socket
+        :param timeout: Seconds to wait for a response
+        """
+        import socket
+
+        self.socket_path = socket_path
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+
+        try:
+            self._sock.connect(socket_path)
+        except (IOError, OSError) as e:
+            self._sock.close()
+            raise ServiceError("Can't connect to {}: {}".format(socket_path, e))
+
+        self._rfile = self._sock.makefile('rb')
+        self._next_id = 0
+
+    def _send(self, path, options):
+        self._next_id += 1
+        request = {'id': self._next_id, 'path': os.path.abspath(path), 'options': options}
+        self._sock.sendall((json.dumps(request) + '\n').encode('utf8'))
+        return self._next_id
+
+    def _receive(self):
+        line = self._rfile.readline()
+
+        if not line:
+            raise ServiceError("Server closed the connection")
+
+        return json.loads(line.decode('utf8'))
+
+    def profile(self, path, **options):
+        """Return the profile of a file, as from profiler.profile_file(). Raises ServiceError if it failed"""
+
+        for path, result in self.profile_many([path], **options):
+            if isinstance(result, ServiceError):
+                raise result
+            return result
+
+    def profile_many(self, paths, window=64, **options):
+        """Yield (path, profile) for the paths, in the order they finish, with up to window requests outstanding.
+        For a failed file, the profile is a ServiceError"""
+
+        paths = iter(paths)
+        outstanding = {}
+
+        def fill():
+            while len(outstanding) < window:
+                try:
+                    path = next(paths)
+                except StopIteration:
+                    return
+                outstanding[self._send(path, options)] = path
+
+        fill()
+
+        while outstanding:
+            response = self._receive()
+
+            if response.get('id') not in outstanding:
+                # Such as the error for a request the server couldn't parse, which has no id
+                raise ServiceError("Unexpected response: {}".format(response.get('error', response)))
+
+            path = outstanding.pop(response['id'])
+
+            if 'error' in response:
+                yield path, ServiceError('{}: {}'.format(path, response['error']))
+            else:
+                yield path, response['result']
+
+            fill()
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
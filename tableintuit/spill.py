@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 Civic Knowledge. This file is licensed under the terms of the
+# MIT License, included in this distribution as LICENSE.txt
+
+"""
+
+Spill numeric column values to disk, for exact quantiles and histograms.
+
+Values are buffered, and appended to a file of float64 values when the buffer is full, which is memory mapped after
+the first pass. The file is created on the first write, and is only open while a buffer is written, so a table with
+many columns doesn't hold a file descriptor for each one. Quantiles are found by selection: chunked histogram passes
+over the map narrow each requested rank to a range of values small enough to load, which is then partitioned with
+np.partition, so the memory used is bounded by the chunk and gather sizes, not the number of values.
+
+"""
+
+import os
+from array import array
+
+CHUNK_SIZE = 1 << 20  # Values read from the map at a time
+MAX_GATHER = 1 << 22  # Largest number of values loaded into memory for np.partition
+SELECT_BINS = 4096  # Bins per narrowing pass
+BUFFER_SIZE = 1 << 16  # Values buffered before they are written to the file
+
+
+def _bin_index(x, lo, hi):
+    import numpy as np
+
+    if hi <= lo:
+        return np.zeros(len(x), dtype=np.intp)
+
+    idx = ((x - lo) * (SELECT_BINS / (hi - lo))).astype(np.intp)
+
+    return np.clip(idx, 0, SELECT_BINS - 1)
+
+
+class SpillColumn(object):
+    """Float64 values for one column, appended to a file"""
+
+    def __init__(self, directory, name):
+
+        self.directory = directory
+        self.path = None  # Created on the first write
+        self._buffer = array('d')
+        self._map = None
+
+        self.name = name
+        self.n = 0
+        self.min = None
+        self.max = None
+
+    def add(self, v):
+        self._buffer.append(v)
+        self.n += 1
+
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """Append the buffer to the file, opening it only for the write"""
+        import tempfile
+
+        if not self._buffer:
+            return
+
+        if self.path is None:
+            fd, self.path = tempfile.mkstemp(dir=self.directory, prefix='col-', suffix='.f8')
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = open(self.path, 'ab')
+
+        with f:
+            self._buffer.tofile(f)
+
+        self._buffer = array('d')
+
+    def close(self):
+        """Finish writing"""
+
+        if self._map is None:
+            self._flush()
+
+    @property
+    def values(self):
+        """Read only memory map of the values"""
+        import numpy as np
+
+        self.close()
+
+        if self._map is None:
+            if self.n:
+                self._map = np.memmap(self.path, dtype=np.float64, mode='r', shape=(self.n,))
+            else:
+                self._map = np.zeros(0)
+
+        return self._map
+
+    def _chunks(self, filters=()):
+        """Yield the values in chunks, keeping only the values in the bins of the selection filters"""
+        import numpy as np
+
+        values = self.values
+
+        for start in range(0, self.n, CHUNK_SIZE):
+            x = np.asarray(values[start:start + CHUNK_SIZE])
+
+            for lo, hi, b in filters:
+                x = x[_bin_index(x, lo, hi) == b]
+
+            yield x
+
+    def _select(self, ranks, filters, lo, hi, count):
+        """Return a dict of the values at the given ranks, among the count values that pass the filters, which
+        are all between lo and hi"""
+        import numpy as np
+
+        if lo == hi:
+            return {r: lo for r in ranks}
+
+        if count <= MAX_GATHER:
+            x = np.concatenate(list(self._chunks(filters)))
+            x = np.partition(x, ranks)
+            return {r: float(x[r]) for r in ranks}
+
+        counts = np.zeros(SELECT_BINS, dtype=np.int64)
+        mins = np.full(SELECT_BINS, np.inf)
+        maxs = np.full(SELECT_BINS, -np.inf)
+
+        for x in self._chunks(filters):
+            idx = _bin_index(x, lo, hi)
+            counts += np.bincount(idx, minlength=SELECT_BINS)
+            np.minimum.at(mins, idx, x)
+            np.maximum.at(maxs, idx, x)
+
+        cum = np.cumsum(counts)
+
+        by_bin = {}
+        for r in ranks:
+            b = int(np.searchsorted(cum, r, side='right'))
+            by_bin.setdefault(b, []).append(r - (int(cum[b - 1]) if b else 0))
+
+        results = {}
+        for b, local_ranks in by_bin.items():
+            below = int(cum[b - 1]) if b else 0
+            found = self._select(local_ranks, list(filters) + [(lo, hi, b)],
+                                 float(mins[b]), float(maxs[b]), int(counts[b]))
+            results.update({below + r: v for r, v in found.items()})
+
+        return results
+
+    def quantiles(self, ps):
+        """Exact quantiles, with linear interpolation between order statistics, as numpy.quantile"""
+        from math import floor
+
+        if not self.n:
+            return [None for _ in ps]
+
+        positions = [p * (self.n - 1) for p in ps]
+        ranks = sorted(set(r for h in positions for r in (int(floor(h)), min(int(floor(h)) + 1, self.n - 1))))
+
+        values = self._select(ranks, [], self.min, self.max, self.n)
+
+        def interpolate(h):
+            lo = int(floor(h))
+            hi = min(lo + 1, self.n - 1)
+            return values[lo] + (h - lo) * (values[hi] - values[lo])
+
+        return [interpolate(h) for h in positions]
+
+    def histogram(self, lo, hi, num_bins):
+        """Exact counts of values in num_bins equal width bins from lo to hi. Values outside the range are
+        not counted"""
+        import numpy as np
+
+        bins = np.zeros(num_bins, dtype=np.int64)
+
+        if hi <= lo:
+            return bins.tolist()
+
+        for x in self._chunks():
+            bins += np.histogram(x, bins=num_bins, range=(lo, hi))[0]
+
+        return bins.tolist()
+
+    def remove(self):
+        """Close and delete the file"""
+
+        self._buffer = array('d')
+        self._map = None
+
+        if self.path is None:
+            return
+
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -9,9 +9,9 @@ Revised BSD License, included in this distribution as LICENSE.txt
 
 import logging
 import datetime
+from math import isfinite, nan
 from collections import Counter, OrderedDict
 
-from livestats import livestats
 
 from .exceptions import StatsError
 
@@ -62,6 +62,841 @@ type_map = {
 
 }
 
+class StreamingHistogram(object):
+    """Adaptive streaming histogram, after Ben-Haim and Tom-Tov, "A Streaming Parallel Decision Tree
+    Algorithm", JMLR 2010. The histogram keeps at most max_bins centroids, merging the closest pairs
+    when new values would exceed the limit, so it uses fixed memory, follows the density of heavy tailed
+    data, and can be merged with histograms built from other parts of the data.
+
+    Values are buffered, and buffer_size of them at a time are merged into the centroids with numpy, which
+    merges the closest pairs in bulk, rather than one pair per value. """
+
+    def __init__(self, max_bins=64, buffer_size=4096):
+        self.max_bins = max_bins
+        self.buffer_size = buffer_size
+        self.n = 0
+        self._positions = []
+        self._counts = []
+        self._min = None
+        self._max = None
+        self._buffer = []
+
+    @property
+    def positions(self):
+        self._flush()
+        return self._positions
+
+    @property
+    def counts(self):
+        self._flush()
+        return self._counts
+
+    @property
+    def min(self):
+        self._flush()
+        return self._min
+
+    @property
+    def max(self):
+        self._flush()
+        return self._max
+
+    def add(self, v, count=1):
+
+        self.n += count
+
+        if count == 1:
+            self._buffer.append(v)
+
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+        else:
+            self._flush()
+            self._absorb([v], [count])
+
+    def _flush(self):
+        """Merge the buffered values into the centroids"""
+        import numpy as np
+
+        if self._buffer:
+            values, counts = np.unique(np.array(self._buffer, dtype=float), return_counts=True)
+            self._buffer = []
+            self._absorb(values, counts)
+
+    def _absorb(self, values, counts):
+        """Merge weighted values into the centroids, combining equal positions, then compress them"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+
+        lo, hi = float(values.min()), float(values.max())
+        self._min = lo if self._min is None else min(self._min, lo)
+        self._max = hi if self._max is None else max(self._max, hi)
+
+        p, inverse = np.unique(np.concatenate([np.asarray(self._positions, dtype=float), values]),
+                               return_inverse=True)
+        c = np.bincount(inverse, weights=np.concatenate([np.asarray(self._counts, dtype=float),
+                                                         np.asarray(counts, dtype=float)]))
+
+        p, c = self._compress(p, c)
+
+        self._positions = p.tolist()
+        self._counts = [int(e) for e in c]
+
+    def _compress(self, p, c):
+        """Merge the closest pairs of centroids until there are no more than max_bins. Each pass merges
+        the pairs with the smallest gaps, skipping pairs that share a centroid with a pair already merged in
+        the pass, so a pass removes at least half of the excess centroids."""
+        import numpy as np
+
+        while len(p) > self.max_bins:
+            excess = len(p) - self.max_bins
+            gaps = np.diff(p)
+
+            # The left centroids of the closest pairs, in order. In runs of adjacent pairs, take every other one
+            left = np.sort(np.argpartition(gaps, excess - 1)[:excess])
+            starts = np.concatenate([[True], np.diff(left) != 1])
+            run_starts = np.flatnonzero(starts)
+            in_run = np.arange(len(left)) - run_starts[np.cumsum(starts) - 1]
+            left = left[in_run % 2 == 0]
+            right = left + 1
+
+            m = c[left] + c[right]
+            p[left] = (p[left] * c[left] + p[right] * c[right]) / m
+            c[left] = m
+
+            keep = np.ones(len(p), dtype=bool)
+            keep[right] = False
+            p, c = p[keep], c[keep]
+
+        return p, c
+
+    def merge(self, other):
+        """Merge another histogram into this one"""
+
+        self._flush()
+        other._flush()
+
+        if other._positions:
+            self.n += other.n
+            self._absorb(other._positions, other._counts)
+
+            # min and max may be outside of the centroids
+            self._min = min(self._min, other._min)
+            self._max = max(self._max, other._max)
+
+        return self
+
+    def sum(self, b):
+        """Estimated number of values less than or equal to b"""
+        from bisect import bisect_right
+
+        p = self.positions
+        c = self.counts
+
+        if not p or b < self.min:
+            return 0.0
+
+        if b >= self.max:
+            return float(self.n)
+
+        i = bisect_right(p, b) - 1
+
+        if i < 0:
+            # Between the minimum and the first centroid, half of which is on this side of it
+            return c[0] / 2.0 * (b - self.min) / (p[0] - self.min)
+
+        if i == len(p) - 1:
+            # Between the last centroid and the maximum
+            return self.n - c[i] / 2.0 * (self.max - b) / (self.max - p[i])
+
+        f = (b - p[i]) / (p[i + 1] - p[i])
+        mb = c[i] + (c[i + 1] - c[i]) * f
+
+        return sum(c[:i]) + c[i] / 2.0 + (c[i] + mb) / 2.0 * f
+
+    def bins(self, num_bins, lo=None, hi=None):
+        """Return the estimated counts of num_bins equal width bins from lo to hi, which are clipped to, and
+        default to, the minimum and maximum. Values outside of the range are not counted, so the bins over
+        the whole range add up to n"""
+
+        if not self.positions:
+            return [0] * num_bins
+
+        if self.min == self.max:
+            return [self.n] + [0] * (num_bins - 1)
+
+        lo = self.min if lo is None else max(lo, self.min)
+        hi = self.max if hi is None else min(hi, self.max)
+
+        if hi <= lo:
+            return [0] * num_bins
+
+        width = (hi - lo) / float(num_bins)
+
+        edges = [self.sum(lo + width * j) for j in range(num_bins)] + [self.sum(hi)]
+
+        if lo == self.min:
+            edges[0] = 0.0
+
+        # Round the edges, rather than the counts, so the rounding errors don't accumulate
+        edges = [int(round(e)) for e in edges]
+
+        return [edges[j + 1] - edges[j] for j in range(num_bins)]
+
+
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%m/%d/%Y', '%m/%d/%y', '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M', '%d-%b-%Y', '%d %b %Y', '%b %d, %Y', '%Y%m%d', '%H:%M:%S', '%H:%M', '%I:%M:%S %p', '%I:%M %p'
+]
+
+
+class DateParser(object):
+    """Parses date strings, remembering the last format that worked so that a column in a consistent format
+    costs one strptime() per value. Falls back to dateutil for formats that are not in DATE_FORMATS"""
+
+    def __init__(self, formats=DATE_FORMATS):
+        self.formats = formats
+        self.format = None
+
+    def parse(self, v):
+        """Return a datetime, or raise ValueError"""
+
+        if self.format is not None:
+            try:
+                return self._parse(v, self.format)
+            except ValueError:
+                pass
+
+        for fmt in ['iso'] + self.formats:
+            try:
+                dt = self._parse(v, fmt)
+                self.format = fmt
+                return dt
+            except ValueError:
+                pass
+
+        from dateutil import parser
+
+        try:
+            return parser.parse(v)
+        except (ValueError, OverflowError) as e:
+            raise ValueError(str(e))
+
+    @staticmethod
+    def _parse(v, fmt):
+        if fmt == 'iso':
+            return datetime.datetime.fromisoformat(v)
+        else:
+            return datetime.datetime.strptime(v, fmt)
+
+
+class DateStats(object):
+    """Fixed memory statistics for date, datetime and time values. Values are kept as seconds, since the
+    epoch for dates and datetimes, or since midnight for times, and are counted in a calendar histogram of
+    months, which is coarsened to years and then decades if the span from the first to the last period is
+    more than max_periods periods. Times are counted by hour. """
+
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, typ, max_periods=600):
+
+        self.type = typ
+        self.is_time = typ == datetime.time
+        self.max_periods = max_periods
+
+        from livestats import livestats
+        self.stats = livestats.LiveStats([0.25, 0.5, 0.75])
+        self.periods = Counter()
+        self.period = 'hour' if self.is_time else 'month'
+        self.parser = DateParser()
+
+    def _to_seconds(self, v):
+        """Convert a value to seconds, or return None if it isn't a date or time"""
+
+        if isinstance(v, str):
+            try:
+                v = self.parser.parse(v.strip())
+            except ValueError:
+                return None
+
+            if self.is_time:
+                v = v.time()
+
+        if isinstance(v, datetime.datetime):
+            if v.tzinfo is not None:
+                v = v.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+            if self.is_time:
+                v = v.time()
+            else:
+                return (v - self.EPOCH).total_seconds()
+
+        if isinstance(v, datetime.date):
+            return float((v.toordinal() - self.EPOCH.toordinal()) * 86400)
+
+        if isinstance(v, datetime.time):
+            return v.hour * 3600 + v.minute * 60 + v.second + v.microsecond / 1e6
+
+        return None
+
+    def to_value(self, seconds):
+        """Convert seconds back to a value of the column type"""
+        if seconds is None:
+            return None
+
+        dt = self.EPOCH + datetime.timedelta(seconds=seconds)
+
+        if self.is_time:
+            return dt.time()
+        elif self.type == datetime.date:
+            return dt.date()
+        else:
+            return dt
+
+    def _period_key(self, seconds):
+        if self.is_time:
+            return int(seconds // 3600)
+
+        dt = self.EPOCH + datetime.timedelta(seconds=seconds)
+
+        if self.period == 'month':
+            return dt.year * 12 + dt.month - 1
+        elif self.period == 'year':
+            return dt.year
+        else:
+            return dt.year // 10 * 10
+
+    def _coarsen(self):
+        if self.period == 'month':
+            self.period, f = 'year', lambda k: k // 12
+        else:
+            self.period, f = 'decade', lambda k: k // 10 * 10
+
+        periods = Counter()
+        for k, count in self.periods.items():
+            periods[f(k)] += count
+
+        self.periods = periods
+
+    def add(self, v):
+        """Add a value, returning False if it could not be converted to a date or time"""
+
+        seconds = self._to_seconds(v)
+
+        if seconds is None:
+            return False
+
+        self.stats.add(seconds)
+
+        key = self._period_key(seconds)
+        new_period = key not in self.periods
+        self.periods[key] += 1
+
+        # The calendar has every period in the span, so coarsen on the span, not the number of distinct periods
+        while new_period and self.period in ('month', 'year') and self._span() > self.max_periods:
+            self._coarsen()
+
+        return True
+
+    def _span(self):
+        """Number of periods from the first to the last, inclusive"""
+        step = 10 if self.period == 'decade' else 1
+        return (max(self.periods) - min(self.periods)) // step + 1
+
+    @property
+    def n(self):
+        return self.stats.count
+
+    @property
+    def min(self):
+        return self.to_value(self.stats.minimum()) if self.n else None
+
+    @property
+    def max(self):
+        return self.to_value(self.stats.maximum()) if self.n else None
+
+    def quantile(self, i):
+        try:
+            return self.to_value(sorted(self.stats.quantiles())[i][1])
+        except IndexError:
+            return None
+
+    def _label(self, k):
+        if self.period == 'hour':
+            return '{:02d}'.format(k)
+        elif self.period == 'month':
+            return '{:04d}-{:02d}'.format(k // 12, k % 12 + 1)
+        else:
+            return '{:04d}'.format(k)
+
+    @property
+    def calendar(self):
+        """OrderedDict of period labels to counts, for every period from the first to the last. If the decades
+        span more than max_periods, only the decades with values are included"""
+
+        if not self.periods:
+            return OrderedDict()
+
+        if self._span() > self.max_periods:
+            return OrderedDict((self._label(k), self.periods[k]) for k in sorted(self.periods))
+
+        step = 10 if self.period == 'decade' else 1
+        first, last = min(self.periods), max(self.periods)
+
+        return OrderedDict((self._label(k), self.periods.get(k, 0)) for k in range(first, last + 1, step))
+
+
+class CovarianceMatrix(object):
+    """Streaming pairwise covariance and correlation of numeric columns. Rows are buffered and added to the
+    accumulator in batches with matrix products, and batches are combined with Chan's parallel update, so
+    memory is O(k^2) in the number of columns. Nulls and non-numeric values are excluded pairwise: each pair of
+    columns is computed over the rows where both have values. Accumulators for parts of the data can be merged."""
+
+    def __init__(self, names, batch_size=2048):
+        import numpy as np
+
+        self.names = list(names)
+        self.batch_size = batch_size
+
+        k = len(self.names)
+        self.n = np.zeros((k, k))  # Pairwise counts
+        self.mean_a = np.zeros((k, k))  # Mean of the row column, over rows where both columns have values
+        self.mean_b = np.zeros((k, k))  # Mean of the column column, likewise
+        self.m2_a = np.zeros((k, k))  # Sum of squared deviations of the row column
+        self.m2_b = np.zeros((k, k))
+        self.co_m = np.zeros((k, k))  # Sum of co-deviations
+
+        self._buffer = []
+
+    def add(self, values):
+        """Add a row of values, in the order of names"""
+
+        self._buffer.append([_force_float(v) for v in values])
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Add the buffered rows to the accumulator"""
+        import numpy as np
+
+        if self._buffer:
+            self.update(np.array(self._buffer, dtype=float).reshape(len(self._buffer), len(self.names)))
+            self._buffer = []
+
+    def update(self, x):
+        """Add a batch, a 2D array with a column for each name and NaN for missing values"""
+        import numpy as np
+
+        x = np.where(np.isfinite(x), x, np.nan)
+        valid = ~np.isnan(x)
+        m = valid.astype(float)
+
+        if not valid.any():
+            return
+
+        # Center on the batch means to limit cancellation in the products
+        counts = valid.sum(axis=0)
+        shift = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(counts, 1)
+
+        xc = np.where(valid, x - shift, 0.0)
+
+        n = m.T @ m
+        s_a = xc.T @ m  # Sum of the row column, over rows where the column column is valid
+        s_b = s_a.T
+        ss_a = (xc * xc).T @ m
+        ss_b = ss_a.T
+        sp = xc.T @ xc
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_a = np.where(n > 0, s_a / n, 0.0)
+            mean_b = np.where(n > 0, s_b / n, 0.0)
+
+        batch = (n, mean_a + shift[:, None], mean_b + shift[None, :],
+                 ss_a - mean_a * s_a, ss_b - mean_b * s_b, sp - mean_a * s_b)
+
+        self._combine(*batch)
+
+    def _combine(self, n2, mean_a2, mean_b2, m2_a2, m2_b2, co_m2):
+        import numpy as np
+
+        n1 = self.n
+        n = n1 + n2
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            f = np.where(n > 0, n1 * n2 / n, 0.0)
+            w2 = np.where(n > 0, n2 / n, 0.0)
+
+        d_a = mean_a2 - self.mean_a
+        d_b = mean_b2 - self.mean_b
+
+        self.co_m = self.co_m + co_m2 + d_a * d_b * f
+        self.m2_a = self.m2_a + m2_a2 + d_a * d_a * f
+        self.m2_b = self.m2_b + m2_b2 + d_b * d_b * f
+        self.mean_a = self.mean_a + d_a * w2
+        self.mean_b = self.mean_b + d_b * w2
+        self.n = n
+
+    def merge(self, other):
+        """Merge an accumulator for the same columns, built from other rows"""
+
+        if other.names != self.names:
+            raise StatsError("Can't merge covariance matrices for different columns")
+
+        self.flush()
+        other.flush()
+
+        self._combine(other.n, other.mean_a, other.mean_b, other.m2_a, other.m2_b, other.co_m)
+
+        return self
+
+    @property
+    def covariance(self):
+        """Sample covariance matrix, with NaN for pairs with fewer than two rows"""
+        import numpy as np
+
+        self.flush()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 1, self.co_m / (self.n - 1), np.nan)
+
+    @property
+    def correlation(self):
+        """Pearson correlation matrix, with NaN for pairs with fewer than two rows or no variance"""
+        import numpy as np
+
+        self.flush()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = self.co_m / np.sqrt(self.m2_a * self.m2_b)
+
+        return np.where((self.n > 1) & np.isfinite(r), np.clip(r, -1, 1), np.nan)
+
+    def to_dict(self, matrix='correlation'):
+        """Return the correlation or covariance matrix as a dict of dicts, keyed by column name"""
+        m = getattr(self, matrix)
+
+        return OrderedDict((a, OrderedDict((b, float(m[i, j])) for j, b in enumerate(self.names)))
+                           for i, a in enumerate(self.names))
+
+
+def _reserve(a, size):
+    """Return the array a, or a copy of it with room for at least size elements, grown by half, so that
+    appending is amortized"""
+    import numpy as np
+
+    if len(a) >= size:
+        return a
+
+    grown = np.zeros(max(size, len(a) * 3 // 2), dtype=a.dtype)
+    grown[:len(a)] = a
+
+    return grown
+
+
+def _ranges(starts, lengths):
+    """Return the indexes of the ranges of lengths from starts, concatenated"""
+    import numpy as np
+
+    ends = np.cumsum(lengths)
+    total = int(ends[-1]) if len(ends) else 0
+
+    return np.arange(total, dtype=np.int64) - np.repeat(ends - lengths - starts, lengths)
+
+
+def _encode(values):
+    """Return the UTF-8 bytes of the values, concatenated as a uint8 array, and the byte length of each"""
+    import numpy as np
+
+    joined = ''.join(values).encode('utf-8')
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+
+    if len(joined) != lengths.sum():
+        # Not all ASCII, so the lengths of the characters aren't the lengths of the bytes
+        lengths = np.fromiter((len(v.encode('utf-8')) for v in values), dtype=np.int64, count=len(values))
+
+    return np.frombuffer(joined, dtype=np.uint8), lengths
+
+
+class EncodedCounter(object):
+    """Exact, compact value counts for categorical string columns. Each distinct value gets an integer code, in
+    the order values are first seen, which never changes. The values are kept as a heap of their UTF-8 bytes,
+    with an array of offsets into it indexed by code, so a long value doesn't widen the storage of the
+    others. The counts are an array indexed by code. Both are int32, until they could overflow, then int64.
+
+    Values are found with an open addressing table of codes, with linear probing, that is at most half full. A
+    probe compares the value with its bytes in the heap, so neither the hashes nor the strings are kept.
+
+    New values are counted in a small dict, which is merged into the arrays when it reaches buffer_size
+    distinct values, with vectorized probes, and one append to the heap for all of the new values. So, low
+    cardinality columns cost no more than a Counter, and for columns with many distinct values the arrays use
+    a fraction of the memory of a Counter's string objects and dict entries. Supports the parts of the Counter
+    interface that StatSet uses. """
+
+    _hash_key = 'EncodedCounter'
+
+    def __init__(self, buffer_size=4096):
+        import numpy as np
+
+        self._n = 0  # Number of codes
+        self._total = 0  # Sum of the counts
+        self._heap = np.zeros(1024, dtype=np.uint8)  # UTF-8 bytes of the values, in order of code
+        self._offsets = np.zeros(65, dtype=np.int32)  # Start of each value in the heap, and the end of the last
+        self._counts = np.zeros(64, dtype=np.int32)
+        self._table = np.full(128, -1, dtype=np.int32)  # Codes, in the slot of their hash or one after it
+
+        # String hashes differ between processes, so the table is rebuilt if a checkpoint is loaded in another
+        self._table_key = self._key_hash()
+
+        self._buffer = {}
+        self._buffer_size = buffer_size
+
+    @staticmethod
+    def _hash(values):
+        import numpy as np
+
+        return np.fromiter(map(hash, values), dtype=np.int64, count=len(values))
+
+    def _key_hash(self):
+        return int(self._hash([self._hash_key])[0])
+
+    def _bytes(self, code):
+        return self._heap[self._offsets[code]:self._offsets[code + 1]].tobytes()
+
+    def _lookup(self, data, lengths, hashes):
+        """Return the codes of values, from _encode(), or -1 for values that haven't been seen"""
+        import numpy as np
+
+        if self._table_key != self._key_hash():
+            self._rebuild(len(self._table))
+
+        table, offsets, heap = self._table, self._offsets, self._heap
+        mask = len(table) - 1
+
+        starts = np.cumsum(lengths) - lengths
+        codes = np.full(len(lengths), -1, dtype=np.int64)
+        slots = hashes & mask
+        active = np.arange(len(lengths))
+
+        while len(active):
+            found = table[slots[active]].astype(np.int64)
+
+            # An empty slot ends the probe, for a value that hasn't been seen
+            occupied = found >= 0
+            active, found = active[occupied], found[occupied]
+
+            # Compare the lengths, then the bytes of the values of the same length
+            same = np.flatnonzero(offsets[found + 1] - offsets[found] == lengths[active])
+            same_lengths = lengths[active[same]]
+
+            differ = heap[_ranges(offsets[found[same]], same_lengths)] != data[_ranges(starts[active[same]],
+                                                                                      same_lengths)]
+            owner = np.repeat(np.arange(len(same)), same_lengths)
+
+            matched = np.zeros(len(active), dtype=bool)
+            matched[same[np.bincount(owner[differ], minlength=len(same)) == 0]] = True
+
+            codes[active[matched]] = found[matched]
+
+            active = active[~matched]
+            slots[active] = (slots[active] + 1) & mask
+
+        return codes
+
+    def _insert(self, hashes, codes):
+        """Put the codes of new values in the table"""
+        import numpy as np
+
+        table = self._table
+        mask = len(table) - 1
+
+        slots = hashes & mask
+        pending = np.arange(len(codes))
+
+        while len(pending):
+            # Of the values that probe a free slot, the first one for each slot takes it
+            free = np.flatnonzero(table[slots[pending]] < 0)
+            taken, first = np.unique(slots[pending[free]], return_index=True)
+            table[taken] = codes[pending[free[first]]]
+
+            placed = np.zeros(len(pending), dtype=bool)
+            placed[free[first]] = True
+
+            pending = pending[~placed]
+            slots[pending] = (slots[pending] + 1) & mask
+
+    def _rebuild(self, size):
+        """Make a new table, with size slots, for all of the codes. The values are hashed a chunk at a time, so
+        they aren't all decoded at once"""
+        import numpy as np
+
+        self._table = np.full(size, -1, dtype=np.int32)
+        self._table_key = self._key_hash()
+
+        for start in range(0, self._n, self._buffer_size):
+            codes = np.arange(start, min(start + self._buffer_size, self._n), dtype=np.int64)
+            self._insert(self._hash(self._keys(codes[0], codes[-1] + 1)), codes)
+
+    def _widen(self, name, size):
+        """Make the int32 array attribute name int64, if it will hold values of size or more"""
+        import numpy as np
+
+        a = getattr(self, name)
+
+        if a.dtype == np.int32 and size > np.iinfo(np.int32).max:
+            setattr(self, name, a.astype(np.int64))
+
+    def add(self, v):
+        buffer = self._buffer
+        buffer[v] = buffer.get(v, 0) + 1  # Faster than a Counter, which calls __missing__ for each new value
+
+        if len(buffer) >= self._buffer_size:
+            self._flush()
+
+    def _flush(self):
+        import numpy as np
+
+        if not self._buffer:
+            return
+
+        # The buffer is in order of first occurrence, so new values get codes in that order
+        values = list(self._buffer.keys())
+        counts = np.fromiter(self._buffer.values(), dtype=np.int64, count=len(values))
+        self._buffer = {}
+
+        data, lengths = _encode(values)
+        hashes = self._hash(values)
+        codes = self._lookup(data, lengths, hashes)
+
+        self._total += int(counts.sum())
+        self._widen('_counts', self._total)
+
+        found = codes >= 0
+        self._counts[codes[found]] += counts[found]
+
+        new = np.flatnonzero(~found)
+
+        if len(new):
+            starts = np.cumsum(lengths) - lengths
+            self._append(data[_ranges(starts[new], lengths[new])], lengths[new], counts[new], hashes[new])
+
+    def _append(self, data, lengths, counts, hashes):
+        """Give codes to new values, and add their bytes to the heap, with one copy, and their codes to the table"""
+        import numpy as np
+
+        n, m = self._n, len(lengths)
+        end = int(self._offsets[n])
+
+        self._heap = _reserve(self._heap, end + len(data))
+        self._heap[end:end + len(data)] = data
+        self._widen('_offsets', end + len(data))
+
+        self._offsets = _reserve(self._offsets, n + m + 1)
+        self._offsets[n + 1:n + m + 1] = end + np.cumsum(lengths)
+
+        self._counts = _reserve(self._counts, n + m)
+        self._counts[n:n + m] = counts
+
+        self._n = n + m
+
+        if self._n * 2 > len(self._table):
+            self._rebuild(1 << (self._n * 2).bit_length())
+        else:
+            self._insert(hashes, np.arange(n, n + m, dtype=np.int64))
+
+    @property
+    def counts(self):
+        """Array of the counts, indexed by code"""
+        self._flush()
+        return self._counts[:self._n]
+
+    @property
+    def nbytes(self):
+        """Bytes used by the arrays"""
+        self._flush()
+        return sum(a.nbytes for a in (self._heap, self._offsets, self._counts, self._table))
+
+    def code(self, v):
+        """Return the code for a value, or None if it hasn't been seen"""
+
+        self._flush()
+
+        code = int(self._lookup(*_encode([v]) + (self._hash([v]),))[0])
+
+        return code if code >= 0 else None
+
+    def value(self, code):
+        return self._bytes(code).decode('utf-8')
+
+    def __getitem__(self, v):
+        code = self.code(v)
+        return int(self._counts[code]) if code is not None else 0
+
+    def __setitem__(self, v, count):
+        # Supports counts[v] += n, though add() is much faster
+        code = self.code(v)
+
+        if code is None:
+            self.add(v)
+            code = self.code(v)
+
+        self._total += count - int(self._counts[code])
+        self._widen('_counts', self._total)
+        self._counts[code] = count
+
+    def __contains__(self, v):
+        return v in self._buffer or self.code(v) is not None
+
+    def __len__(self):
+        self._flush()
+        return self._n
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def _keys(self, start, end):
+        """The values with codes from start to end"""
+        offsets = (self._offsets[start:end + 1] - self._offsets[start]).tolist()
+        heap = self._heap[self._offsets[start]:self._offsets[end]].tobytes()
+
+        if heap.isascii():
+            # Decode once, since the offsets of the bytes are the offsets of the characters
+            text = heap.decode('ascii')
+            return [text[a:b] for a, b in zip(offsets, offsets[1:])]
+
+        return [heap[a:b].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+
+    def keys(self):
+        """The values, in order of first occurrence, like a Counter"""
+        self._flush()
+        return self._keys(0, self._n)
+
+    def items(self):
+        return list(zip(self.keys(), self.counts.tolist()))
+
+    def most_common(self, n=None):
+        """Values and counts in descending order of count, with ties in the order they were first seen,
+        like Counter.most_common"""
+        import numpy as np
+
+        counts = self.counts
+
+        if n is None or n >= len(counts):
+            top = np.arange(len(counts))
+        else:
+            top = np.argpartition(-counts, n - 1)[:n]
+
+            # Include everything tied with the smallest count, so ties are broken by first occurrence
+            cutoff = counts[top].min()
+            top = np.concatenate([np.flatnonzero(counts > cutoff), np.flatnonzero(counts == cutoff)])
+
+        # Codes are in order of first occurrence
+        order = top[np.lexsort((top, -counts[top]))][:n]
+
+        return [(self.value(i), int(counts[i])) for i in order]
+
+
 class StatSet(object):
     LOM = Constant()  # Level of Measurement, More or Less
 
@@ -70,7 +905,8 @@ class StatSet(object):
     LOM.INTERVAL = 'i'  # A number, for which subtraction is defined, but not division
     LOM.RATIO = 'r'  # A number, for which division is defined and zero means "nothing". Kelvin, but not Celsius
 
-    def __init__(self, parent, name, typ, n_rows=None, distribution=False, descriptive=False, sample_values = False):
+    def __init__(self, parent, name, typ, n_rows=None, distribution=False, descriptive=False, sample_values = False,
+                 num_bins=16, streaming_hist=False, native_dates=False, spill_dir=None, encoded_counts=False):
 
         self.parent = parent
         self.n_rows = n_rows
@@ -107,8 +943,10 @@ class StatSet(object):
         self.lom = lom
         self.type = typ
         self.n = 0
+        self.n_nulls = 0
         self.counts = Counter()
         self.size = None
+        from livestats import livestats
         self.stats = livestats.LiveStats([0.25, 0.5, 0.75])  # runstats.Statistics()
 
         self.bin_min = None
@@ -118,19 +956,81 @@ class StatSet(object):
 
         self._hist_built = False
 
-        self.num_bins = 16
+        self.num_bins = num_bins
         self.bins = [0] * self.num_bins
 
+        # With a streaming histogram, only the primer values are counted, to find ordinals, and the bins
+        # span the whole range of the data, not just 2 sigma on either side of the mean.
+        self.stream_hist = StreamingHistogram(max(64, self.num_bins * 4)) if streaming_hist else None
+
+        self._last_quantiles = None  # Quartiles at the last convergence check
+
+        # With native dates, dates and times are parsed and summarized in fixed memory, rather than counted as strings
+        self.date_stats = DateStats(typ) if native_dates and (self.is_date or self.is_time) else None
+        self.calendar = None  # The calendar histogram of the date stats, by period, when the bins are built
+
+        # With a spill directory, numeric values are written to disk for exact quantiles and histograms
+        if spill_dir is not None and self.is_numeric and self.descriptive:
+            from .spill import SpillColumn
+            self.spill = SpillColumn(spill_dir, name)
+        else:
+            self.spill = None
+
+        self.exact_quantiles = None
+
+        # Categorical values may be counted in a compact dictionary encoding, rather than a Counter
+        self.encoded_counts = encoded_counts and self.lom == self.LOM.NOMINAL
+        if self.encoded_counts:
+            self.counts = EncodedCounter()
+
     @property
     def is_numeric(self):
         return self.lom == self.LOM.INTERVAL or self.lom == self.LOM.RATIO
 
+    @property
+    def converges(self):
+        """True if the column has a convergence criterion, which requires descriptive stats of a numeric column.
+        A numeric column loses it if it turns out to be an ordinal"""
+        return self.is_numeric and self.descriptive
+
+    def is_converged(self, tolerance, z=1.96):
+        """Return True if the confidence interval of the mean is within tolerance of the scale of the data,
+        and the quartiles have moved less than tolerance times the standard deviation since the last check.
+        Non numeric columns have no convergence criterion, and are always converged; see converges """
+        from math import sqrt
+
+        if not self.converges:
+            return True
+
+        n = self.stats.count
+
+        if n < 30:
+            # Too few values for an estimate, and LiveStats can't give quantiles with none
+            return False
+
+        quantiles = [q for _, q in sorted(self.stats.quantiles())]
+        last_quantiles, self._last_quantiles = self._last_quantiles, quantiles
+
+        if last_quantiles is None:
+            return False
+
+        std = sqrt(self.stats.variance())
+
+        if std == 0:
+            return True
+
+        if z * std / sqrt(n) > tolerance * max(abs(self.stats.mean()), std):
+            return False
+
+        return all(abs(q - lq) <= tolerance * std for q, lq in zip(quantiles, last_quantiles))
+
     def add(self, v):
 
         self.n += 1
 
         try:
             if v is None:
+                self.n_nulls += 1
                 unival = ''
             else:
                 unival = '{}'.format(v)
@@ -141,15 +1041,25 @@ class StatSet(object):
         self.size = max(self.size or 0, len(unival.encode('utf-8'))) # NOTE length in bytes, not characters
 
         if self.lom == self.LOM.NOMINAL or self.lom == self.LOM.ORDINAL:
-            if self.is_time or self.is_date:
+            if self.date_stats is not None:
+                if v is None or unival == '':
+                    self.counts['NULL'] += 1
+                elif not self.date_stats.add(v):
+                    self.counts[unival[:100]] += 1
+            elif self.is_time or self.is_date:
                 self.counts[unival] += 1
             else:
                 if len(unival) > 100:
-                    self.counts[unival[:100]] += 1
-                elif v is None:
-                    self.counts['NULL'] += 1
+                    key = unival[:100]
+                elif v is None or (isinstance(v, float) and v != v):
+                    key = 'NULL'  # NaN is a missing value, like None
                 else:
-                    self.counts[unival] += 1
+                    key = unival
+
+                if self.encoded_counts:
+                    self.counts.add(key)
+                else:
+                    self.counts[key] += 1
 
         elif self.is_numeric and self.descriptive:
 
@@ -157,12 +1067,30 @@ class StatSet(object):
             # not collect all of the values. So, collect the first 5K, then use that
             # to determine the 4sigma range of the histogram.
             # HACK There are probably a lot of 1-off errors in this
-            float_v = _force_float(v)
+            # A NaN is a missing value, like None, so it is counted as 'NULL', and kept out of the stats and the
+            # histogram. Other values that aren't numbers are counted as themselves.
+            try:
+                float_v = float(v)
+                missing_key = 'NULL' if float_v != float_v else None
+            except (ValueError, TypeError):
+                float_v = nan
+                missing_key = 'NULL' if v is None else unival
 
-            if self.n < self.bin_primer_count:  # Still building the counts.
-                if v is None:
-                    self.counts['NULL'] += 1
-                else:
+            if self.spill is not None:
+                if isfinite(float_v):
+                    self.spill.add(float_v)
+
+            elif self.stream_hist is not None:
+                if isfinite(float_v):
+                    self.stream_hist.add(float_v)
+
+                if self.n < self.bin_primer_count and missing_key is None:
+                    self.counts[unival] += 1
+                elif self.n == self.bin_primer_count and self.nuniques < (self.n / 100):
+                    self._to_ordinal()
+
+            elif self.n < self.bin_primer_count:  # Still building the counts.
+                if missing_key is None:
                     self.counts[unival] += 1
 
             elif self.n == self.bin_primer_count:  # Hit the limit, now can get the hist bins
@@ -171,14 +1099,11 @@ class StatSet(object):
             elif self.n > self.bin_primer_count and self.bin_min <= float_v <= self.bin_max:
                 bin_ = int((float_v - self.bin_min) / self.bin_width)
                 self.bins[bin_] += 1
-            try:
 
-                self.stats.add(float(v))
-            except (ValueError, TypeError):
-                if v is None:
-                    self.counts['NULL'] += 1
-                else:
-                    self.counts[unival] += 1
+            if missing_key is not None:
+                self.counts[missing_key] += 1
+            elif self.is_numeric:  # Not if the primer just made it an ordinal
+                self.stats.add(float_v)
 
 
     def _build_hist_bins(self):
@@ -187,10 +1112,36 @@ class StatSet(object):
         if self._hist_built:
             return
 
-        # If less than 1% are unique, assume that this number is actually an ordinal
-        if self.nuniques < (self.n / 100):
-            self.lom = self.LOM.ORDINAL
-            self.stats = livestats.LiveStats()
+        if self.date_stats is not None:
+            # The calendar can have hundreds of periods, so the bins merge runs of equal numbers of periods, to
+            # have no more than num_bins
+            self.calendar = self.date_stats.calendar
+            counts = list(self.calendar.values())
+            step = max(1, -(-len(counts) // self.num_bins))
+            self.bins = [sum(counts[i:i + step]) for i in range(0, len(counts), step)]
+            return
+
+        if self.spill is not None:
+            self._build_exact()
+            return
+
+        # If less than 1% are unique, assume that this number is actually an ordinal. Past the primer, a streaming
+        # histogram has already made the check on the primer values.
+        if self.n <= self.bin_primer_count and self.nuniques < (self.n / 100):
+            self._to_ordinal()
+
+        elif self.stream_hist is not None:
+            h = self.stream_hist
+
+            if h.n:
+                # Over the whole range of the values, so every finite value is in a bin
+                self.bin_min, self.bin_max = h.min, h.max
+                self.bin_width = (self.bin_max - self.bin_min) / self.num_bins
+
+            self.bins = h.bins(self.num_bins)
+
+            return
+
         else:
 
             self.bin_min = self.stats.mean() - sqrt(self.stats.variance()) * 2
@@ -229,13 +1180,39 @@ class StatSet(object):
         # self.counts = Counter()
         self._hist_build = True
 
+    def _to_ordinal(self):
+        """Treat a numeric column as an ordinal, which is counted rather than binned"""
+        from livestats import livestats
+
+        self.lom = self.LOM.ORDINAL
+        self.stats = livestats.LiveStats()
+        self.stream_hist = None
+
+    def _build_exact(self):
+        """Compute exact quartiles, and a histogram over 2 sigma on either side of the mean, from the
+        spilled values, then delete the spill file"""
+        from math import sqrt
+
+        try:
+            self.exact_quantiles = self.spill.quantiles([0.25, 0.5, 0.75])
+
+            if self.stats.count > 1:
+                std = sqrt(self.stats.variance())
+                self.bin_min = self.stats.mean() - std * 2
+                self.bin_max = self.stats.mean() + std * 2
+                self.bin_width = (self.bin_max - self.bin_min) / self.num_bins
+                self.bins = self.spill.histogram(self.bin_min, self.bin_max, self.num_bins)
+        finally:
+            self.spill.remove()
+            self.spill = None
+
     @property
     def uniques(self):
         return list(self.counts)
 
     @property
     def nuniques(self):
-        return len(list(self.counts.items()))
+        return len(self.counts)
 
     @property
     def mean(self):
@@ -248,10 +1225,19 @@ class StatSet(object):
 
     @property
     def min(self):
+        if self.date_stats is not None:
+            return self.date_stats.min
+
         return self.stats.minimum() if self.is_numeric else None
 
     @property
     def p25(self):
+        if self.date_stats is not None:
+            return self.date_stats.quantile(0)
+
+        if self.exact_quantiles is not None:
+            return self.exact_quantiles[0]
+
         try:
             return self.stats.quantiles()[0][1]
         except IndexError:
@@ -259,13 +1245,16 @@ class StatSet(object):
 
     @property
     def median(self):
-        try:
-            return self.stats.quantiles()[1][1]
-        except IndexError:
-            return None
+        return self.p50
 
     @property
     def p50(self):
+        if self.date_stats is not None:
+            return self.date_stats.quantile(1)
+
+        if self.exact_quantiles is not None:
+            return self.exact_quantiles[1]
+
         try:
             return self.stats.quantiles()[1][1]
         except IndexError:
@@ -273,6 +1262,12 @@ class StatSet(object):
 
     @property
     def p75(self):
+        if self.date_stats is not None:
+            return self.date_stats.quantile(2)
+
+        if self.exact_quantiles is not None:
+            return self.exact_quantiles[2]
+
         try:
             return self.stats.quantiles()[2][1]
         except IndexError:
@@ -280,6 +1275,9 @@ class StatSet(object):
 
     @property
     def max(self):
+        if self.date_stats is not None:
+            return self.date_stats.max
+
         return self.stats.maximum() if self.is_numeric else None
 
     @property
@@ -292,7 +1290,7 @@ class StatSet(object):
 
     @property
     def hist(self):
-        return text_hist(self.bins) if self.is_numeric else None
+        return text_hist(self.bins) if self.is_numeric or self.date_stats is not None else None
 
     @property
     def width(self):
@@ -355,14 +1353,43 @@ class Stats(object):
     """ Stats object reads rows from the input iterator, processes the row, and yields it back out"""
 
     def __init__(self, source, schema, distribution=False, descriptive=False, sample_values=False,
-                 n_rows=None, sample_size=None):
+                 n_rows=None, sample_size=None, num_bins=16, streaming_hist=False,
+                 sampling=None, sample_rate=None, seed=None, converge=None, converge_interval=1000,
+                 pipelined=False, native_dates=False, correlation=False, exact=False, spill_dir=None,
+                 encoded_counts=False, checkpoint=None, checkpoint_interval=None):
         """
-        :param source: Source iterator. Must return dict-like rows.
+        :param source: Source iterator. Must return dict-like rows, or lists or tuples with a header first.
         :param schema:
         :param distribution: If True, generate distribution stats: histogram, skewness, kurtosis
         :param descriptive: If True, generate descriptive stats: mean, std, min, max, quartiles.
         :param n_rows: An estimate of the number of rows in the datasets, for sampling
         :param sample_size: Number of rows to sample.
+        :param num_bins: Number of histogram bins
+        :param streaming_hist: If True, build histograms with a mergeable StreamingHistogram
+        :param sampling: How to sample rows. 'stride' takes sample_size rows evenly spaced through n_rows,
+            and is the default when sample_size is given. 'reservoir' takes a uniform random sample of
+            sample_size rows from a source of unknown length. 'bernoulli' takes each row with probability
+            sample_rate, or sample_size / n_rows.
+        :param sample_rate: Probability of selecting each row for 'bernoulli' sampling
+        :param seed: Random seed for 'reservoir' and 'bernoulli' sampling
+        :param converge: If set, a tolerance. Stop reading the source when the means and quartiles of every
+            numeric column have converged to within this fraction of their scale. See StatSet.is_converged
+        :param converge_interval: Number of rows between convergence checks
+        :param pipelined: If True or 'thread', read the source on a background thread while computing stats.
+            If 'process', read in a separate process, in which case the source must be a picklable callable
+            that returns the rows. See pipeline.read_ahead
+        :param native_dates: If True, date and time columns report min, max, quartiles and a calendar histogram,
+            computed in fixed memory, rather than counting each distinct value
+        :param correlation: If True, compute the covariance and correlation matrices of the numeric columns
+        :param exact: If True, compute exact quartiles and histograms, by spilling the values of numeric columns to
+            memory mapped temporary files, which are deleted when the run finishes.
+        :param spill_dir: Directory for the exact mode temporary files. Defaults to the system temp directory
+        :param encoded_counts: If True, count the values of categorical columns with an EncodedCounter, which
+            uses much less memory than a Counter for columns with many distinct values
+        :param checkpoint: Path of a checkpoint file, written every checkpoint_interval rows, and at the end of the
+            run. A Stats restored with checkpoint.load() skips the rows it had already read when it runs again on
+            the same source, so only appended rows are processed. Can't be used with sampling or exact stats.
+        :param checkpoint_interval: Number of rows between checkpoints. Defaults to checkpoint.DEFAULT_INTERVAL
         """
 
         self._source = source
@@ -375,21 +1402,105 @@ class Stats(object):
         self._distribution = distribution
         self._descriptive = descriptive
         self._sample_values = sample_values
+        self._num_bins = num_bins
+        self._streaming_hist = streaming_hist
+
+        self._sampling = sampling if sampling or sample_size is None else 'stride'
+        self._sample_rate = sample_rate
+        self._seed = seed
+        self._converge = converge
+        self._converge_interval = converge_interval
+        self._pipelined = pipelined
+        self._native_dates = native_dates
+
+        self._checkpoint = checkpoint
+        self._checkpoint_interval = checkpoint_interval
+        self.resume_offset = 0  # Rows of the source to skip, set when restored from a checkpoint
+
+        self.n_rows_used = None  # Number of rows processed by the last run
+        self.converged = False  # True if the last run stopped early on convergence
+
+        if self._sampling in (None, 'stride'):
+
+            if bool(self._sample_size) ^ bool(self._n_rows):
+                raise StatsError("If sample_size is specified, must also specify n_rows")
+
+            if self._sample_size is not None and self._n_rows is not None and (self._sample_size <= 0 or self._n_rows <= 0):
+                raise StatsError("If specified, both sample_size and n_rows must be positive and non-zero")
+
+        elif self._sampling == 'reservoir':
 
-        if bool(self._sample_size) ^ bool(self._n_rows):
-            raise StatsError("If sample_size is specified, must also specify n_rows")
+            if not self._sample_size or self._sample_size <= 0:
+                raise StatsError("Reservoir sampling requires a positive sample_size")
 
-        if self._sample_size is not None and self._n_rows is not None and (self._sample_size <= 0 or self._n_rows <= 0):
-            raise StatsError("If specified, both sample_size and n_rows must be positive and non-zero")
+            if self._converge:
+                raise StatsError("Can't stop early on convergence with reservoir sampling")
+
+        elif self._sampling == 'bernoulli':
+
+            if self._sample_rate is None and self._sample_size and self._n_rows:
+                self._sample_rate = float(self._sample_size) / self._n_rows
+
+            if self._sample_rate is None or not (0 < self._sample_rate <= 1):
+                raise StatsError("Bernoulli sampling requires a sample_rate in (0, 1], or sample_size and n_rows")
+
+        else:
+            raise StatsError("Unknown sampling mode '{}'".format(self._sampling))
+
+        if self._converge and not self._descriptive:
+            raise StatsError("Stopping on convergence requires descriptive stats")
+
+        if exact and not self._descriptive:
+            raise StatsError("Exact stats require descriptive stats")
+
+        self._spill_dir = None
+
+        if exact:
+            import tempfile
+            import shutil
+            import weakref
+
+            self._spill_dir = tempfile.mkdtemp(prefix='tableintuit-', dir=spill_dir)
+            # Removes the directory if the run doesn't finish, or is never started
+            self._spill_cleanup = weakref.finalize(self, shutil.rmtree, self._spill_dir, ignore_errors=True)
 
         for col_name, col_type in schema:
             self._stats[col_name] = StatSet(self, col_name, col_type, n_rows,
                                             distribution=self._distribution,
                                             descriptive=self._descriptive,
-                                            sample_values=self._sample_values)
+                                            sample_values=self._sample_values,
+                                            num_bins=self._num_bins,
+                                            streaming_hist=self._streaming_hist,
+                                            native_dates=self._native_dates,
+                                            spill_dir=self._spill_dir,
+                                            encoded_counts=encoded_counts)
+
+        if correlation:
+            self.cov = CovarianceMatrix(name for name, stat in self._stats.items() if stat.is_numeric)
+        else:
+            self.cov = None
 
         self._func, self._func_code = self.build()
 
+        if checkpoint:
+            self._check_checkpoint()
+
+    def _check_checkpoint(self):
+        if self._sampling is not None:
+            raise StatsError("Can't checkpoint stats with sampling")
+
+        if self._spill_dir is not None:
+            raise StatsError("Can't checkpoint exact stats")
+
+    def _restored(self):
+        """Rebuild the parts of the state that are not saved in a checkpoint"""
+
+        self._source = None
+        self._func, self._func_code = self.build()
+
+        for stat in self._stats.values():
+            stat.parent = self
+
     @property
     def dict(self):
         return self._stats
@@ -397,6 +1508,16 @@ class Stats(object):
     def __getitem__(self, item):
         return self._stats[item]
 
+    @property
+    def covariance(self):
+        """Covariance matrix of the numeric columns, in the order of cov.names"""
+        return self.cov.covariance if self.cov is not None else None
+
+    @property
+    def correlation(self):
+        """Correlation matrix of the numeric columns, in the order of cov.names"""
+        return self.cov.correlation if self.cov is not None else None
+
     def __contains__(self, item):
         return item in self._stats
 
@@ -409,9 +1530,7 @@ class Stats(object):
                 parts.append("stats['{name}'].add(row['{name}'])".format(name=name))
 
         if not parts:
-            error_msg = 'Did not get any stats variables for table {}. Was add() or init() called first?'\
-                .format(self.table.name)
-            raise StatsError(error_msg)
+            raise StatsError('Did not get any stats variables. Was the schema empty?')
 
         code = 'def _process_row(stats, row):\n    {}'.format('\n    '.join(parts))
 
@@ -424,15 +1543,18 @@ class Stats(object):
     def stats(self):
         return [(name, self._stats[name]) for name, stat in self._stats.items()]
 
-    def run(self):
-        """ Run the stats. The source must yield Row proxies.
-        """
-        from itertools import islice
+    def _dict_processor(self):
+        """Return a function that adds the values of a dict-like row to the StatSets"""
 
         self._func, self._func_code = self.build()
 
+        cov = self.cov
+
         def process_row(row):
 
+            if cov is not None:
+                cov.add([row[name] for name in cov.names])
+
             try:
                 self._func(self._stats, row)
             except TypeError as e:
@@ -446,50 +1568,205 @@ class Stats(object):
                     'General exception in stats. headers = "{}", code = "{}": {} '
                         .format(list(row.keys()), self._func_code, e))
 
-        # What does the source produce?
-        rows = list(islice(self._source, 2))
-
-        if isinstance(rows[0], (list, tuple)):
-            from rowgenerators.rowproxy import RowProxy
-            def source_adapter():
-                rp = None
-                for i, row in enumerate(self._source):
-                    if i == 0:
-                        rp = RowProxy(row)
-                    else:
-                        rp.set_row(row)
-                        yield rp
-
-            source = source_adapter()
-        else:
-            # Assume it is dict-like
-            source = self._source
+        return process_row
 
+    def _positional_processor(self, header):
+        """Return a function that adds the cells of a list or tuple row to the StatSets. The
+        schema names are resolved to positions in the header once, so there are no per-cell key lookups"""
+
+        header = list(header)
+        statsets = list(self._stats.values())
+
+        try:
+            positions = [header.index(name) for name in self._stats.keys()]
+        except ValueError as e:
+            raise StatsError("Schema column is not in the source header {}: {}".format(header, e))
+
+        if positions == list(range(len(positions))):
+            # The schema is a prefix of the header, in the same order, so cells line up with the StatSets
+
+            def process_row(row):
+                for stat, v in zip(statsets, row):
+                    stat.add(v)
 
-        # Use all of the rows in the source
-        if self._sample_size is None:
-            for i, row in enumerate(source):
-                process_row(row)
-        # Use a sample of rows, evenly distributed though the source
         else:
 
+            columns = list(zip(statsets, positions))
+
+            def process_row(row):
+                for stat, i in columns:
+                    stat.add(row[i])
+
+        if self.cov is not None:
+            cov = self.cov
+            cov_positions = [header.index(name) for name in cov.names]
+            add_stats = process_row
+
+            def process_row(row):
+                add_stats(row)
+                cov.add([row[i] for i in cov_positions])
+
+        return process_row
+
+    def _is_converged(self):
+        """True if all of the columns with a convergence criterion have converged. There must be at least one,
+        or a schema of categorical columns would converge at the first check"""
+
+        columns = [v for v in self._stats.values() if v.converges]
+
+        return bool(columns) and all([v.is_converged(self._converge) for v in columns])
+
+    def _sample(self, source):
+        """Yield the rows of the source that are selected by the sampling mode"""
+        import random
+        from itertools import islice
+        from math import exp, log, floor
+
+        if self._sampling is None:
+            # Use all of the rows in the source
+            for row in source:
+                yield row
+
+        elif self._sampling == 'stride':
+            # Use a sample of rows, evenly distributed though the source
             skip_rate = self._sample_size / self._n_rows
 
-            i = 0
             skip = skip_rate
-            for j, row in enumerate(source):
+            for row in source:
                 skip += skip_rate
                 if skip >= 1:
                     skip -= 1
-                    i += 1
-                    process_row(row)
+                    yield row
 
-        if i < 5000:  # Since the hist bins aren't built until 5K row
-            for k, v in self._stats.items():
-                v._build_hist_bins()
+        elif self._sampling == 'bernoulli':
+            rand = random.Random(self._seed)
+            rate = self._sample_rate
+
+            for row in source:
+                if rand.random() < rate:
+                    yield row
+
+        elif self._sampling == 'reservoir':
+            # Li's Algorithm L, which skips over rows rather than drawing a random number for each one.
+            rand = random.Random(self._seed)
+
+            def uniform():
+                return rand.random() or 1e-300
+
+            # Rows are copied, since a source may reuse one list for every row
+            k = self._sample_size
+            reservoir = [list(row) for row in islice(source, k)]
+
+            w = exp(log(uniform()) / k)
+
+            while True:
+                skip = int(floor(log(uniform()) / log(1 - w)))
+                row = next(islice(source, skip, skip + 1), _END)
+
+                if row is _END:
+                    break
+
+                reservoir[rand.randrange(k)] = list(row)
+                w *= exp(log(uniform()) / k)
+
+            for row in reservoir:
+                yield row
+
+    def run(self, source=None):
+        """ Run the stats. The source may yield dict-like rows, or lists or tuples, in which case
+        the first row must be the header. It may also be Arrow data, with columns matched to the schema by name.
+
+        :param source: If given, replaces the source from the constructor, as when resuming from a checkpoint
+        """
+
+        if source is not None:
+            self._source = source
+
+        from .arrow import is_arrow
+
+        try:
+            if is_arrow(self._source):
+                from .arrow import arrow_stats
+                return arrow_stats(self, self._source)
+
+            return self._run()
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        if self._spill_dir is not None:
+            self._spill_cleanup()
+
+    def _run(self):
+        from itertools import chain, islice
+
+        if self._pipelined:
+            from .pipeline import read_ahead
+            source = read_ahead(self._source, use_process=self._pipelined == 'process')
+        else:
+            source = iter(self._source)
+
+        start, self.resume_offset = self.resume_offset, 0
+
+        if self._checkpoint:
+            from . import checkpoint as cp
+            interval = self._checkpoint_interval or cp.DEFAULT_INTERVAL
+
+        try:
+            first = next(source)
+        except StopIteration:
+            self.n_rows_used = 0
+            return self
+
+        if isinstance(first, (list, tuple)):
+            process_row = self._positional_processor(first)
+            offset = 1  # Rows read from the source
+        else:
+            # Assume it is dict-like
+            process_row = self._dict_processor()
+            source = chain([first], source)
+            offset = 0
+
+        if start > offset:
+            # Skip the rows that were processed before the checkpoint
+            offset += sum(1 for _ in islice(source, start - offset))
+
+        i = 0
+
+        for row in self._sample(source):
+            i += 1
+            offset += 1
+            process_row(row)
+
+            if self._converge and i % self._converge_interval == 0 and self._is_converged():
+                self.converged = True
+                break
+
+            if self._checkpoint and offset % interval == 0:
+                cp.save(self, self._checkpoint, offset)
+
+        if self._checkpoint:
+            # Saved before the histograms are finished, since finishing can change the state
+            cp.save(self, self._checkpoint, offset)
+
+        self._finish(i)
 
         return self
 
+    def _finish(self, n_rows):
+        """Complete the stats after the last row"""
+
+        self.n_rows_used = n_rows
+
+        if self.cov is not None:
+            self.cov.flush()
+
+        for k, v in self._stats.items():
+            # Primed hist bins aren't built until 5K rows; streaming, calendar and exact ones are built at the end
+            if v.n < v.bin_primer_count or v.stream_hist is not None or v.date_stats is not None \
+                    or v.spill is not None:
+                v._build_hist_bins()
+
     def __str__(self):
         from tabulate import tabulate
 
@@ -527,6 +1804,137 @@ class Stats(object):
             return 'Statistics: None \n'
 
 
+class GroupedStats(object):
+    """Stats for each group of rows, where groups are keyed by the values of one or more columns, computed in one
+    pass over the source. Each group gets its own Stats, fed from the same rows.
+
+    The number of groups is capped at max_groups. After the cap is reached, rows for new keys are added to a
+    single group keyed by other_key, so the groups that are first seen, which are usually the common ones,
+    get their own stats, and rare late groups are combined. """
+
+    def __init__(self, source, schema, group_by, max_groups=1000, other_key='other', **kwargs):
+        """
+        :param source: Source iterator. Must return dict-like rows, or lists or tuples with a header first.
+        :param schema: Sequence of (name, type) for the stats columns
+        :param group_by: Name of the column to group by, or a sequence of names
+        :param max_groups: Maximum number of groups, not counting the other group
+        :param other_key: Key for the group of rows from groups past the cap
+        :param kwargs: Keyword arguments for each group's Stats, such as descriptive or distribution. The
+            source sampling, pipelining, exact and checkpoint options are not supported.
+        """
+
+        self._source = source
+        self._schema = list(schema)
+        self._group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        self._max_groups = max_groups
+        self._other_key = other_key
+        self._kwargs = kwargs
+
+        # Exact mode would make a spill directory, and checkpoints a file, for every group
+        for k in ('sampling', 'sample_size', 'sample_rate', 'converge', 'pipelined', 'exact', 'spill_dir',
+                  'checkpoint'):
+            if kwargs.get(k):
+                raise StatsError("GroupedStats does not support the '{}' option".format(k))
+
+        self.groups = OrderedDict()  # Key to Stats
+        self.group_rows = Counter()  # Key to number of rows
+
+    def _new_group(self):
+        return Stats(None, self._schema, **self._kwargs)
+
+    def run(self):
+        from itertools import chain
+        from operator import itemgetter
+
+        source = iter(self._source)
+
+        try:
+            first = next(source)
+        except StopIteration:
+            return self
+
+        if isinstance(first, (list, tuple)):
+            header = list(first)
+
+            try:
+                key_positions = [header.index(name) for name in self._group_by]
+            except ValueError as e:
+                raise StatsError("Group by column is not in the source header {}: {}".format(header, e))
+
+            get_key = itemgetter(*key_positions)
+
+            def make_processor(stats):
+                return stats._positional_processor(header)
+
+        else:
+            source = chain([first], source)
+            get_key = itemgetter(*self._group_by)
+
+            def make_processor(stats):
+                return stats._dict_processor()
+
+        processors = {}  # Group key to row processor
+        dispatch = {}  # Row key to group key and row processor, which is the other group for keys past the cap
+        max_dispatch = self._max_groups * 10
+        group_rows = self.group_rows
+        other_key = self._other_key
+
+        try:
+            for row in source:
+                key = get_key(row)
+
+                try:
+                    group_key, process_row = dispatch[key]
+                except KeyError:
+                    group_key = key
+
+                    if group_key not in processors:
+                        if len(processors) - (other_key in processors) >= self._max_groups:
+                            group_key = other_key
+
+                        if group_key not in processors:
+                            self.groups[group_key] = self._new_group()
+                            processors[group_key] = make_processor(self.groups[group_key])
+
+                    process_row = processors[group_key]
+
+                    if len(dispatch) < max_dispatch:
+                        dispatch[key] = (group_key, process_row)
+
+                group_rows[group_key] += 1
+                process_row(row)
+
+            for key, stats in self.groups.items():
+                stats._finish(group_rows[key])
+
+        finally:
+            for stats in self.groups.values():
+                stats._cleanup()
+
+        return self
+
+    def __getitem__(self, key):
+        return self.groups[key]
+
+    def __contains__(self, key):
+        return key in self.groups
+
+    def __len__(self):
+        return len(self.groups)
+
+    @property
+    def dict(self):
+        """Dict of group keys to the dict of each group's Stats"""
+        return OrderedDict((key, stats.dict) for key, stats in self.groups.items())
+
+    def __str__(self):
+        return '\n\n'.join('Group {}: {} rows\n{}'.format(key, self.group_rows[key], stats)
+                            for key, stats in self.groups.items())
+
+
+_END = object()  # Sentinel for the end of an iterator
+
+
 def _force_float(v):
     """ Converts given argument to float. On fail logs warning and returns 0.0.
 
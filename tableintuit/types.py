@@ -7,10 +7,10 @@
 Guess the whether rows in a collection are header, comments, footers, etc
 
 """
-import numpy as np
 import datetime
 import logging
 import math
+import sys
 from collections import deque, OrderedDict, defaultdict
 
 logger = logging.getLogger(__name__)
@@ -70,12 +70,12 @@ def test_float(v):
     # if v and v[0]  == '0' and len(v) > 1:
     # return 0
 
-    if isinstance(v, (bool, np.ndarray)):
+    if isinstance(v, bool) or _is_ndarray(v):
         return False
     try:
         float(v)
         return float
-    except:
+    except Exception:
         return False
 
 
@@ -84,7 +84,7 @@ def test_int(v):
     # if v and v[0] == '0' and len(v) > 1:
     # return 0
 
-    if isinstance(v, (bool, np.ndarray)):
+    if isinstance(v, bool) or _is_ndarray(v):
         return False
 
     try:
@@ -92,7 +92,7 @@ def test_int(v):
             return int
         else:
             return False
-    except:
+    except Exception:
         return False
 
 
@@ -118,7 +118,7 @@ def test_datetime(v):
             type_ = datetime.datetime
 
         return type_
-    except:
+    except Exception:
         return False
 
 
@@ -137,7 +137,7 @@ def test_ascii(v):
     try:
         v.encode('ascii')
         return True
-    except:
+    except Exception:
         return False
 
 
@@ -145,7 +145,7 @@ def test_latin1(v):
     try:
         v.encode('latin1')
         return True
-    except:
+    except Exception:
         return False
 
 def test_object(v):
@@ -154,9 +154,21 @@ def test_object(v):
     else:
         return False
 
+
+class ndarray(object):
+    """Stands for numpy.ndarray in the type tests and the type order, so this module doesn't import numpy.
+    Arrays are counted as this type"""
+
+
+def _is_ndarray(v):
+    # A value can't be an array unless numpy has been imported, so this doesn't import it
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(v, np.ndarray)
+
+
 def test_ndarray(v):
-    if isinstance(v, np.ndarray):
-        return np.ndarray
+    if _is_ndarray(v):
+        return ndarray
     else:
         return False
 
@@ -171,12 +183,47 @@ tests = [
     (datetime.datetime, test_datetime),
     (str, test_string),
     (geotype, test_geo),
-    (np.ndarray, test_ndarray),
+    (ndarray, test_ndarray),
     (bool, test_bool),
     (object, test_object),
 
 ]
 
+# The types, from narrowest to widest. A type comes after every type that it can represent
+type_precedence = ['unknown', 'bool', 'int', 'float', 'date', 'time', 'datetime', 'str', 'bytes', 'unicode', 'object']
+type_rank = {name: i for i, name in enumerate(type_precedence)}
+
+# The types each type can represent. Numbers and dates are separate branches, which only the text types cover
+type_covers = {
+    'unknown': {'unknown'},
+    'bool': {'unknown', 'bool'},
+    'int': {'unknown', 'bool', 'int'},
+    'float': {'unknown', 'bool', 'int', 'float'},
+    'date': {'unknown', 'date'},
+    'time': {'unknown', 'time'},
+    'datetime': {'unknown', 'date', 'datetime'},
+}
+type_covers.update({name: set(type_precedence[:i + 1]) for i, name in enumerate(type_precedence)
+                    if name not in type_covers})
+
+# The narrowest type that covers both of a pair of types, for promoting a column that has different types in
+# different parts of a table. So, int and float join to float, date and datetime to datetime, and int and date,
+# or date and time, to str
+type_join = {(a, b): next(t for t in type_precedence if a in type_covers[t] and b in type_covers[t])
+             for a in type_precedence for b in type_precedence}
+
+_type_names = {}
+
+
+def _named_types():
+    """Map of the names of builtin and datetime types to the types, built on first use"""
+    if not _type_names:
+        import builtins
+        _type_names.update(builtins.__dict__)
+        _type_names.update(datetime.__dict__)
+
+    return _type_names
+
 
 class Column(object):
     position = None
@@ -201,9 +248,10 @@ class Column(object):
     def inc_type_count(self, t):
         self.type_counts[t] += 1
 
-    def test(self, v):
+    def test(self, v, n=1):
+        """Test the type of a value, counting it n times"""
 
-        self.count += 1
+        self.count += n
 
         for test, testf in tests:
             type_ = testf(v)
@@ -215,11 +263,11 @@ class Column(object):
                     if v not in self.strings:
                         self.strings.append(v)
 
-                    self.str_type_counts['ascii'] += test_ascii(v)
-                    self.str_type_counts['latin1'] += test_latin1(v)
+                    self.str_type_counts['ascii'] += test_ascii(v) * n
+                    self.str_type_counts['latin1'] += test_latin1(v) * n
                     self.length = max(self.length, len(v))
 
-                self.type_counts[type_] += 1
+                self.type_counts[type_] += n
 
                 return type_
 
@@ -227,6 +275,30 @@ class Column(object):
 
 
 
+    def merge(self, other):
+        """Add the type counts of another Column, for the same column in another part of the table"""
+
+        self.count += other.count
+        self.length = max(self.length, other.length)
+        self.date_successes += getattr(other, 'date_successes', 0)
+
+        for k, v in other.type_counts.items():
+            self.type_counts[k] += v
+
+        for k, v in other.str_type_counts.items():
+            self.str_type_counts[k] += v
+
+        if other.strings and len(self.strings) < self.strings.maxlen:
+            seen = set(self.strings)
+            for v in other.strings:
+                if v not in seen:
+                    seen.add(v)
+                    self.strings.append(v)
+                    if len(self.strings) >= self.strings.maxlen:
+                        break
+
+        return self
+
     def _resolved_type(self):
         """Return the type for the columns, and a flag to indicate that the
         column has codes."""
@@ -286,7 +358,6 @@ class TypeIntuiter(object):
     header = None
     counts = None
 
-    # Names of intuited types, and the order they appear in tables.
     type_order = {
          datetime.datetime: 'dt',
          datetime.date: 'date',
@@ -295,7 +366,7 @@ class TypeIntuiter(object):
          int: 'int',
          str: 'str',
          bool: 'bool',
-         np.ndarray: 'nda',
+         ndarray: 'nda',
          object: 'obj',
          None: 'None'}
 
@@ -330,7 +401,18 @@ class TypeIntuiter(object):
                 print(i, value, e)
                 raise
 
-    def run(self, source, total_rows=None):
+    def run(self, source, total_rows=None, pipelined=False, checkpoint=None, checkpoint_interval=None):
+        """Intuit the types of the columns in the source, where the first row is the header.
+
+        :param source: Row iterable, a ColumnarTable, or Arrow data, a pyarrow Table, RecordBatch or
+            RecordBatchReader, where the column names are the header
+        :param total_rows: Number of rows in the source. If more than 10,000 rows, the source is sampled.
+        :param pipelined: If True or 'thread', read the source on a background thread. If 'process',
+            read in a separate process, and the source must be a picklable callable that returns the rows.
+        :param checkpoint: Path of a checkpoint file, which is written every checkpoint_interval rows, and at
+            the end. An intuiter restored with checkpoint.load() skips the rows that it had already read.
+        :param checkpoint_interval: Number of rows between checkpoints. Defaults to checkpoint.DEFAULT_INTERVAL
+        """
 
         MIN_SKIP_ROWS = 10000
 
@@ -342,7 +424,35 @@ class TypeIntuiter(object):
         else:
             skip_rows = None
 
+        from .columnar import ColumnarTable
+
+        if isinstance(source, ColumnarTable):
+            return self._run_columnar(source)
+
+        from .arrow import is_arrow
+
+        if is_arrow(source):
+            from .arrow import intuit_arrow
+            return intuit_arrow(source, self)
+
+        if pipelined:
+            from .pipeline import read_ahead
+            source = read_ahead(source, use_process=pipelined == 'process')
+
+        if checkpoint:
+            from . import checkpoint as cp
+            checkpoint_interval = checkpoint_interval or cp.DEFAULT_INTERVAL
+
+        start, self.resume_offset = getattr(self, 'resume_offset', 0), 0
+
+        i = -1
         for i, row in enumerate(iter(source)):
+            if i < start:
+                continue
+
+            if checkpoint and i and i % checkpoint_interval == 0:
+                cp.save(self, checkpoint, i)
+
             if skip_rows and i % skip_rows != 0:
                 continue
 
@@ -352,6 +462,63 @@ class TypeIntuiter(object):
 
             self.process_row(i, row)
 
+        if checkpoint:
+            cp.save(self, checkpoint, max(i + 1, start))
+
+        return self
+
+    def _run_columnar(self, table):
+        """Intuit the types of a ColumnarTable. Numeric cells are grouped into the classes that the type tests
+        distinguish, and each class is tested once, with its count, from the column arrays. Text cells are
+        tested once for each distinct value."""
+        from collections import Counter
+
+        import numpy as np
+
+        from . import columnar as c
+
+        if not len(table):
+            return self
+
+        self.process_header(table.head(1)[0])
+
+        for i in range(table.n_cols):
+            if i not in self._columns:
+                self._columns[i] = Column()
+                self._columns[i].position = i
+
+            col = self._columns[i]
+
+            tags = np.asarray(table.tags(i)[1:])
+            floats = table.numeric(i, 1)
+
+            is_float = tags == c.FLOAT
+            is_nan = is_float & np.isnan(floats)
+            is_inf = is_float & np.isinf(floats)
+            with np.errstate(invalid='ignore'):
+                is_integral = is_float & ~is_nan & ~is_inf & (floats == np.floor(floats))
+
+            for value, n in ((None, (tags == c.NONE).sum()),
+                             (0, (tags == c.INT).sum() + (tags == c.BIGINT).sum() + is_integral.sum()),
+                             (math.nan, is_nan.sum()),
+                             (math.inf, is_inf.sum()),
+                             (.5, (is_float & ~is_nan & ~is_inf & ~is_integral).sum()),
+                             (True, (tags == c.BOOL).sum())):
+                if n:
+                    col.test(value, int(n))
+
+            is_text = np.isin(tags, [c.STR, c.BYTES, c.DATE, c.DATETIME, c.TIME])
+
+            if is_text.any():
+                counts = Counter()
+
+                for start in range(1, len(table), c.CHUNK_ROWS):
+                    stop = min(start + c.CHUNK_ROWS, len(table))
+                    values = table.column(i, start, stop)
+                    counts.update(values[j] for j in np.flatnonzero(is_text[start - 1:stop - 1]))
+
+                for value, n in counts.items():
+                    col.test(value, n)
 
         return self
 
@@ -393,20 +560,17 @@ class TypeIntuiter(object):
     def normalize_type(typ):
 
         if isinstance(typ, str):
-            import datetime
-
-            m = dict(list(__builtins__.items()) + list(datetime.__dict__.items()))
             if typ == 'unknown':
                 typ = bytes
             else:
-                typ = m[typ]
+                typ = _named_types()[typ]
 
         return typ
 
     @staticmethod
     def promote_type(orig_type, new_type):
-        """Given a table with an original type, decide whether a new determination of a new applicable type
-        should overide the existing one"""
+        """Given a table with an original type, and a new determination of its type from another part of the
+        table, return the name of the narrowest type that covers both, from type_join"""
 
         if not new_type:
             return orig_type
@@ -424,14 +588,11 @@ class TypeIntuiter(object):
         except AttributeError:
             pass
 
-        type_precidence = ['unknown', 'int', 'float', 'date', 'time', 'datetime', 'str', 'bytes', 'unicode']
-
-        # TODO This will fail for dates and times.
-
-        if type_precidence.index(new_type) > type_precidence.index(orig_type):
-            return new_type
-        else:
-            return orig_type
+        try:
+            return type_join[orig_type, new_type]
+        except KeyError:
+            bad = new_type if new_type not in type_rank else orig_type
+            raise ValueError("'{}' is not in the type precedence".format(bad))
 
     def results_table(self):
 
@@ -0,0 +1,15 @@
+import random
+
+
+def make_rows(n, header, row, seed=None):
+    """Return a table of test data, a header and n rows
+
+    :param n: Number of rows
+    :param header: List of column names
+    :param row: Function of the row number and a random.Random that returns the row
+    :param seed: Seed of the random.Random
+    """
+
+    rand = random.Random(seed)
+
+    return [list(header)] + [row(i, rand) for i in range(n)]
@@ -0,0 +1,164 @@
+import datetime
+import random
+import unittest
+
+from tableintuit import Stats, TypeIntuiter
+from tableintuit.arrow import BatchMoments
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def make_columns(n=20000):
+    rand = random.Random(5)
+
+    return {
+        'i': [rand.randint(0, 1000) if i % 50 else None for i in range(n)],
+        'f': [rand.gauss(10, 3) if i % 60 else (None if i % 120 else float('nan')) for i in range(n)],
+        'g': [float(i % 7) if i % 30 else (None if i % 60 else float('nan')) for i in range(n)],
+        'year': [2000 + i % 20 for i in range(n)],
+        'k': [rand.randint(0, 150) for _ in range(n)],
+        's': ['code{}'.format(rand.randint(0, 30)) if i % 40 else None for i in range(n)],
+        'n': [str(rand.randint(0, 9)) if i % 3 else 'x' for i in range(n)],
+        'd': [datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 300) for i in range(n)],
+    }
+
+
+class BatchMomentsTest(unittest.TestCase):
+
+    def test_moments(self):
+        from livestats import livestats
+        import numpy as np
+
+        rand = random.Random(3)
+        values = [rand.expovariate(1) for _ in range(5000)]
+
+        bm = BatchMoments()
+        for chunk in range(0, len(values), 777):
+            bm.add_array(np.array(values[chunk:chunk + 777]))
+
+        ls = livestats.LiveStats([0.25, 0.5, 0.75])
+        for v in values:
+            ls.add(v)
+
+        self.assertEqual(5000, bm.count)
+        self.assertAlmostEqual(ls.mean(), bm.mean())
+        self.assertAlmostEqual(ls.variance(), bm.variance())
+        self.assertAlmostEqual(float(np.mean(values)), bm.mean())
+        self.assertAlmostEqual(float(np.var(values, ddof=1)), bm.variance())
+        self.assertEqual(min(values), bm.minimum())
+        self.assertEqual(max(values), bm.maximum())
+
+        d = np.array(values) - np.mean(values)
+        self.assertAlmostEqual((d ** 3).sum() / (5000 * bm.variance() ** 1.5), bm.skewness())
+        self.assertAlmostEqual((d ** 4).sum() / (5000 * bm.variance() ** 2) - 3, bm.kurtosis())
+
+        # All the values are in the sample, so the quartiles are exact
+        self.assertAlmostEqual(float(np.median(values)), dict(bm.quantiles())[0.5])
+
+
+@unittest.skipUnless(pa, 'pyarrow is not installed')
+class ArrowTest(unittest.TestCase):
+
+    def test_types(self):
+        cols = make_columns()
+        table = pa.table(cols)
+
+        rows = [list(cols)] + [list(r) for r in zip(*cols.values())]
+
+        ti_rows = TypeIntuiter().run(rows)
+        ti_arrow = TypeIntuiter().run(pa.RecordBatchReader.from_batches(table.schema, table.to_batches(3000)))
+
+        for name in cols:
+            self.assertEqual(ti_rows.columns[list(cols).index(name)].type_counts,
+                             ti_arrow.columns[list(cols).index(name)].type_counts, name)
+
+        self.assertEqual([c.resolved_type for c in ti_rows.columns.values()],
+                         [c.resolved_type for c in ti_arrow.columns.values()])
+
+    def test_stats(self):
+        import numpy as np
+
+        cols = make_columns()
+        table = pa.table(cols)
+
+        schema = [('i', int), ('f', float), ('g', float), ('year', int), ('s', str), ('n', str), ('d', datetime.date)]
+
+        rows = [list(cols)] + [list(r) for r in zip(*cols.values())]
+        s_rows = Stats(rows, schema, descriptive=True, distribution=True).run()
+
+        s_arrow = Stats(None, schema, descriptive=True, distribution=True).run(pa.Table.from_batches(table.to_batches(3000)))
+
+        self.assertEqual(len(rows) - 1, s_arrow.n_rows_used)
+
+        for name, _ in schema:
+            r, a = s_rows[name], s_arrow[name]
+
+            self.assertEqual(r.n, a.n, name)
+            self.assertEqual(r.lom, a.lom, name)
+            self.assertEqual(r.size, a.size, name)
+            self.assertEqual(r.nuniques, a.nuniques, name)
+
+            if r.is_numeric:
+                self.assertAlmostEqual(r.mean, a.mean, places=6)
+                self.assertAlmostEqual(r.stddev, a.stddev, places=6)
+                self.assertEqual(r.min, a.min)
+                self.assertEqual(r.max, a.max)
+                # LiveStats updates the third moment approximately, so compare with the exact skewness
+                values = np.array([v for v in cols[name] if v is not None and v == v], dtype=float)
+                d = values - values.mean()
+                self.assertAlmostEqual((d ** 3).sum() / (len(d) * values.var(ddof=1) ** 1.5), a.skewness)
+                self.assertAlmostEqual(r.bin_min, a.bin_min)
+                self.assertEqual(r.bins, a.bins)
+            else:
+                self.assertEqual(dict(r.counts), dict(a.counts), name)
+
+    def test_stats_dict(self):
+        from tableintuit.arrow import arrow_schema
+
+        cols = make_columns()
+        table = pa.table(cols)
+        schema = arrow_schema(table.schema)
+
+        rows = [list(cols)] + [list(r) for r in zip(*cols.values())]
+        expected = Stats(rows, schema, descriptive=True, distribution=True).run().dict
+
+        # LiveStats estimates the quartiles and the third and fourth moments, where the Arrow path has exact
+        # values, so these are compared within a fraction of the standard deviation, or absolutely
+        estimates = {'p25', 'p50', 'p75'}
+        moments = {'skewness', 'kurtosis'}
+
+        for batch_size in (None, 3000):
+            source = table if batch_size is None else pa.Table.from_batches(table.to_batches(batch_size))
+            found = Stats(None, schema, descriptive=True, distribution=True).run(source).dict
+
+            self.assertEqual(list(expected), list(found))
+
+            for name in expected:
+                e, f = expected[name].dict, found[name].dict
+                self.assertEqual(list(e), list(f), name)
+
+                for key in e:
+                    msg = '{} {} {}'.format(batch_size, name, key)
+
+                    if key in estimates and e[key] is not None:
+                        self.assertAlmostEqual(e[key], f[key], delta=.02 * e['std'], msg=msg)
+                    elif key in moments and e[key] is not None:
+                        self.assertAlmostEqual(e[key], f[key], delta=.02, msg=msg)
+                    elif isinstance(e[key], float):
+                        self.assertAlmostEqual(e[key], f[key], places=6, msg=msg)
+                    else:
+                        self.assertEqual(e[key], f[key], msg)
+
+    def test_arrow_schema(self):
+        from tableintuit.arrow import arrow_schema
+
+        table = pa.table(make_columns(100))
+        self.assertEqual([('i', int), ('f', float), ('g', float), ('year', int), ('k', int), ('s', str), ('n', str),
+                          ('d', datetime.date)], arrow_schema(table.schema))
+
+
+if __name__ == '__main__':
+    unittest.main()
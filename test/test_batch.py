@@ -0,0 +1,96 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+
+from tableintuit import profile_many
+from tableintuit.profiler import expand_sources, map_sources, profile_file
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = []
+
+        for i, n in enumerate([30, 400, 120, 60]):
+            path = os.path.join(self.dir.name, 'f{}.csv'.format(i))
+            with open(path, 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(['id', 'value'])
+                for j in range(n):
+                    w.writerow([j, j * 2.5])
+            self.paths.append(path)
+
+        os.makedirs(os.path.join(self.dir.name, 'sub'))
+        self.bad = os.path.join(self.dir.name, 'sub', 'bad.csv')
+        with open(self.bad, 'w') as f:
+            f.write('')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_expand(self):
+        self.assertEqual(sorted(self.paths + [self.bad]), sorted(expand_sources(self.dir.name)))
+        self.assertEqual(sorted(self.paths), expand_sources(os.path.join(self.dir.name, '*.csv')))
+        self.assertEqual(['http://example.com/a*.csv'], expand_sources('http://example.com/a*.csv'))
+
+    def test_profile_many(self):
+        results = list(profile_many(self.dir.name, workers=2, sample=10000))
+
+        self.assertEqual(5, len(results))
+
+        by_source = {r['source']: r for r in results}
+
+        for path in self.paths:
+            self.assertEqual(profile_file(path, sample=10000), by_source[path]['profile'])
+
+        # One bad file doesn't stop the others
+        self.assertIn('error', by_source[self.bad])
+
+    def test_serial_order(self):
+        # In process, results come in the order they are started, largest first
+        results = list(profile_many(self.paths, workers=0, sample=10000))
+        self.assertEqual([1, 2, 3, 0], [self.paths.index(r['source']) for r in results])
+
+    def test_timeout(self):
+        # The slow sources swallow exceptions, as the type tests and row generators do
+        start = time.time()
+        results = {r['source']: r for r in map_sources(_slow, ['slow1', 'fast', 'slow2', 'crash'],
+                                                       workers=2, timeout=.5)}
+        elapsed = time.time() - start
+
+        self.assertTrue(results['slow1']['timed_out'])
+        self.assertTrue(results['slow2']['timed_out'])
+        self.assertIn('TimeoutError', results['slow1']['error'])
+        self.assertEqual('fast', results['fast']['result'])
+        self.assertIn('exited', results['crash']['error'])
+        self.assertLess(elapsed, 4)
+
+    def test_timeout_in_process(self):
+        start = time.time()
+        results = list(map_sources(_slow, ['slow', 'fast'], workers=0, timeout=.3))
+
+        self.assertTrue(results[0]['timed_out'])
+        self.assertEqual('fast', results[1]['result'])
+        self.assertLess(time.time() - start, 3)
+
+
+def _slow(source):
+    if source == 'crash':
+        os._exit(1)
+
+    end = time.time() + (10 if source.startswith('slow') else 0)
+
+    while time.time() < end:
+        try:
+            time.sleep(.01)
+        except Exception:
+            pass
+
+    return source
+
+
+if __name__ == '__main__':
+    unittest.main()
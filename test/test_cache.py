@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+import unittest
+
+from tableintuit.cache import ResultCache, fingerprint
+
+
+def _worker(args):
+    directory, path, i = args
+    cache = ResultCache(directory, max_size=2000)
+    for j in range(20):
+        cache.put(ResultCache.key(path, {'j': j % 5}), {'worker': i, 'values': list(range(20))})
+        value = cache.get(ResultCache.key(path, {'j': (j + 1) % 5}))
+        assert value is None or value['values'] == list(range(20))
+    return True
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'data.csv')
+        with open(self.path, 'w') as f:
+            f.write('a,b\n' + ''.join('{},{}\n'.format(i, i * 2) for i in range(20000)))
+
+        self.cache_dir = os.path.join(self.dir.name, 'cache')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_fingerprint(self):
+
+        fp = fingerprint(self.path)
+        self.assertEqual(fp, fingerprint(self.path))
+
+        # Same size, different content in the middle
+        with open(self.path, 'r+') as f:
+            f.seek(os.path.getsize(self.path) // 2)
+            f.write('X')
+        os.utime(self.path, ns=(os.stat(self.path).st_atime_ns, os.stat(self.path).st_mtime_ns))
+
+        self.assertNotEqual(fp, fingerprint(self.path))
+
+    def test_get_or_compute(self):
+        from tableintuit import TableProfiler
+
+        cache = ResultCache(self.cache_dir)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            with open(self.path) as f:
+                rows = [line.strip().split(',') for line in f]
+            return TableProfiler(descriptive=True).run(rows).dict
+
+        r1 = cache.get_or_compute(self.path, {'descriptive': True}, compute)
+
+        t = time.time()
+        r2 = cache.get_or_compute(self.path, {'descriptive': True}, compute)
+        self.assertLess(time.time() - t, .1)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(r1['stats'], r2['stats'])
+        self.assertEqual(r1['rows'], r2['rows'])
+
+        # Different options miss
+        cache.get_or_compute(self.path, {'descriptive': False}, compute)
+        self.assertEqual(2, len(calls))
+
+    def test_eviction(self):
+
+        cache = ResultCache(self.cache_dir, max_size=1000)
+
+        keys = [ResultCache.key(self.path, {'i': i}) for i in range(10)]
+
+        for i, key in enumerate(keys[:4]):
+            cache.put(key, {'data': 'x' * 200})
+            os.utime(cache._path(key), (i, i))
+
+        # Using the oldest entry makes it the most recent, so the second oldest is evicted
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[4], {'data': 'x' * 200})
+
+        self.assertLessEqual(cache.size, 1000)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[4]))
+
+    def test_concurrent(self):
+        from multiprocessing import Pool
+
+        with Pool(4) as pool:
+            self.assertTrue(all(pool.map(_worker, [(self.cache_dir, self.path, i) for i in range(4)])))
+
+        cache = ResultCache(self.cache_dir, max_size=2000)
+        self.assertLessEqual(cache.size, 2000)
+        self.assertEqual([], [e for e in os.listdir(self.cache_dir) if e.startswith('.tmp')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from tableintuit import Stats, TypeIntuiter, StatsError
+from tableintuit import checkpoint
+
+from . import make_rows
+
+
+def row(i, rand):
+    return [i, rand.lognormvariate(0, 1) if i % 50 else None, 'x{}'.format(rand.randint(0, 20)),
+            '2020-{:02d}-{:02d}'.format(i % 12 + 1, i % 28 + 1) if i % 7 else None]
+
+
+HEADER = ['a', 'b', 'c', 'd']
+SCHEMA = [('a', int), ('b', float), ('c', str), ('d', 'date')]
+OPTIONS = dict(descriptive=True, distribution=True, sample_values=True, native_dates=True, correlation=True)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'checkpoint')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_resume_types(self):
+        rows = make_rows(8000, HEADER, row, 9)
+
+        TypeIntuiter().run(rows[:4001], checkpoint=self.path)
+
+        ti = checkpoint.load(self.path)
+        self.assertEqual(4001, ti.resume_offset)
+
+        ti.run(rows, checkpoint=self.path)
+
+        self.assertEqual(list(TypeIntuiter().run(rows).to_rows()), list(ti.to_rows()))
+        self.assertEqual(len(rows), checkpoint.load(self.path).resume_offset)
+
+    def test_resume_stats(self):
+        import numpy as np
+
+        rows = make_rows(8000, HEADER, row, 9)
+        full = Stats(iter(rows), SCHEMA, **OPTIONS).run()
+
+        for streaming_hist in (False, True):
+            # Stop partway, before and after the histogram is primed, then resume on the appended source
+            Stats(iter(rows[:3001]), SCHEMA, streaming_hist=streaming_hist, checkpoint=self.path, **OPTIONS).run()
+
+            s = checkpoint.load(self.path)
+            self.assertEqual(3001, s.resume_offset)
+            s.run(iter(rows[:6001]))
+
+            checkpoint.load(self.path).run(iter(rows))
+
+            s = checkpoint.load(self.path)
+            self.assertEqual(len(rows), s.resume_offset)
+
+            s = checkpoint.load(self.path).run(iter(rows))  # Nothing new to read
+
+            expected = full if not streaming_hist else Stats(iter(rows), SCHEMA, streaming_hist=True,
+                                                             **OPTIONS).run()
+
+            for name, _ in SCHEMA:
+                self.assertEqual(expected[name].dict, s[name].dict)
+
+            np.testing.assert_allclose(expected.correlation, s.correlation)
+
+    def test_periodic(self):
+        rows = make_rows(5000, HEADER, row, 9)
+
+        def failing():
+            for i, row in enumerate(rows):
+                if i == 2500:
+                    raise IOError("Connection lost")
+                yield row
+
+        with self.assertRaises(IOError):
+            Stats(failing(), SCHEMA, checkpoint=self.path, checkpoint_interval=1000, **OPTIONS).run()
+
+        s = checkpoint.load(self.path)
+        self.assertEqual(2000, s.resume_offset)
+        s.run(iter(rows))
+
+        expected = Stats(iter(rows), SCHEMA, **OPTIONS).run()
+        for name, _ in SCHEMA:
+            self.assertEqual(expected[name].dict, s[name].dict)
+
+        # Dict rows have no header row
+        dict_rows = [dict(zip(rows[0], row)) for row in rows[1:]]
+        Stats(iter(dict_rows[:1000]), SCHEMA, checkpoint=self.path, **OPTIONS).run()
+        s = checkpoint.load(self.path).run(iter(dict_rows))
+        self.assertEqual(4000, s.n_rows_used)
+        self.assertEqual(expected['b'].dict, s['b'].dict)
+
+    def test_errors(self):
+
+        with self.assertRaises(StatsError):
+            Stats(iter([]), SCHEMA, sampling='reservoir', sample_size=10, checkpoint=self.path)
+
+        with self.assertRaises(checkpoint.CheckpointError):
+            checkpoint.loads(b'not a checkpoint')
+
+        data = checkpoint.dumps(TypeIntuiter().run(make_rows(10, HEADER, row, 9)), 11)
+        self.assertTrue(data.startswith(checkpoint.MAGIC))
+        self.assertEqual(11, checkpoint.loads(data).resume_offset)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import random
+import unittest
+
+from tableintuit.cluster import ClusterHeaders, HeaderIndex
+
+
+def make_headers(n_schemas=4, files_per_schema=6, seed=2):
+    rand = random.Random(seed)
+    ch = ClusterHeaders()
+
+    for s in range(n_schemas):
+        base = ['s{}_col{}'.format(s, i) for i in range(20)]
+        for f in range(files_per_schema):
+            header = list(base)
+            # A few columns renamed or added in each file
+            for _ in range(rand.randint(0, 2)):
+                header[rand.randrange(len(header))] = 'x{}'.format(rand.random())
+            header.append('extra')
+            ch.add_header('schema{}_file{}_{}'.format(s, f, 2000 + f), header)
+
+    return ch
+
+
+class ClusterTest(unittest.TestCase):
+
+    def test_lsh_cluster(self):
+
+        ch = make_headers()
+
+        lsh = ch.cluster(lsh=True)
+
+        self.assertEqual(['schema{}_file'.format(i) for i in range(4)], sorted(lsh))
+        for name, members in lsh.items():
+            self.assertEqual(6, len(members))
+            self.assertTrue(all(m.startswith(name) for m in members))
+
+        # Every matching pair, from scoring all of the pairs, is in the same cluster
+        cluster_of = {m: name for name, members in lsh.items() for m in members}
+        for a, b in ch.pairs():
+            if ch.match_headers(ch._headers[a], ch._headers[b]) < .3:
+                self.assertEqual(cluster_of[a], cluster_of[b])
+
+        # Far fewer pairs are scored
+        self.assertLess(len(ch.lsh_pairs()), len(ch.pairs()) / 4)
+
+    def test_long_substr(self):
+
+        def brute_long_substr(data):
+            # The original implementation
+            data = list(data)
+            substr = ''
+            if len(data) > 1 and len(data[0]) > 0:
+                for i in range(len(data[0])):
+                    for j in range(len(data[0]) - i + 1):
+                        if j > len(substr) and ClusterHeaders.is_substr(data[0][i:i + j], data):
+                            substr = data[0][i:i + j]
+            return substr
+
+        rand = random.Random(4)
+
+        for _ in range(500):
+            data = [''.join(rand.choice('ab_c') for _ in range(rand.randint(0, 15)))
+                    for _ in range(rand.randint(1, 5))]
+            self.assertEqual(brute_long_substr(data), ClusterHeaders.long_substr(data), data)
+
+        names = ['ca_schools_2010_enrollment.csv', 'ca_schools_2011_enrollment.csv', 'schools_2012_enrollment']
+        self.assertEqual('schools_201', ClusterHeaders.long_substr(names))
+        self.assertEqual('_enrollment', ClusterHeaders.long_substr(names[:2] + ['x_enrollment']))
+
+    def test_header_index(self):
+        import os
+        import tempfile
+
+        batch = make_headers()
+        headers = list(batch._headers.items())
+
+        ch = ClusterHeaders(index=HeaderIndex())
+        for name, header in headers:
+            ch.add_header(name, header)
+
+        # Clusters may merge as headers arrive, so compare the final assignments
+        cids = [ch._index.assignments[name] for name, _ in headers]
+        self.assertEqual(4, len(set(cids)))
+        self.assertEqual(sorted(batch.cluster(lsh=True).items()), sorted(ch._index.clusters.items()))
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'index.json')
+
+            for name, header in headers[:10]:
+                HeaderIndex.update(path, name, header)
+
+            index = HeaderIndex.load(path)
+            mem = HeaderIndex()
+            for name, header in headers[:10]:
+                mem.assign(name, header)
+            self.assertEqual(mem.clusters, index.clusters)
+
+            # A new file with a known schema joins its cluster, and an unrelated one starts a new cluster
+            self.assertEqual(index.assignments[headers[0][0]],
+                             HeaderIndex.update(path, 'new_file', headers[0][1] + ['another']))
+            self.assertNotIn(HeaderIndex.update(path, 'other_file', ['a', 'b', 'c']), index.assignments.values())
+
+    def test_align_columns(self):
+        import time
+
+        old = ['total_population', 'median_income', 'pct_poverty', 'geoid', 'dropped']
+        new = ['geoid', 'median_household_income', 'total_pop', 'poverty_pct', 'unrelated']
+
+        m = ClusterHeaders.match_headers_a(old, new, threshold=.3)
+        self.assertEqual(('geoid', 1.0), m['geoid'])
+        self.assertEqual('total_pop', m['total_population'][0])
+        self.assertEqual('median_household_income', m['median_income'][0])
+        self.assertEqual('poverty_pct', m['pct_poverty'][0])
+        self.assertNotIn('dropped', m)
+
+        # One to one, even when two old columns are closest to the same new column
+        m = ClusterHeaders.match_headers_a(['income_2010', 'income_2011'], ['income_2012'], threshold=.1)
+        self.assertEqual(1, len(m))
+
+        # A wide table, with a tenth of the columns renamed
+        rand = random.Random(6)
+        words = ['pop', 'income', 'age', 'male', 'female', 'total', 'median', 'hh', 'race', 'pct', 'est', 'moe']
+        old = list(dict.fromkeys('_'.join(rand.sample(words, 4)) + str(i) for i in range(2000)))
+        new = [c.replace('_', '-', 1) if i % 10 == 0 else c for i, c in enumerate(old)]
+
+        t = time.time()
+        m = ClusterHeaders.match_headers_a(old, new, metric='cosine')
+        self.assertLess(time.time() - t, 5)
+
+        self.assertEqual(len(old), len(m))
+        self.assertTrue(all(m[c][0] == n for c, n in zip(old, new)))
+
+    def test_matrix_cluster(self):
+        import numpy as np
+
+        ch = make_headers()
+
+        self.assertEqual(ch.cluster(lsh=True), ch.cluster(matrix=True))
+
+        # Small blocks give the same matrix as one block
+        blocks = list(ch.distance_matrix(memory_limit=1000))
+        self.assertGreater(len(blocks), 1)
+
+        names, _, full = next(ch.distance_matrix())
+        np.testing.assert_array_equal(full, np.vstack([b for _, _, b in blocks]))
+
+        a, b = names.index('schema0_file0_2000'), names.index('schema0_file1_2001')
+        self.assertEqual(0, full[a, a])
+        self.assertAlmostEqual(ch.match_headers(ch._headers[names[a]], ch._headers[names[b]]), full[a, b])
+        self.assertEqual(40, full[a, names.index('schema1_file0_2000')])  # Only 'extra' in common
+
+
+if __name__ == '__main__':
+    unittest.main()
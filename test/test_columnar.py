@@ -0,0 +1,98 @@
+import datetime
+import math
+import os
+import tempfile
+import unittest
+
+from tableintuit import Stats, TypeIntuiter, intuit_df
+from tableintuit.columnar import write_columnar, ColumnarTable
+
+from . import make_rows
+
+
+def row(i, rand):
+    mixed = rand.choice([None, 1, 2.5, 3.0, float('nan'), float('inf'), True, 'x', '12', 'é', b'b', 1 << 70])
+
+    return [i, rand.random() * 100, 'code{}'.format(rand.randint(0, 50)), mixed,
+            datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 400)]
+
+
+def mixed_rows(n=5000):
+    return make_rows(n, ['i', 'f', 's', 'mixed', 'when'], row, 11) + [[1, 2.0]]  # And a short row
+
+
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'table')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_roundtrip(self):
+        rows = mixed_rows()
+        table = write_columnar(iter(rows), self.path)
+
+        self.assertEqual(len(rows), len(table))
+        self.assertEqual(5, table.n_cols)
+
+        padded = [row + [None] * (5 - len(row)) for row in rows]
+
+        def same(a, b):
+            return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+        for a, b in zip(padded, ColumnarTable(self.path)):
+            self.assertTrue(all(same(x, y) and type(x) is type(y) for x, y in zip(a, b)), (a, b))
+
+        self.assertEqual(padded[-3:], table.tail(3))
+        self.assertEqual(padded[:3], table.head(3))
+
+        f = table.numeric(1)
+        self.assertEqual(rows[1][1], f[1])
+        self.assertTrue(math.isnan(f[0]))
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'Needs /proc/self/fd')
+    def test_wide_table(self):
+        n_cols = 1000
+        open_files = []
+
+        def source():
+            yield ['c{}'.format(i) for i in range(n_cols)]
+            for r in range(100):
+                yield list(range(r, r + n_cols))
+            open_files.append(len(os.listdir('/proc/self/fd')))
+
+        before = len(os.listdir('/proc/self/fd'))
+        table = write_columnar(source(), self.path)
+
+        # The column files are only open while they are written, not while the source is read
+        self.assertLess(open_files[0] - before, 10)
+
+        # Reading maps a bounded number of arrays at a time
+        for i, row in enumerate(table):
+            if i == 50:
+                open_files.append(len(os.listdir('/proc/self/fd')))
+
+        self.assertLess(open_files[1] - before, 100)
+        self.assertEqual(list(range(99, 99 + n_cols)), table.tail(1)[0])
+
+    def test_intuit(self):
+        rows = mixed_rows()
+        padded = [row + [None] * (5 - len(row)) for row in rows]
+
+        table = write_columnar(iter(rows), self.path)
+
+        expected = TypeIntuiter().run(padded)
+        ti = TypeIntuiter().run(table)
+
+        self.assertEqual(list(expected.to_rows()), list(ti.to_rows()))
+        self.assertEqual(list(expected.to_rows()), list(intuit_df(table).to_rows()))
+
+        schema = [('i', int), ('f', float), ('s', str)]
+        self.assertEqual([s.dict for _, s in Stats(iter(padded), schema, descriptive=True).run().stats()],
+                         [s.dict for _, s in Stats(table, schema, descriptive=True).run().stats()])
+
+
+if __name__ == '__main__':
+    unittest.main()
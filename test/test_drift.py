@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from tableintuit import Stats, TypeIntuiter
+from tableintuit.drift import make_profile, diff_profiles, ProfileDiff
+
+from . import make_rows
+
+
+def profile(rows):
+    ti = TypeIntuiter().run(rows)
+    schema = [(c.header, c.resolved_type) for c in ti.columns.values()]
+    stats = Stats(iter(rows), schema, descriptive=True, distribution=True, sample_values=True).run()
+
+    # Profiles are compared after a round trip through JSON, as they would be when stored
+    return json.loads(json.dumps(make_profile(stats, ti)))
+
+
+class DriftTest(unittest.TestCase):
+
+    def test_drift(self):
+
+        old = profile(make_rows(6000, ['amount', 'stable', 'state', 'code', 'gone'],
+                                lambda i, rand: [rand.gauss(100, 10), rand.gauss(50, 5),
+                                                 rand.choice(['CA', 'NV', 'OR']), i, 1], 11))
+        new = profile(make_rows(6000, ['amount', 'stable', 'state', 'code', 'new'],
+                                lambda i, rand: [rand.gauss(108, 10), rand.gauss(50, 5),
+                                                 rand.choice(['CA', 'NV', 'WA']), 'c{}'.format(i), 1], 12))
+
+        drifts = diff_profiles(old, new)
+        kinds = {(d.column, d.kind) for d in drifts}
+
+        self.assertIn(('amount', 'mean'), kinds)
+        self.assertIn(('amount', 'psi'), kinds)
+        self.assertIn(('amount', 'ks'), kinds)
+        self.assertIn(('code', 'type'), kinds)
+        self.assertIn(('state', 'top_values'), kinds)
+        self.assertIn(('gone', 'removed'), kinds)
+        self.assertIn(('new', 'added'), kinds)
+        self.assertFalse(any(d.column == 'stable' for d in drifts))
+
+        self.assertEqual(sorted(drifts, key=lambda d: d.severity, reverse=True), drifts)
+
+        self.assertEqual([], diff_profiles(old, old))
+        self.assertIn('amount', str(ProfileDiff(old, new).run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import unittest
+
+# Budget, in seconds, for the median time of 'import tableintuit' in a fresh interpreter. It takes about 30ms, and
+# importing numpy alone takes about this long, so it fails if the import starts loading the heavy modules again.
+IMPORT_BUDGET = .1
+
+
+def run_python(code):
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return out.decode('utf8').strip()
+
+
+def loaded_modules(code):
+    """Run code in a fresh interpreter, and return the heavy modules it loaded"""
+
+    return run_python(code + "; import sys; "
+                      "print(','.join(m for m in ('numpy', 'pandas', 'dateutil', 'livestats', 'tabulate', "
+                      "'rowgenerators', 'six', 'tableintuit.types', 'tableintuit.stats', 'tableintuit.profiler') "
+                      "if m in sys.modules))")
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_lazy_imports(self):
+
+        self.assertEqual('', loaded_modules("import tableintuit"))
+
+        # Loading the type module, for the intuiter, doesn't load the heavy modules either
+        self.assertEqual('tableintuit.types', loaded_modules("import tableintuit; tableintuit.TypeIntuiter"))
+
+        # Nor does getting the array type, which is a stand in for numpy.ndarray
+        self.assertEqual('tableintuit.types',
+                         loaded_modules("from tableintuit.types import TypeIntuiter, tests, ndarray, test_ndarray; "
+                                        "assert TypeIntuiter.type_order[ndarray] == 'nda'; "
+                                        "assert (ndarray, test_ndarray) in tests"))
+
+        # They load when they are used
+        self.assertEqual('True', run_python("import sys; from tableintuit import Stats; "
+                                            "Stats([['a'], [1]], [('a', int)], descriptive=True).run(); "
+                                            "print('livestats' in sys.modules)"))
+
+    def test_star_import(self):
+
+        names = run_python("from tableintuit import *; names = dir(); "
+                           "print(','.join(n for n in ('TypeIntuiter', 'Stats', 'RowIntuiter', 'StatsError', "
+                           "'intuit_df') if n in names))")
+
+        self.assertEqual('TypeIntuiter,Stats,RowIntuiter,StatsError,intuit_df', names)
+
+    def test_all(self):
+        import inspect
+
+        import tableintuit
+        from tableintuit import types
+
+        # Every name that types defines is exported, as with 'from .types import *', and resolves
+        defined = {n for n, v in vars(types).items() if not n.startswith('_') and not inspect.ismodule(v) and
+                   getattr(v, '__module__', types.__name__) == types.__name__}
+
+        self.assertEqual(defined, set(tableintuit._lazy_names['types']))
+
+        for name in tableintuit.__all__:
+            self.assertTrue(hasattr(tableintuit, name), name)
+
+        with self.assertRaises(AttributeError):
+            tableintuit.nonesuch
+
+    def test_import_time(self):
+        from statistics import median
+
+        times = [float(run_python("import time; t = time.perf_counter(); import tableintuit; "
+                                  "print(time.perf_counter() - t)")) for _ in range(7)]
+
+        self.assertLess(median(times), IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import csv
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+from tableintuit import TypeIntuiter
+from tableintuit.partition import PartitionIntuiter
+
+
+def write(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+class PartitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+
+        for m in range(1, 5):
+            write(os.path.join(d, '2020-{:02d}.csv'.format(m)), ['id', 'amount', 'name'],
+                  [[i, i * 2, 'n{}'.format(i)] for i in range(40)])
+
+        # Reordered columns, differently cased, with floats in the int column
+        write(os.path.join(d, '2020-05.csv'), ['Name', 'AMOUNT', 'id'],
+              [['n{}'.format(i), i * 2.5, i] for i in range(40)])
+
+        # A missing column, and an added one
+        write(os.path.join(d, '2020-06.csv'), ['id', 'amount', 'region'],
+              [[i, i, 'r{}'.format(i % 3)] for i in range(40)])
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_partition(self):
+        pi = PartitionIntuiter(workers=2, sample=10000).run(os.path.join(self.dir.name, '*.csv'))
+
+        self.assertEqual(6, len(pi.shards))
+        self.assertEqual([('id', int), ('amount', float), ('name', str), ('region', str)], pi.schema)
+
+        self.assertEqual(40 * 5, pi.columns['name'].count)
+        self.assertEqual(40 * 6, pi.columns['id'].count)
+
+        kinds = {(os.path.basename(d.shard), d.kind, d.column) for d in pi.divergences}
+
+        self.assertIn(('2020-05.csv', 'order', None), kinds)
+        # The shards that have the narrower type diverge from the schema
+        self.assertIn(('2020-01.csv', 'type', 'amount'), kinds)
+        self.assertNotIn(('2020-05.csv', 'type', 'amount'), kinds)
+        self.assertIn(('2020-06.csv', 'missing', 'name'), kinds)
+        self.assertIn(('2020-01.csv', 'missing', 'region'), kinds)
+        self.assertNotIn(('2020-01.csv', 'type', 'id'), kinds)
+
+        self.assertEqual(4, len(pi.dict['schema']))
+        self.assertIn('region', str(pi))
+
+    def test_errors(self):
+        with open(os.path.join(self.dir.name, 'bad.csv'), 'w') as f:
+            f.write('')
+
+        pi = PartitionIntuiter(workers=0, sample=10000, timeout=5).run(self.dir.name)
+
+        self.assertEqual(7, len(pi.shards) + len(pi.errors))
+        self.assertEqual(['id', 'amount', 'name', 'region'], [name for name, _ in pi.schema])
+
+    def test_merge_many(self):
+        shards = []
+        for i in range(2000):
+            header = ['c{}'.format(j) for j in range(20)]
+            rows = [header] + [[j + i, j * 1.5, 'x'] + [j] * 17 for j in range(3)]
+            shards.append(('shard{:04d}'.format(i), TypeIntuiter().run(rows)))
+
+        start = time.time()
+        pi = PartitionIntuiter().merge(shards)
+        elapsed = time.time() - start
+
+        self.assertEqual(['int', 'float', 'str'] + ['int'] * 17, list(pi.types.values()))
+        self.assertEqual([], pi.divergences)
+        self.assertLess(elapsed, 5)
+
+
+class TypeLatticeTest(unittest.TestCase):
+
+    def test_promote(self):
+        self.assertEqual('float', TypeIntuiter.promote_type(int, float))
+        self.assertEqual('float', TypeIntuiter.promote_type('float', 'int'))
+        self.assertEqual('str', TypeIntuiter.promote_type('datetime', str))
+        self.assertEqual(int, TypeIntuiter.promote_type(int, None))
+
+        with self.assertRaises(ValueError):
+            TypeIntuiter.promote_type('int', 'nope')
+
+    def test_join(self):
+        from tableintuit.types import type_join, type_precedence
+
+        self.assertEqual('str', TypeIntuiter.promote_type(int, 'date'))
+        self.assertEqual('str', TypeIntuiter.promote_type('float', 'datetime'))
+        self.assertEqual('str', TypeIntuiter.promote_type('date', 'time'))
+        self.assertEqual('datetime', TypeIntuiter.promote_type('date', 'datetime'))
+        self.assertEqual('float', TypeIntuiter.promote_type('bool', 'float'))
+        self.assertEqual('object', TypeIntuiter.promote_type('time', 'object'))
+
+        # The join is a semilattice: commutative, idempotent and associative
+        for a in type_precedence:
+            self.assertEqual(a, type_join[a, a])
+            for b in type_precedence:
+                self.assertEqual(type_join[a, b], type_join[b, a])
+                for c in type_precedence:
+                    self.assertEqual(type_join[type_join[a, b], c], type_join[a, type_join[b, c]])
+
+    def test_temporal_shards(self):
+        def shard(values):
+            return TypeIntuiter().run([['id', 'v']] + [[i, v] for i, v in enumerate(values)])
+
+        dates = ['2020-01-{:02d}'.format(i) for i in range(1, 21)]
+        datetimes = ['2020-01-{:02d} 10:30:00'.format(i) for i in range(1, 21)]
+
+        pi = PartitionIntuiter().merge([('a', shard(dates)), ('b', shard(datetimes))])
+        self.assertEqual('date', pi.shard_types['a']['v'])
+        self.assertEqual('datetime', pi.types['v'])
+
+        # Numbers in one shard and dates in another are neither
+        pi = PartitionIntuiter().merge([('a', shard(dates)), ('b', shard(range(20)))])
+        self.assertEqual('str', pi.types['v'])
+        self.assertEqual({('a', 'date'), ('b', 'int')},
+                         {(d.shard, d.found) for d in pi.divergences if d.kind == 'type' and d.column == 'v'})
+
+    def test_normalize(self):
+        self.assertIs(int, TypeIntuiter.normalize_type('int'))
+        self.assertIs(datetime.date, TypeIntuiter.normalize_type('date'))
+        self.assertIs(bytes, TypeIntuiter.normalize_type('unknown'))
+        self.assertIs(float, TypeIntuiter.normalize_type(float))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from functools import partial
+
+from tableintuit import Stats, TypeIntuiter
+from tableintuit.pipeline import read_ahead
+
+from . import make_rows
+
+
+def row(i, rand):
+    return [i, 'x{}'.format(i % 7)]
+
+
+# A picklable callable, for reading in a process
+rows = partial(make_rows, 10000, ['a', 'b'], row)
+
+
+def failing_rows():
+    yield ['a']
+    yield [1]
+    raise ValueError('Bad row')
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_read_ahead(self):
+
+        short = make_rows(2000, ['a', 'b'], row)
+        self.assertEqual(short, list(read_ahead(iter(short), batch_size=64, max_batches=2)))
+        self.assertEqual(rows(), list(read_ahead(rows, use_process=True)))
+
+        with self.assertRaises(ValueError):
+            list(read_ahead(failing_rows()))
+
+        with self.assertRaises(ValueError):
+            list(read_ahead(failing_rows, use_process=True))
+
+        # Stopping early releases the reader
+        self.assertEqual(['a', 'b'], next(read_ahead(iter(rows()))))
+
+    def test_pipelined_runs(self):
+
+        schema = [('a', int), ('b', str)]
+
+        s1 = Stats(iter(rows()), schema, descriptive=True).run()
+        s2 = Stats(iter(rows()), schema, descriptive=True, pipelined=True).run()
+
+        self.assertEqual(s1['a'].dict, s2['a'].dict)
+        self.assertEqual(s1['b'].dict, s2['b'].dict)
+
+        ti = TypeIntuiter().run(iter(rows()), pipelined=True)
+        self.assertEqual(int, ti['a'].resolved_type)
+        self.assertEqual(10000, ti['b'].count)
+
+
+if __name__ == '__main__':
+    unittest.main()
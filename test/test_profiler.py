@@ -0,0 +1,85 @@
+import unittest
+
+from tableintuit import TableProfiler, TypeIntuiter, Stats
+
+from . import make_rows
+
+
+def report_rows(n=3000):
+    """A table with a title before the header, and a footer"""
+
+    table = make_rows(n, ['id', 'name', 'value'], lambda i, rand: [i, 'n{}'.format(i % 7), rand.random() * 100], 1)
+
+    return [['Report of things', None, None], [None, None, None]] + table + \
+        [[None, None, None], ['Source: somewhere', None, None]]
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_profile(self):
+
+        rows = report_rows()
+
+        reads = []
+
+        def source():
+            for row in rows:
+                reads.append(1)
+                yield row
+
+        tp = TableProfiler(descriptive=True).run(source())
+
+        self.assertEqual(len(rows), len(reads))  # One pass
+        self.assertEqual(3, tp.rows.start_line)
+        self.assertEqual(len(rows) - 3, tp.rows.end_line)
+        self.assertEqual(len(rows), tp.n_rows)
+        self.assertEqual(3000, tp.n_data_rows)
+
+        name = tp.header[0]
+        self.assertEqual([(name, int), ('name', str), ('value', float)], tp.schema)
+
+        # The same results as separate passes over the data rows
+        data = [tp.header] + rows[3:-2]
+        ti = TypeIntuiter().run(data)
+        self.assertEqual(list(ti.to_rows()), list(tp.types.to_rows()))
+
+        stats = Stats(iter(data), tp.schema, descriptive=True).run()
+        for col, _ in tp.schema:
+            self.assertEqual(stats[col].dict, tp.stats[col].dict)
+
+        self.assertEqual(['rows', 'header', 'n_rows', 'n_data_rows', 'types', 'stats'], list(tp.dict))
+
+    def test_pipelined_converge(self):
+        import time
+
+        rows = make_rows(30000, ['id', 'value'], lambda i, rand: [i, rand.gauss(0, 1)], 2)
+
+        def source():
+            # Slow enough that the reader is still reading when the stats converge
+            for row in rows:
+                if row[0] == 'id' or row[0] % 100 == 0:
+                    time.sleep(.002)
+                yield row
+
+        tp = TableProfiler(descriptive=True, pipelined=True, converge=.2, converge_interval=500).run(source())
+
+        self.assertTrue(tp.stats.converged)
+        self.assertLess(tp.stats.n_rows_used, 30000)
+
+        # The types and row counts still cover the whole source
+        self.assertEqual(30001, tp.n_rows)
+        self.assertEqual(30000, tp.n_data_rows)
+        self.assertEqual(list(TypeIntuiter().run(rows).to_rows()), list(tp.types.to_rows()))
+
+    def test_short(self):
+        rows = [['a', 'b']] + [[i, 'x'] for i in range(20)]
+
+        tp = TableProfiler(tail_size=5).run(rows)
+
+        self.assertEqual(['a', 'b'], tp.header)
+        self.assertEqual(20, tp.n_data_rows)
+        self.assertEqual(20, tp.stats['a'].n)
+
+
+if __name__ == '__main__':
+    unittest.main()
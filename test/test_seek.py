@@ -0,0 +1,130 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+
+from tableintuit import Stats, TypeIntuiter
+from tableintuit.seek import SeekSampler, record_ends
+
+
+def write_csv(path, n=50000):
+    rand = random.Random(2)
+
+    rows = [['id', 'amount', 'note', 'code']]
+    for i in range(n):
+        note = rand.choice(['plain', 'with, comma', 'two\nlines', 'say ""hi""', 'a "quoted\n,field"', ''])
+        rows.append([i, round(rand.random() * 1000, 2), note, 'c{}'.format(rand.randint(0, 20))])
+
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+    return rows
+
+
+class SeekSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'data.csv')
+        self.rows = write_csv(self.path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_record_ends(self):
+        buf = b'a,"b\nc",d\ne,f\n'
+        self.assertEqual([9, 13], record_ends(buf))
+        self.assertEqual([4], record_ends(buf, in_quotes=True))
+        self.assertEqual([9], record_ends(buf, limit=1))
+
+    def test_sample(self):
+        all_rows = set(tuple(str(v) for v in row) for row in self.rows[1:])
+
+        sampler = SeekSampler(self.path, sample_rows=2000, seed=1)
+        sample = list(sampler)
+
+        self.assertEqual(['id', 'amount', 'note', 'code'], sample[0])
+        self.assertEqual(2000, len(sample) - 1)
+        self.assertEqual(2000, sampler.n_sampled)
+
+        # Every sampled row is a whole row of the file, so the boundaries were found through the quoted newlines
+        for row in sample[1:]:
+            self.assertIn(tuple(row), all_rows)
+
+        self.assertEqual(len(sample) - 1, len(set(tuple(r) for r in sample[1:])))
+
+        # Rows come from all through the file
+        ids = [int(r[0]) for r in sample[1:]]
+        self.assertLess(min(ids), 5000)
+        self.assertGreater(max(ids), 45000)
+
+        # Reads are proportional to the sample, not the file
+        self.assertLess(sampler.bytes_read, os.path.getsize(self.path) / 2)
+
+        self.assertAlmostEqual(len(self.rows) - 1, sampler.est_rows, delta=len(self.rows) * .1)
+
+        # With a seed, the sample is the same each time
+        self.assertEqual(sample, list(sampler))
+
+    def test_types_and_stats(self):
+        sampler = SeekSampler(self.path, sample_rows=3000, seed=4)
+
+        ti = TypeIntuiter().run(sampler)
+        self.assertEqual([int, float, str, str], [c.resolved_type for c in ti.columns.values()])
+
+        schema = [(c.header, c.resolved_type) for c in ti.columns.values()]
+        stats = Stats(sampler, schema, descriptive=True).run()
+
+        self.assertEqual(3000, stats.n_rows_used)
+        self.assertAlmostEqual(500, stats['amount'].mean, delta=30)
+        self.assertEqual(6, stats['note'].nuniques)
+
+    def test_ragged(self):
+        path = os.path.join(self.dir.name, 'ragged.csv')
+        rand = random.Random(6)
+
+        all_rows = set()
+
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['id', 'amount', 'note', 'code'])
+            for i in range(50000):
+                row = [i, round(rand.random() * 1000, 2), rand.choice(['plain', 'two\nlines', '']), 'c1']
+                row = row[:rand.randint(2, 3)] if rand.random() < .1 else row  # Some rows are short
+                w.writerow(row)
+                all_rows.add(tuple(str(v) for v in row))
+
+        sampler = SeekSampler(path, sample_rows=2000, seed=1)
+        sample = list(sampler)
+
+        self.assertEqual(2000, len(sample) - 1)
+        self.assertTrue(all(tuple(row) in all_rows for row in sample[1:]))
+        self.assertEqual(0, sampler.short)
+        self.assertTrue(any(len(row) < 4 for row in sample[1:]))
+
+        # If every row must fit the header, most runs are rejected, and the shortfall is reported
+        sampler = SeekSampler(path, sample_rows=2000, seed=1, min_fit=1)
+
+        with self.assertLogs('tableintuit.seek', 'WARNING'):
+            sample = list(sampler)
+
+        self.assertGreater(sampler.short, 0)
+        self.assertEqual(2000, len(sample) - 1 + sampler.short)
+
+        # Within a tolerance of two fields, the short rows fit
+        sampler = SeekSampler(path, sample_rows=2000, seed=1, min_fit=1, width_tolerance=2)
+        self.assertEqual(2000, len(list(sampler)) - 1)
+
+    def test_small_file(self):
+        path = os.path.join(self.dir.name, 'small.csv')
+        with open(path, 'w') as f:
+            f.write('a,b\n1,"x\ny"\n2,z')
+
+        rows = list(SeekSampler(path, sample_rows=10, seed=3))
+
+        self.assertEqual([['a', 'b'], ['1', 'x\ny'], ['2', 'z']], rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from tableintuit.exceptions import ServiceError
+from tableintuit.profiler import profile_file
+from tableintuit.service import IntuitServer, IntuitClient
+
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = []
+
+        for i in range(6):
+            path = os.path.join(self.dir.name, 'f{}.csv'.format(i))
+            with open(path, 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(['id', 'value', 'name'])
+                for j in range(50 + i * 10):
+                    w.writerow([j, j * 1.5 + i, 'n{}'.format(j % 7)])
+            self.paths.append(path)
+
+        self.server = IntuitServer(os.path.join(self.dir.name, 'sock'), workers=2, queue_size=4)
+        self.server.serve_in_thread()
+
+    def tearDown(self):
+        self.server.close()
+        self.dir.cleanup()
+
+    def test_profile(self):
+
+        with IntuitClient(self.server.socket_path) as client:
+            profile = client.profile(self.paths[0], sample=1000)
+
+            self.assertEqual(profile_file(self.paths[0], sample=1000), profile)
+            self.assertEqual(['id', 'value', 'name'], profile['header'])
+            self.assertEqual(50, profile['n_data_rows'])
+
+            # More requests than the queue holds, on one connection
+            results = dict(client.profile_many(self.paths, sample=1000))
+
+            self.assertEqual(set(self.paths), set(results))
+            for i, path in enumerate(self.paths):
+                self.assertEqual(50 + i * 10, results[path]['n_data_rows'])
+
+            with self.assertRaises(ServiceError):
+                client.profile(os.path.join(self.dir.name, 'missing.csv'), sample=1000)
+
+            # The connection is still usable after an error
+            self.assertEqual(50, client.profile(self.paths[0], sample=1000)['n_data_rows'])
+
+        self.assertEqual(1 + len(self.paths) + 2, self.server.n_requests)
+        self.assertEqual(1, self.server.n_errors)
+
+    def test_bad_requests(self):
+
+        with IntuitClient(self.server.socket_path, timeout=30) as client:
+            # Options that write files are rejected, as are unknown ones
+            for options in ({'checkpoint': os.path.join(self.dir.name, 'cp')}, {'spill_dir': self.dir.name},
+                            {'cache': self.dir.name}, {'nonsense': 1}):
+                with self.assertRaises(ServiceError) as cm:
+                    client.profile(self.paths[0], **options)
+                self.assertIn('not allowed', str(cm.exception))
+
+            self.assertFalse(os.path.exists(os.path.join(self.dir.name, 'cp')))
+
+            # A request the server can't parse has no id, which the client reports rather than failing on
+            client._sock.sendall(b'not json\n')
+            with self.assertRaises(ServiceError) as cm:
+                client.profile(self.paths[0], sample=1000)
+            self.assertIn('Bad request', str(cm.exception))
+
+            # And the request is still answered
+            self.assertEqual(50, client._receive()['result']['n_data_rows'])
+
+        # Failing to submit releases the request's slot, so more failures than the queue holds don't block
+        pool = self.server._pool
+
+        class Failing(object):
+            def submit(self, *args):
+                raise RuntimeError('No submissions')
+
+        self.server._pool = Failing()
+
+        try:
+            with IntuitClient(self.server.socket_path, timeout=30) as client:
+                results = dict(client.profile_many(self.paths * 2, sample=1000))
+                self.assertTrue(all(isinstance(r, ServiceError) for r in results.values()))
+        finally:
+            self.server._pool = pool
+
+        self.assertEqual(4 + 1 + 12, self.server.n_errors)
+
+    def test_broken_pool(self):
+        import time
+
+        with IntuitClient(self.server.socket_path, timeout=30) as client:
+            self.assertEqual(50, client.profile(self.paths[0], sample=1000)['n_data_rows'])
+
+            for process in list(self.server._pool._processes.values()):
+                process.kill()
+
+            # Requests that were running, or submitted before the pool noticed, fail, then the pool is replaced
+            for _ in range(10):
+                try:
+                    self.assertEqual(50, client.profile(self.paths[0], sample=1000)['n_data_rows'])
+                    break
+                except ServiceError:
+                    time.sleep(.1)
+            else:
+                self.fail('The pool was not replaced')
+
+    def test_timeout(self):
+        path = os.path.join(self.dir.name, 'big.csv')
+
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['id', 'value', 'name'])
+            for j in range(200000):
+                w.writerow([j, j * 1.5, 'n{}'.format(j % 7)])
+
+        with IntuitServer(os.path.join(self.dir.name, 'tsock'), workers=1, timeout=.2) as server:
+            server.serve_in_thread()
+
+            with IntuitClient(server.socket_path, timeout=30) as client:
+                with self.assertRaises(ServiceError) as cm:
+                    client.profile(path, sample=100000)
+                self.assertIn('Timed out', str(cm.exception))
+
+                # The worker is still usable
+                self.assertEqual(50, client.profile(self.paths[0], sample=1000)['n_data_rows'])
+
+    def test_connect_error(self):
+        with self.assertRaises(ServiceError):
+            IntuitClient(os.path.join(self.dir.name, 'nosock'))
+
+
+if __name__ == '__main__':
+    unittest.main()
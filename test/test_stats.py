@@ -0,0 +1,432 @@
+import unittest
+
+from tableintuit import Stats
+
+from . import make_rows
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_positional_rows(self):
+
+        rows = make_rows(200, ['a', 'b', 'c'], lambda i, rand: [i, i * 1.5, 'x{}'.format(i % 3)])
+        schema = [('a', int), ('b', float), ('c', str)]
+
+        pos = Stats(iter(rows), schema, descriptive=True).run()
+        dct = Stats((dict(zip(rows[0], row)) for row in rows[1:]), schema, descriptive=True).run()
+
+        for name, _ in schema:
+            self.assertEqual(dct[name].dict, pos[name].dict)
+
+        self.assertEqual(200, pos['a'].n)
+        self.assertEqual(99.5, pos['a'].mean)
+        self.assertEqual({'x0': 67, 'x1': 67, 'x2': 66}, pos['c'].uvalues)
+
+        # Schema in a different order than the header
+        pos = Stats(iter(rows), list(reversed(schema)), descriptive=True).run()
+        self.assertEqual(99.5, pos['a'].mean)
+        self.assertEqual(3, pos['c'].nuniques)
+
+    def test_streaming_hist(self):
+        import random
+        from tableintuit.stats import StreamingHistogram
+
+        rand = random.Random(42)
+        values = [rand.lognormvariate(0, 1.5) for _ in range(20000)]
+
+        def exact_bins(values, num_bins):
+            lo, hi = min(values), max(values)
+            width = (hi - lo) / num_bins
+            bins = [0] * num_bins
+            for v in values:
+                bins[min(int((v - lo) / width), num_bins - 1)] += 1
+            return bins
+
+        h = StreamingHistogram(64)
+        for v in values:
+            h.add(v)
+
+        self.assertEqual(20000, h.n)
+        self.assertEqual(min(values), h.min)
+        self.assertEqual(max(values), h.max)
+        self.assertLessEqual(len(h.positions), 64)
+
+        bins = h.bins(16)
+        exact = exact_bins(values, 16)
+        self.assertLess(sum(abs(a - b) for a, b in zip(bins, exact)), 0.05 * len(values))
+
+        # Merging two halves gives about the same histogram as one pass
+        h1, h2 = StreamingHistogram(64), StreamingHistogram(64)
+        for v in values[:10000]:
+            h1.add(v)
+        for v in values[10000:]:
+            h2.add(v)
+
+        merged = h1.merge(h2)
+        self.assertEqual(20000, merged.n)
+        self.assertEqual(h.max, merged.max)
+        self.assertLess(sum(abs(a - b) for a, b in zip(merged.bins(16), exact)), 0.05 * len(values))
+
+        rows = [['v']] + [[v] for v in values]
+        stats = Stats(iter(rows), [('v', float)], descriptive=True, distribution=True,
+                      num_bins=8, streaming_hist=True).run()
+
+        # The bins cover the whole range, so they count every value
+        v = stats['v']
+        self.assertEqual(8, len(v.bins))
+        self.assertEqual(len(values), sum(v.bins))
+        self.assertEqual((min(values), max(values)), (v.bin_min, v.bin_max))
+        self.assertLess(sum(abs(a - b) for a, b in zip(v.bins, exact_bins(values, 8))), 0.05 * len(values))
+        self.assertEqual(8, len(v.dict['text_hist']))
+
+        # The primer values are counted, as on the default path
+        self.assertEqual(v.bin_primer_count - 1, v.nuniques)
+
+        # So small integers are still found to be ordinals
+        rows = [['o']] + [[rand.randint(0, 9)] for _ in range(20000)]
+        default = Stats(iter(rows), [('o', int)], descriptive=True, distribution=True).run()
+        streaming = Stats(iter(rows), [('o', int)], descriptive=True, distribution=True, streaming_hist=True).run()
+
+        self.assertEqual('o', streaming['o'].lom)
+        self.assertEqual(default['o'].dict, streaming['o'].dict)
+
+    def test_streaming_hist_speed(self):
+        import random
+        import time
+
+        rand = random.Random(7)
+        rows = [['v']] + [[rand.gauss(0, 1)] for _ in range(20000)]
+
+        def run(**kwargs):
+            t0 = time.perf_counter()
+            Stats(iter(rows), [('v', float)], descriptive=True, distribution=True, **kwargs).run()
+            return time.perf_counter() - t0
+
+        # Interleaved, so both paths see the same machine load
+        times = [(run(), run(streaming_hist=True)) for _ in range(5)]
+
+        # Streaming should cost about the same as the default path; allow for timing noise
+        self.assertLess(min(t for _, t in times), min(t for t, _ in times) * 1.5)
+
+    def test_sampling(self):
+        import random
+
+        from tableintuit import StatsError
+
+        rand = random.Random(1)
+        rows = [['v']] + [[rand.gauss(100, 10)] for _ in range(50000)]
+
+        s = Stats(iter(rows), [('v', float)], descriptive=True, sampling='reservoir', sample_size=1000, seed=1).run()
+        self.assertEqual(1000, s['v'].n)
+        self.assertAlmostEqual(100, s['v'].mean, delta=2)
+
+        s2 = Stats(iter(rows), [('v', float)], descriptive=True, sampling='reservoir', sample_size=1000, seed=1).run()
+        self.assertEqual(s['v'].mean, s2['v'].mean)
+
+        s = Stats(iter(rows), [('v', float)], descriptive=True, sampling='bernoulli', sample_rate=.1, seed=1).run()
+        self.assertAlmostEqual(5000, s['v'].n, delta=300)
+
+        s = Stats(iter(rows), [('v', float)], descriptive=True, converge=.01).run()
+        self.assertTrue(s.converged)
+        self.assertLess(s.n_rows_used, 50000)
+        self.assertEqual(s.n_rows_used, s['v'].n)
+        self.assertAlmostEqual(100, s['v'].mean, delta=1)
+
+        # A numeric column with no values doesn't converge, but doesn't stop the run
+        empty_rows = [['v', 'e']] + [[v, None] for (v,) in rows[1:5001]]
+        s = Stats(iter(empty_rows), [('v', float), ('e', float)], descriptive=True, converge=.01).run()
+        self.assertFalse(s.converged)
+        self.assertEqual(5000, s.n_rows_used)
+
+        # Neither do categorical columns, nor numbers that turn out to be ordinals, which have no criterion
+        cat_rows = [['s', 'o']] + [['s{}'.format(i % 7), i % 3] for i in range(20000)]
+        s = Stats(iter(cat_rows), [('s', str), ('o', int)], descriptive=True, converge=.01).run()
+        self.assertEqual('o', s['o'].lom)
+        self.assertFalse(s.converged)
+        self.assertEqual(20000, s.n_rows_used)
+
+        # The reservoir holds copies, so a source that reuses its row list still gives a sample of the rows
+        def reused(rows):
+            row = []
+            for r in rows:
+                row[:] = r
+                yield row
+
+        s = Stats(reused(rows), [('v', float)], descriptive=True, sampling='reservoir', sample_size=1000, seed=1).run()
+        self.assertEqual(s2['v'].mean, s['v'].mean)
+
+        with self.assertRaises(StatsError):
+            Stats(iter(rows), [('v', float)], sampling='reservoir')
+
+    def test_native_dates(self):
+        import datetime
+
+        start = datetime.date(2015, 1, 1)
+        rows = [['d', 't']]
+        for i in range(3650):
+            d = start + datetime.timedelta(days=i)
+            rows.append([d.isoformat() if i % 2 else d, '{:02d}:30:00'.format(i % 24)])
+        rows.append([None, 'not a time'])
+
+        stats = Stats(iter(rows), [('d', datetime.date), ('t', datetime.time)], descriptive=True,
+                      distribution=True, native_dates=True).run()
+
+        d = stats['d']
+        self.assertEqual(start, d.min)
+        self.assertEqual(start + datetime.timedelta(days=3649), d.max)
+        self.assertAlmostEqual(datetime.date(2020, 1, 1).toordinal(), d.p50.toordinal(), delta=30)
+        self.assertEqual({'NULL': 1}, dict(d.counts))
+        self.assertEqual(120, len(d.calendar))
+        self.assertEqual(31, d.calendar['2015-01'])
+        self.assertEqual(15, len(d.bins))  # Eight months to a bin
+        self.assertEqual(3650, sum(d.bins))
+        self.assertEqual(15, len(d.dict['hist']))
+
+        t = stats['t']
+        self.assertEqual(datetime.time(0, 30), t.min)
+        self.assertEqual(datetime.time(23, 30), t.max)
+        self.assertEqual(24, len(t.calendar))
+        self.assertEqual(12, len(t.bins))
+        self.assertEqual({'not a time': 1}, dict(t.counts))
+        self.assertEqual('%H:%M:%S', t.date_stats.parser.format)
+
+    def test_date_calendar_span(self):
+        import datetime
+        from tableintuit.stats import DateStats
+
+        # Few distinct months, but far apart, so the calendar of every month in the span would be huge
+        ds = DateStats(datetime.date, max_periods=50)
+        for year in (1900, 1950, 2020):
+            ds.add(datetime.date(year, 6, 1))
+
+        self.assertEqual('decade', ds.period)
+        self.assertEqual(13, len(ds.calendar))
+        self.assertEqual(1, ds.calendar['1950'])
+        self.assertEqual(0, ds.calendar['1960'])
+
+        ds = DateStats(datetime.date, max_periods=5)
+        for year in (1, 1000, 2020):
+            ds.add(datetime.date(year, 6, 1))
+
+        self.assertEqual(['0000', '1000', '2020'], list(ds.calendar))
+
+    def test_correlation(self):
+        import random
+
+        import numpy as np
+        from tableintuit.stats import CovarianceMatrix
+
+        rand = random.Random(3)
+        rows = [['x', 'y', 'z', 's']]
+        for i in range(5000):
+            x = rand.gauss(1000, 10)
+            rows.append([x, 2 * x + rand.gauss(0, 5) if i % 10 else None, rand.random(), 'a'])
+
+        stats = Stats(iter(rows), [('x', float), ('y', float), ('z', float), ('s', str)], correlation=True).run()
+
+        self.assertEqual(['x', 'y', 'z'], stats.cov.names)
+
+        # Pairwise deletion, compared to numpy on the complete rows for each pair
+        data = np.array([[np.nan if v is None else v for v in row[:3]] for row in rows[1:]])
+        for i in range(3):
+            for j in range(3):
+                both = ~np.isnan(data[:, i]) & ~np.isnan(data[:, j])
+                expected = np.corrcoef(data[both, i], data[both, j])[0, 1]
+                self.assertAlmostEqual(expected, stats.correlation[i, j], places=6)
+                self.assertEqual(both.sum(), stats.cov.n[i, j])
+
+        self.assertAlmostEqual(np.cov(data[:, 0])[()], stats.covariance[0, 0], places=6)
+
+        # Merging accumulators for two halves matches one pass
+        a, b = CovarianceMatrix(['x', 'y', 'z'], batch_size=100), CovarianceMatrix(['x', 'y', 'z'])
+        for row in rows[1:2500]:
+            a.add(row[:3])
+        for row in rows[2500:]:
+            b.add(row[:3])
+
+        np.testing.assert_allclose(stats.correlation, a.merge(b).correlation, rtol=1e-9)
+
+    def test_exact(self):
+        import os
+        import random
+
+        import numpy as np
+        from tableintuit import spill
+
+        rand = random.Random(5)
+        values = [rand.expovariate(.1) for _ in range(30000)] + [5.0] * 1000
+        rows = [['v']] + [[v] for v in values] + [[None], ['x']]
+
+        stats = Stats(iter(rows), [('v', float)], descriptive=True, distribution=True, exact=True)
+        spill_dir = stats._spill_dir
+        stats.run()
+
+        self.assertFalse(os.path.exists(spill_dir))
+
+        v = stats['v']
+        a = np.array(values)
+        np.testing.assert_allclose(np.quantile(a, [.25, .5, .75]), [v.p25, v.p50, v.p75])
+
+        lo, hi = a.mean() - 2 * a.std(ddof=1), a.mean() + 2 * a.std(ddof=1)
+        self.assertEqual(np.histogram(a, bins=16, range=(lo, hi))[0].tolist(), v.bins)
+
+        # Force the narrowing passes, rather than partitioning all of the values in memory
+        max_gather, chunk_size = spill.MAX_GATHER, spill.CHUNK_SIZE
+        try:
+            spill.MAX_GATHER, spill.CHUNK_SIZE = 500, 4096
+            col = spill.SpillColumn(None, 'v')
+            for e in values:
+                col.add(e)
+            np.testing.assert_allclose(np.quantile(a, [0, .1, .25, .5, .9, 1]),
+                                       col.quantiles([0, .1, .25, .5, .9, 1]))
+            col.remove()
+        finally:
+            spill.MAX_GATHER, spill.CHUNK_SIZE = max_gather, chunk_size
+
+    def test_exact_many_columns(self):
+        import os
+
+        import numpy as np
+        from tableintuit import spill
+
+        # More columns than a process can usually have open files
+        names = ['c{}'.format(i) for i in range(1200)]
+        rows = [names] + [[i * j for j in range(len(names))] for i in range(100)]
+
+        buffer_size = spill.BUFFER_SIZE
+        try:
+            spill.BUFFER_SIZE = 16  # Several writes to each file
+            stats = Stats(iter(rows), [(n, float) for n in names], descriptive=True, exact=True)
+
+            # No files are created or opened until values are written
+            self.assertEqual([], os.listdir(stats._spill_dir))
+
+            stats.run()
+        finally:
+            spill.BUFFER_SIZE = buffer_size
+
+        a = np.arange(100) * 7.0
+        np.testing.assert_allclose(np.quantile(a, [.25, .5, .75]), [stats['c7'].p25, stats['c7'].p50, stats['c7'].p75])
+
+    def test_encoded_counts(self):
+        import random
+        from collections import Counter
+
+        from tableintuit.stats import EncodedCounter
+
+        rand = random.Random(7)
+        values = ['v{}'.format(int(rand.paretovariate(1))) for _ in range(100000)]
+
+        ec = EncodedCounter(buffer_size=1000)
+        for v in values:
+            ec.add(v)
+
+        c = Counter(values)
+
+        self.assertEqual(len(c), len(ec))
+        self.assertEqual(c['v1'], ec['v1'])
+        self.assertEqual(0, ec['nope'])
+        self.assertEqual(dict(c), dict(ec.items()))
+        self.assertEqual(c.most_common(20), ec.most_common(20))
+        self.assertEqual(c.most_common(), ec.most_common())
+        self.assertEqual(list(c), list(ec))
+
+        # Codes don't change as values are added
+        code = ec.code('v1')
+        for i in range(5000):
+            ec.add('new{}'.format(i))
+        self.assertEqual(code, ec.code('v1'))
+        self.assertEqual('v1', ec.value(code))
+
+        # String hashes differ between processes, so a checkpoint loaded in another one rebuilds the table
+        ec._table_key += 1
+        self.assertEqual(code, ec.code('v1'))
+        self.assertEqual(ec._key_hash(), ec._table_key)
+
+        ec['v1'] += 1
+        self.assertEqual(c['v1'] + 1, ec['v1'])
+
+        # Values whose hashes collide are still counted separately
+        class Colliding(EncodedCounter):
+            @staticmethod
+            def _hash(encoded):
+                import numpy as np
+                return np.array([len(b) % 3 for b in encoded], dtype=np.int64)
+
+        cc = Colliding(buffer_size=7)
+        for v in values[:2000]:
+            cc.add(v)
+        self.assertEqual(Counter(values[:2000]).most_common(), cc.most_common())
+        self.assertEqual(0, cc['nope'])
+
+        # Storage is proportional to the total length of the values, not the number of values times the longest
+        skewed = EncodedCounter(buffer_size=1000)
+        for i in range(20000):
+            skewed.add('v{}'.format(i))
+        skewed.add('x' * 100000)
+
+        total = sum(len('v{}'.format(i)) for i in range(20000)) + 100000
+        self.assertLess(skewed.nbytes, total + 20001 * 40)
+
+        # Much less memory than a Counter of many distinct values, both at the end and at the peak while counting
+        import tracemalloc
+
+        def traced(counts, add):
+            tracemalloc.start()
+            try:
+                for i in range(100000):
+                    add(counts, 'value{}'.format(i))
+                len(counts)
+                return tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        def add_counter(counts, v):
+            counts[v] += 1
+
+        counter_current, _ = traced(Counter(), add_counter)
+        encoded_current, encoded_peak = traced(EncodedCounter(), EncodedCounter.add)
+
+        self.assertLess(encoded_current, counter_current / 2.5)
+        self.assertLess(encoded_peak, counter_current / 1.5)
+
+        rows = [['v']] + [[v] for v in values] + [[None]]
+        s1 = Stats(iter(rows), [('v', str)], sample_values=True).run()
+        s2 = Stats(iter(rows), [('v', str)], sample_values=True, encoded_counts=True).run()
+
+        self.assertTrue(s2['v'].encoded_counts)
+        self.assertEqual(s1['v'].dict, s2['v'].dict)
+
+    def test_grouped(self):
+        from tableintuit.stats import GroupedStats
+
+        rows = [['state', 'year', 'v']]
+        for i in range(3000):
+            rows.append(['s{}'.format(i % 5) if i < 2900 else 'late{}'.format(i), 2000 + i % 2, i])
+
+        gs = GroupedStats(iter(rows), [('v', int)], 'state', max_groups=5, descriptive=True).run()
+
+        self.assertEqual(['s0', 's1', 's2', 's3', 's4', 'other'], list(gs.groups))
+        self.assertEqual(580, gs.group_rows['s0'])
+        self.assertEqual(100, gs['other']['v'].n)
+
+        expected = Stats(iter([['v']] + [[r[2]] for r in rows[1:] if r[0] == 's3']), [('v', int)],
+                         descriptive=True).run()
+        self.assertEqual(expected['v'].dict, gs['s3']['v'].dict)
+
+        # Multiple key columns, from dict rows
+        gs = GroupedStats((dict(zip(rows[0], r)) for r in rows[1:]), [('v', int)], ['state', 'year'],
+                          descriptive=True).run()
+
+        self.assertEqual(290, gs[('s0', 2000)]['v'].n)
+        self.assertEqual(10 + 100, len(gs))
+
+        from tableintuit import StatsError
+
+        for option in ({'exact': True}, {'spill_dir': '/tmp'}, {'checkpoint': '/tmp/stats.ckpt'}):
+            with self.assertRaises(StatsError):
+                GroupedStats(iter(rows), [('v', int)], 'state', **option)
+
+
+if __name__ == '__main__':
+    unittest.main()